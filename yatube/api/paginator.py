@@ -0,0 +1,42 @@
+from posts.models import Post, TimelineEntry
+from posts.paginator import CursorPaginator, encode_cursor
+from posts.timeline import pull_authors
+
+
+class ValuesCursorPaginator(CursorPaginator):
+    """CursorPaginator для строк values(): курсор берётся из словаря."""
+
+    def _cursor_for(self, obj):
+        return encode_cursor(obj[field] for field in self.key)
+
+
+class TimelineValuesPaginator(ValuesCursorPaginator):
+    """Лента подписок строками values().
+
+    Как TimelinePaginator: разложенные записи и посты pull-авторов
+    читаются по одному курсору (pub_date, id), но только ключами. Строки
+    страницы потом читаются одним запросом по списку id.
+    """
+
+    def __init__(self, user, rows, per_page):
+        entries = (TimelineEntry.objects.filter(user=user)
+                   .values('pub_date', 'post_id')
+                   .order_by('-pub_date', '-post'))
+        super().__init__(entries, per_page)
+        self.rows = rows
+        self.pull_authors = pull_authors(user)
+
+    def get_rows(self, after, before):
+        keys = {entry['post_id']: entry['pub_date'] for entry in self._fetch(
+            self.object_list, ('pub_date', 'post_id'), after, before)}
+        for author_id in self.pull_authors:
+            pulled = Post.objects.filter(author=author_id).values(
+                'pub_date', 'id')
+            for row in self._fetch(pulled, ('pub_date', 'id'),
+                                   after, before):
+                keys.setdefault(row['id'], row['pub_date'])
+        ids = sorted(keys, key=lambda pk: (keys[pk], pk),
+                     reverse=not before)[:self.per_page + 1]
+        rows = {row['id']: row
+                for row in self.rows.filter(pk__in=ids).order_by()}
+        return [rows[pk] for pk in ids if pk in rows]
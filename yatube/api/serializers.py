@@ -0,0 +1,69 @@
+"""Сериализация строк values() в JSON API.
+
+Ответ собирается из словарей values() без создания моделей: для каждого
+поля ответа известна колонка и, если нужно, функция преобразования.
+Параметр fields= выбирает поля ответа, и из БД читаются только их
+колонки.
+"""
+from posts.models import Post
+
+
+def image_url(name):
+    return Post._meta.get_field('image').storage.url(name) if name else None
+
+
+class ValuesSerializer:
+    def __init__(self, fields):
+        # Имя поля ответа: (колонка для values(), преобразование или None)
+        self.fields = fields
+
+    def parse(self, param):
+        """Поля из параметра fields=, по умолчанию все. Неизвестное поле —
+        ValueError."""
+        if not param:
+            return list(self.fields)
+        names = list(dict.fromkeys(
+            name.strip() for name in param.split(',') if name.strip()))
+        unknown = [name for name in names if name not in self.fields]
+        if unknown or not names:
+            raise ValueError(
+                f'Неизвестные поля: {", ".join(unknown)}. '
+                f'Доступны: {", ".join(self.fields)}.')
+        return names
+
+    def columns(self, names, extra=()):
+        """Колонки для values(): поля ответа и ключ курсора."""
+        return list(dict.fromkeys(
+            [*(self.fields[name][0] for name in names), *extra]))
+
+    def dump(self, row, names):
+        record = {}
+        for name in names:
+            column, convert = self.fields[name]
+            value = row[column]
+            record[name] = convert(value) if convert else value
+        return record
+
+
+posts = ValuesSerializer({
+    'id': ('id', None),
+    'text': ('text', None),
+    'pub_date': ('pub_date', None),
+    'updated': ('updated', None),
+    'author': ('author__username', None),
+    'group': ('group__slug', None),
+    'comments_count': ('comments_count', None),
+    'image': ('image', image_url),
+    'image_width': ('image_width', None),
+    'image_height': ('image_height', None),
+    'image_color': ('image_color', None),
+    'image_placeholder': ('image_placeholder', None),
+})
+
+comments = ValuesSerializer({
+    'id': ('id', None),
+    'post': ('post', None),
+    'author': ('author__username', None),
+    'text': ('text', None),
+    'created': ('created', None),
+})
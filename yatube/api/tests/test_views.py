@@ -0,0 +1,131 @@
+import datetime as dt
+
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from posts.models import Comment, Follow, Group, Post, User
+from posts.paginator import encode_cursor
+
+
+# JSON API лент
+class ApiTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='leo')
+        self.reader = User.objects.create_user(username='leo1')
+        self.group = Group.objects.create(title='Группа', slug='group')
+        start = timezone.now() - dt.timedelta(days=1)
+        self.posts = []
+        for number in range(5):
+            post = Post.objects.create(text=f'Пост {number}',
+                                       author=self.author, group=self.group)
+            Post.objects.filter(pk=post.pk).update(
+                pub_date=start + dt.timedelta(minutes=number))
+            self.posts.append(post)
+        self.comment = Comment.objects.create(
+            post=self.posts[0], author=self.reader, text='Комментарий')
+        self.client = Client()
+
+    def get(self, name, *args, client=None, **params):
+        return (client or self.client).get(
+            reverse(f'api:{name}', args=args), params)
+
+    def test_feeds_with_cursor(self):
+        for name, args in (('posts', ()), ('group_posts', ('group',)),
+                           ('profile_posts', ('leo',))):
+            with self.subTest(name=name):
+                response = self.get(name, *args, limit=3)
+                self.assertEqual(response.status_code, 200)
+                data = response.json()
+                self.assertEqual([post['text'] for post in data['results']],
+                                 ['Пост 4', 'Пост 3', 'Пост 2'])
+                self.assertIsNone(data['previous'])
+                data = self.client.get(data['next']).json()
+                self.assertEqual([post['text'] for post in data['results']],
+                                 ['Пост 1', 'Пост 0'])
+                self.assertIsNone(data['next'])
+                self.assertIsNotNone(data['previous'])
+
+    def test_sparse_fieldset(self):
+        response = self.get('posts', fields='id,author', limit=1)
+        self.assertEqual(response.json()['results'],
+                         [{'id': self.posts[4].pk, 'author': 'leo'}])
+        response = self.get('posts', fields='id,password')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['detail'])
+
+    def test_batched_lookup(self):
+        ids = f'{self.posts[2].pk},{self.posts[0].pk},999'
+        response = self.get('posts', ids=ids, fields='id,comments_count')
+        self.assertEqual(response.json()['results'], [
+            {'id': self.posts[2].pk, 'comments_count': 0},
+            {'id': self.posts[0].pk, 'comments_count': 1},
+        ])
+        response = self.get('comments', ids=self.comment.pk)
+        self.assertEqual(response.json()['results'][0]['author'], 'leo1')
+        self.assertEqual(self.get('posts', ids='1,x').status_code, 400)
+
+    # isdigit() верно для «²» и «٣», но int() их не разбирает или
+    # понимает иначе: такие значения — ошибка клиента, а не 500
+    def test_non_ascii_digits(self):
+        for value in ('²', '1²', '٣', '１'):
+            with self.subTest(value=value):
+                self.assertEqual(self.get('posts', limit=value).status_code,
+                                 400)
+                self.assertEqual(self.get('posts', ids=value).status_code,
+                                 400)
+
+    def test_post_and_comments(self):
+        post = self.posts[0]
+        data = self.get('post', post.pk).json()
+        self.assertEqual((data['text'], data['group'], data['image']),
+                         ('Пост 0', 'group', None))
+        data = self.get('post_comments', post.pk).json()
+        self.assertEqual(data['results'][0]['text'], 'Комментарий')
+        response = self.get('post', 999)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+    def test_not_modified(self):
+        response = self.get('posts')
+        second = self.client.get(reverse('api:posts'),
+                                 HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(second.status_code, 304)
+        other = self.client.get(reverse('api:posts'), {'fields': 'id'},
+                                HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(other.status_code, 200)
+
+    def test_broken_cursor(self):
+        cursors = ['мусор', encode_cursor(['x', 1]),
+                   encode_cursor([1.5, 1]),
+                   encode_cursor(['2020-01-01T00:00:00', 'abc'])]
+        for cursor in cursors:
+            for name, args in (('posts', ()),
+                               ('post_comments', (self.posts[0].pk,))):
+                with self.subTest(cursor=cursor, name=name):
+                    response = self.get(name, *args, after=cursor)
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn('after', response.json()['detail'])
+
+    def test_feed_requires_login(self):
+        self.assertEqual(self.get('feed').status_code, 401)
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_feed_merges_pull_authors(self):
+        other = User.objects.create_user(username='leo2')
+        Post.objects.create(text='Свежий', author=other)
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.reader, author=other)
+        client = Client()
+        client.force_login(self.reader)
+        data = self.get('feed', client=client, limit=2, fields='text').json()
+        self.assertEqual(data['results'],
+                         [{'text': 'Свежий'}, {'text': 'Пост 4'}])
+        data = client.get(data['next']).json()
+        self.assertEqual(data['results'],
+                         [{'text': 'Пост 3'}, {'text': 'Пост 2'}])
+
+    def test_read_only(self):
+        response = self.client.post(reverse('api:posts'))
+        self.assertEqual(response.status_code, 405)
@@ -0,0 +1,214 @@
+"""JSON API лент для мобильных клиентов: те же ленты, что в HTML, без
+шаблонов.
+
+Списки листаются курсором (after/before, ссылки next/previous в ответе),
+fields= выбирает поля, ids= отдаёт записи по списку id одним запросом.
+Ошибки приходят как {"detail": "..."} с кодом ответа.
+"""
+from functools import wraps
+
+from django.conf import settings
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_safe
+from posts.conditional import (conditional_page, group_validator,
+                               index_validator, profile_validator)
+from posts.models import Comment, Group, Post, User
+
+from . import serializers
+from .paginator import TimelineValuesPaginator, ValuesCursorPaginator
+
+POST_KEY = ('pub_date', 'id')
+COMMENT_KEY = ('created', 'id')
+
+
+class ApiError(Exception):
+    def __init__(self, status, detail):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+def _json(data, status=200):
+    # Без \u-экранирования кириллица вдвое короче
+    return JsonResponse(data, status=status,
+                        json_dumps_params={'ensure_ascii': False})
+
+
+def api_view(view):
+    """Только GET и HEAD, ошибки — JSON."""
+    @require_safe
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except ApiError as error:
+            return _json({'detail': error.detail}, status=error.status)
+        except Http404:
+            return _json({'detail': 'Не найдено.'}, status=404)
+    return wrapper
+
+
+def _with_query(validator):
+    """Валидатор ленты, зависящий от всех параметров: fields и limit
+    меняют ответ так же, как курсор."""
+    def wrapped(request, *args, **kwargs):
+        parts, last_modified = validator(request, *args, **kwargs)
+        if parts is None:
+            return None, None
+        return (*parts, request.GET.urlencode()), last_modified
+    return wrapped
+
+
+def post_validator(request, post_id):
+    """updated поста меняется при правке и с каждым комментарием."""
+    updated = (Post.objects.filter(pk=post_id)
+               .values_list('updated', flat=True).order_by('pk').first())
+    if updated is None:
+        return None, None
+    return (updated.isoformat(), request.GET.urlencode()), updated
+
+
+def _fields(request, serializer):
+    try:
+        return serializer.parse(request.GET.get('fields'))
+    except ValueError as error:
+        raise ApiError(400, str(error))
+
+
+def _positive_int(value):
+    """Число из цифр ASCII или None: isdigit() пропускает и «²»,
+    на котором int() падает."""
+    if not (value.isascii() and value.isdigit()):
+        return None
+    return int(value)
+
+
+def _int_param(request, name, default, maximum):
+    value = request.GET.get(name)
+    if value is None:
+        return default
+    number = _positive_int(value)
+    if number is None or not 1 <= number <= maximum:
+        raise ApiError(400, f'{name}: целое число от 1 до {maximum}.')
+    return number
+
+
+def _link(request, name, cursor):
+    if cursor is None:
+        return None
+    query = request.GET.copy()
+    query.pop('after', None)
+    query.pop('before', None)
+    query[name] = cursor
+    return f'{request.path}?{query.urlencode()}'
+
+
+def _page(request, paginator, serializer, names):
+    # HTML-ленты на испорченном курсоре молча отдают первую страницу,
+    # клиенту API лучше узнать об ошибке
+    for name in ('after', 'before'):
+        cursor = request.GET.get(name)
+        if cursor and paginator.parse_cursor(cursor) is None:
+            raise ApiError(400, f'{name}: испорченный курсор.')
+    page = paginator.get_page(request.GET.get('after'),
+                              request.GET.get('before'))
+    return _json({
+        'results': [serializer.dump(row, names) for row in page],
+        'next': _link(request, 'after', paginator.next_cursor),
+        'previous': _link(request, 'before', paginator.previous_cursor),
+    })
+
+
+def _list(request, queryset, serializer, key):
+    """Страница списка или, с параметром ids=, записи по списку id."""
+    names = _fields(request, serializer)
+    rows = queryset.values(*serializer.columns(names, key))
+    if 'ids' in request.GET:
+        return _by_ids(request, rows, serializer, names)
+    per_page = _int_param(request, 'limit',
+                          settings.PAGINATOR_NUMBER_OF_PAGES,
+                          settings.API_MAX_PAGE_SIZE)
+    return _page(request, ValuesCursorPaginator(rows, per_page, key),
+                 serializer, names)
+
+
+def _by_ids(request, rows, serializer, names):
+    """Записи в порядке ids=; отсутствующие пропускаются."""
+    raw = [_positive_int(value)
+           for value in request.GET['ids'].split(',') if value]
+    if not raw or None in raw:
+        raise ApiError(400, 'ids: список id через запятую.')
+    if len(raw) > settings.API_MAX_IDS:
+        raise ApiError(400, f'ids: не больше {settings.API_MAX_IDS} id.')
+    ids = list(dict.fromkeys(raw))
+    found = {row['id']: row
+             for row in rows.filter(pk__in=ids).order_by()}
+    return _json({'results': [serializer.dump(found[pk], names)
+                              for pk in ids if pk in found]})
+
+
+@conditional_page(_with_query(index_validator))
+@api_view
+def posts(request):
+    """Главная лента или посты по ids=."""
+    return _list(request, Post.objects.all(), serializers.posts, POST_KEY)
+
+
+@conditional_page(post_validator)
+@api_view
+def post(request, post_id):
+    names = _fields(request, serializers.posts)
+    row = get_object_or_404(
+        Post.objects.values(*serializers.posts.columns(names, ['id'])),
+        pk=post_id)
+    return _json(serializers.posts.dump(row, names))
+
+
+@conditional_page(post_validator)
+@api_view
+def post_comments(request, post_id):
+    get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    return _list(request, Comment.objects.filter(post=post_id),
+                 serializers.comments, COMMENT_KEY)
+
+
+@api_view
+def comments(request):
+    """Комментарии по ids=."""
+    if 'ids' not in request.GET:
+        raise ApiError(400, 'Нужен параметр ids.')
+    return _list(request, Comment.objects.all(), serializers.comments,
+                 COMMENT_KEY)
+
+
+@conditional_page(_with_query(group_validator))
+@api_view
+def group_posts(request, slug):
+    group_id = get_object_or_404(Group.objects.values_list('pk', flat=True),
+                                 slug=slug)
+    return _list(request, Post.objects.filter(group=group_id),
+                 serializers.posts, POST_KEY)
+
+
+@conditional_page(_with_query(profile_validator))
+@api_view
+def profile_posts(request, username):
+    author_id = get_object_or_404(User.objects.values_list('pk', flat=True),
+                                  username=username)
+    return _list(request, Post.objects.filter(author=author_id),
+                 serializers.posts, POST_KEY)
+
+
+@api_view
+def feed(request):
+    """Лента подписок текущего пользователя."""
+    if not request.user.is_authenticated:
+        raise ApiError(401, 'Нужно войти.')
+    names = _fields(request, serializers.posts)
+    rows = Post.objects.values(*serializers.posts.columns(names, POST_KEY))
+    per_page = _int_param(request, 'limit',
+                          settings.PAGINATOR_NUMBER_OF_PAGES,
+                          settings.API_MAX_PAGE_SIZE)
+    paginator = TimelineValuesPaginator(request.user, rows, per_page)
+    return _page(request, paginator, serializers.posts, names)
@@ -0,0 +1,14 @@
+from django.apps import AppConfig
+from django.core.signals import request_started
+from django.db.backends.signals import connection_created
+
+
+class CoreConfig(AppConfig):
+    name = 'core'
+
+    def ready(self):
+        from .connections import apply_pragmas, check_connections
+        from .metrics import install_wrapper
+        connection_created.connect(apply_pragmas)
+        connection_created.connect(install_wrapper)
+        request_started.connect(check_connections)
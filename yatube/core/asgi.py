@@ -0,0 +1,125 @@
+"""ASGI-приложение поверх WSGI-обработчика Django.
+
+Django 2.2 не умеет ASGI, поэтому запрос выполняется обычным
+WSGIHandler в пуле потоков (settings.ASGI_THREADS), а event loop только
+принимает тело запроса и отдаёт ответ. Один процесс ASGI-сервера
+(uvicorn, daphne, hypercorn) держит много медленных клиентов, а поток
+занят лишь пока выполняется view.
+
+    application = WsgiToAsgi(get_wsgi_application())
+"""
+import asyncio
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+
+def build_environ(scope, body):
+    """WSGI environ из ASGI scope (PEP 3333)."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'].encode().decode('latin1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', ()):
+        key = name.decode('latin1').upper().replace('-', '_')
+        if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            key = f'HTTP_{key}'
+        value = value.decode('latin1')
+        if key in environ:
+            value = f'{environ[key]},{value}'
+        environ[key] = value
+    return environ
+
+
+class WsgiToAsgi:
+
+    def __init__(self, wsgi_application, threads=None):
+        self.wsgi_application = wsgi_application
+        self.executor = ThreadPoolExecutor(
+            max_workers=threads or settings.ASGI_THREADS,
+            thread_name_prefix='asgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError(f'Неподдерживаемый тип соединения: '
+                             f'{scope["type"]}')
+        # Большое тело (загрузка картинки) уходит на диск
+        body = tempfile.SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+        try:
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    return
+                body.write(message.get('body', b''))
+                if not message.get('more_body'):
+                    break
+            body.seek(0)
+            loop = asyncio.get_running_loop()
+
+            def send_sync(message):
+                asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+            await loop.run_in_executor(self.executor, self.handle,
+                                       build_environ(scope, body), send_sync)
+        finally:
+            body.close()
+
+    @staticmethod
+    async def lifespan(receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def handle(self, environ, send):
+        """Выполняется в потоке пула."""
+        started = []
+
+        def start_response(status, headers, exc_info=None):
+            started[:] = [status, headers]
+
+        response = self.wsgi_application(environ, start_response)
+        try:
+            status, headers = started
+            send({
+                'type': 'http.response.start',
+                'status': int(status.split(' ', 1)[0]),
+                'headers': [(name.lower().encode('latin1'),
+                             value.encode('latin1'))
+                            for name, value in headers],
+            })
+            for chunk in response:
+                if chunk:
+                    send({'type': 'http.response.body', 'body': chunk,
+                          'more_body': True})
+            send({'type': 'http.response.body'})
+        finally:
+            # Django закрывает соединения с БД по request_finished
+            close = getattr(response, 'close', None)
+            if close is not None:
+                close()
@@ -0,0 +1,34 @@
+"""SQLite с выбором режима транзакций.
+
+    'ENGINE': 'core.backends.sqlite3',
+    'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
+
+atomic() начинает транзакцию с BEGIN IMMEDIATE: блокировка на запись
+берётся сразу и ждёт busy_timeout. При обычном BEGIN транзакция, которая
+сначала читает, а потом пишет, в WAL падает с «database is locked» без
+всякого ожидания, если другой писатель успел закоммитить между её
+чтением и записью. Так же устроена опция в Django 5.1.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        mode = kwargs.pop('transaction_mode', None)
+        if mode is not None and mode.upper() not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f'transaction_mode должен быть одним из '
+                f'{", ".join(TRANSACTION_MODES)}.')
+        self.transaction_mode = mode and mode.upper()
+        return kwargs
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode:
+            self.cursor().execute(f'BEGIN {self.transaction_mode}')
+        else:
+            super()._start_transaction_under_autocommit()
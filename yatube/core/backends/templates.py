@@ -0,0 +1,35 @@
+"""Шаблоны Django с замером времени рендера для core.metrics.
+
+    'BACKEND': 'core.backends.templates.DjangoTemplates',
+
+Замеряется только рендер шаблона, полученного через бэкенд (render(),
+TemplateResponse, render_to_string). {% include %} и {% extends %}
+рендерятся внутри него и отдельно не считаются.
+"""
+import time
+
+from django.template.backends import django
+
+from .. import metrics
+
+
+class Template(django.Template):
+
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.add_template_time(time.perf_counter() - started)
+
+
+class DjangoTemplates(django.DjangoTemplates):
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except django.TemplateDoesNotExist as exc:
+            django.reraise(exc, self)
@@ -0,0 +1,308 @@
+"""Двухуровневый кэш и защита от одновременного пересчёта значений.
+
+TwoTierCache — L1 в памяти процесса перед общим L2.
+
+L1 — ограниченный LRU с коротким сроком жизни, он снимает с L2 повторные
+чтения одних и тех же фрагментов внутри воркера. L2 — любой кэш из
+settings.CACHES (по умолчанию FileBasedCache), общий для всех воркеров,
+поэтому страница рендерится один раз на сервер, а не на каждый процесс.
+
+Другой процесс может увидеть изменение ключа с опозданием до L1_TIMEOUT
+секунд. Ключи, которые должны читаться свежими (версии лент), задаются
+префиксами L1_BYPASS и всегда читаются из L2.
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.TwoTierCache',
+            'OPTIONS': {'L2': 'shared', 'L1_TIMEOUT': 5,
+                        'L1_MAX_ENTRIES': 1000,
+                        'L1_BYPASS': ['feed_version:']},
+        },
+        'shared': {...},
+    }
+
+get_or_compute() — пересчёт значения одним запросом с досрочным
+истечением; на нём же работает тег {% cache %} из библиотеки singleflight.
+Блокировка пересчёта — cache.add(), поэтому add() у L2 должен быть
+атомарным между процессами. У FileBasedCache из Django это проверка и
+запись по отдельности; вместо него в L2 ставится FileBasedCache отсюда.
+"""
+import math
+import os
+import pickle
+import random
+import tempfile
+import threading
+import time
+from collections import Counter, OrderedDict, namedtuple
+
+from django.core.cache import cache as default_cache
+from django.core.cache import caches
+from django.core.cache.backends import filebased
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from . import metrics
+
+# Нет значения в L1 или L2
+_MISSING = object()
+
+
+class TwoTierCache(BaseCache):
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._l2_alias = options.get('L2', 'shared')
+        self._l1_timeout = options.get('L1_TIMEOUT', 5)
+        self._l1_max_entries = options.get('L1_MAX_ENTRIES', 1000)
+        self._l1_bypass = tuple(options.get('L1_BYPASS', ()))
+        self._l1 = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = Counter()
+
+    @property
+    def l2(self):
+        return caches[self._l2_alias]
+
+    def stats(self):
+        """Попадания и промахи по уровням: l1_hits, l2_misses и т.д."""
+        with self._lock:
+            return dict(self._stats)
+
+    def _count(self, tier, hits, misses):
+        with self._lock:
+            self._stats[f'{tier}_hits'] += hits
+            self._stats[f'{tier}_misses'] += misses
+        metrics.count_cache(tier, hits, misses)
+
+    def _l1_allowed(self, key):
+        return not key.startswith(self._l1_bypass)
+
+    def _l1_get(self, key, version):
+        if not self._l1_allowed(key):
+            return _MISSING
+        l1_key = self.make_key(key, version)
+        with self._lock:
+            item = self._l1.get(l1_key)
+            if item is None:
+                return _MISSING
+            expires, pickled = item
+            if expires < time.monotonic():
+                del self._l1[l1_key]
+                return _MISSING
+            self._l1.move_to_end(l1_key)
+        return pickle.loads(pickled)
+
+    def _l1_set(self, key, value, timeout, version):
+        if not self._l1_allowed(key):
+            return
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.l2.default_timeout
+        ttl = self._l1_timeout if timeout is None else min(
+            timeout, self._l1_timeout)
+        l1_key = self.make_key(key, version)
+        if ttl <= 0:
+            self._l1_delete(l1_key)
+            return
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._l1[l1_key] = (time.monotonic() + ttl, pickled)
+            self._l1.move_to_end(l1_key)
+            while len(self._l1) > self._l1_max_entries:
+                self._l1.popitem(last=False)
+
+    def _l1_delete(self, l1_key):
+        with self._lock:
+            self._l1.pop(l1_key, None)
+
+    def get(self, key, default=None, version=None):
+        value = self._l1_get(key, version)
+        if value is not _MISSING:
+            self._count('l1', 1, 0)
+            return value
+        self._count('l1', 0, 1)
+        value = self.l2.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            self._count('l2', 0, 1)
+            return default
+        self._count('l2', 1, 0)
+        self._l1_set(key, value, self._l1_timeout, version)
+        return value
+
+    def get_many(self, keys, version=None):
+        result = {}
+        rest = []
+        for key in keys:
+            value = self._l1_get(key, version)
+            if value is not _MISSING:
+                result[key] = value
+            else:
+                rest.append(key)
+        self._count('l1', len(result), len(rest))
+        if rest:
+            fetched = self.l2.get_many(rest, version=version)
+            self._count('l2', len(fetched), len(rest) - len(fetched))
+            for key, value in fetched.items():
+                self._l1_set(key, value, self._l1_timeout, version)
+            result.update(fetched)
+        return result
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.l2.set(key, value, timeout, version=version)
+        self._l1_set(key, value, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.l2.set_many(data, timeout, version=version)
+        for key, value in data.items():
+            if key not in failed:
+                self._l1_set(key, value, timeout, version)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.l2.add(key, value, timeout, version=version)
+        if added:
+            self._l1_set(key, value, timeout, version)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.l2.touch(key, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self._l1_delete(self.make_key(key, version))
+        return self.l2.incr(key, delta, version=version)
+
+    def has_key(self, key, version=None):
+        return (self._l1_get(key, version) is not _MISSING
+                or self.l2.has_key(key, version=version))
+
+    def delete(self, key, version=None):
+        self._l1_delete(self.make_key(key, version))
+        self.l2.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self._l1_delete(self.make_key(key, version))
+        self.l2.delete_many(keys, version=version)
+
+    def clear(self):
+        with self._lock:
+            self._l1.clear()
+        self.l2.clear()
+
+    def close(self, **kwargs):
+        self.l2.close(**kwargs)
+
+
+class FileBasedCache(filebased.FileBasedCache):
+    """FileBasedCache с атомарным add().
+
+    Файл записи появляется через os.link(), который не заменяет
+    существующий файл: из нескольких процессов add() удаётся ровно одному.
+    """
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._createdir()
+        fname = self._key_to_file(key, version)
+        self._cull()
+        fd, tmp_path = tempfile.mkstemp(dir=self._dir)
+        try:
+            with open(fd, 'wb') as f:
+                self._write_content(f, timeout, value)
+            # Вторая попытка — после удаления просроченной записи
+            for _ in range(2):
+                try:
+                    os.link(tmp_path, fname)
+                    return True
+                except FileExistsError:
+                    if not self._remove_expired(fname):
+                        return False
+            return False
+        finally:
+            os.remove(tmp_path)
+
+    def _remove_expired(self, fname):
+        """Убирает просроченную запись; True, если место свободно.
+
+        Файл сначала переносится в сторону, и удаляется, только если это
+        тот самый просроченный файл: другой add() мог успеть положить на
+        его место свой, тогда он возвращается обратно.
+        """
+        try:
+            with open(fname, 'rb') as f:
+                try:
+                    expiry = pickle.load(f)
+                except EOFError:
+                    expiry = 0
+                if expiry is None or expiry >= time.time():
+                    return False
+                inode = os.fstat(f.fileno()).st_ino
+            grave = f'{fname}.{os.getpid()}.{threading.get_ident()}.expired'
+            os.rename(fname, grave)
+        except FileNotFoundError:
+            return True
+        try:
+            if os.stat(grave).st_ino != inode:
+                try:
+                    os.link(grave, fname)
+                except FileExistsError:
+                    pass
+                return False
+            return True
+        finally:
+            os.remove(grave)
+
+
+class Fragment(namedtuple('Fragment', 'value expires delta')):
+    """Значение в кэше вместе с мягким сроком и временем пересчёта."""
+
+
+def _needs_refresh(fragment, beta):
+    """Вероятностное досрочное истечение (XFetch).
+
+    Чем дороже пересчёт (delta) и ближе срок, тем вероятнее, что один из
+    запросов пересчитает значение заранее, пока остальные читают старое.
+    """
+    if fragment.expires is None:
+        return False
+    jitter = fragment.delta * beta * math.log(1 - random.random())
+    return time.time() - jitter >= fragment.expires
+
+
+def get_or_compute(key, compute, timeout, cache=None, beta=1.0,
+                   lock_timeout=10):
+    """Кэшированное значение compute() с защитой от «набегания».
+
+    После мягкого срока timeout значение ещё timeout секунд хранится в
+    кэше: пересчитывает его один запрос, взявший блокировку cache.add(),
+    а остальные получают старое значение. Если значения нет совсем,
+    остальные ждут результата блокирующего запроса до lock_timeout
+    секунд и только потом считают сами.
+    """
+    cache = cache or default_cache
+    fragment = cache.get(key)
+    if isinstance(fragment, Fragment) and not _needs_refresh(fragment, beta):
+        return fragment.value
+    stale = fragment.value if isinstance(fragment, Fragment) else None
+
+    lock_key = f'{key}:lock'
+    locked = cache.add(lock_key, 1, lock_timeout)
+    if not locked:
+        if stale is not None:
+            return stale
+        deadline = time.monotonic() + lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            fragment = cache.get(key)
+            if isinstance(fragment, Fragment):
+                return fragment.value
+    try:
+        started = time.time()
+        value = compute()
+        delta = time.time() - started
+        expires = None if timeout is None else time.time() + timeout
+        hard_timeout = None if timeout is None else timeout * 2
+        cache.set(key, Fragment(value, expires, delta), hard_timeout)
+    finally:
+        if locked:
+            cache.delete(lock_key)
+    return value
@@ -0,0 +1,65 @@
+"""Параллельное выполнение независимых запросов view.
+
+Django 2.2 не умеет async-view, поэтому независимые запросы страницы
+(страница ленты, проверка подписки, комментарии) выполняются в общем пуле
+потоков, у каждого потока своё соединение с БД. Выигрыш есть, когда
+запросы ждут сеть — БД или кэш на другом сервере, — а не процессор.
+
+    follow, page = gather(lambda: ..., lambda: ...)
+
+Внутри транзакции запросы выполняются по очереди в текущем потоке:
+другое соединение не увидит её незакоммиченных данных. Так же при
+VIEW_QUERY_THREADS = 0.
+"""
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+# Пулы по числу потоков: VIEW_QUERY_THREADS меняют в тестах и bench_views
+_executors = {}
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    size = settings.VIEW_QUERY_THREADS
+    with _executor_lock:
+        if size not in _executors:
+            _executors[size] = ThreadPoolExecutor(
+                max_workers=size, thread_name_prefix='view-query')
+        return _executors[size]
+
+
+def _call(func):
+    # Соединения потока пула живут по тем же правилам, что и у запроса
+    close_old_connections()
+    try:
+        return func()
+    finally:
+        close_old_connections()
+
+
+def _in_transaction():
+    return any(connection.in_atomic_block for connection in connections.all())
+
+
+def gather(*funcs):
+    """Результаты функций в том же порядке; исключение пробрасывается.
+
+    Первая функция выполняется в текущем потоке, остальные — в пуле.
+    """
+    if (settings.VIEW_QUERY_THREADS < 1 or len(funcs) < 2
+            or _in_transaction()):
+        return [func() for func in funcs]
+    executor = _get_executor()
+    # Контекст (закрепление чтения за основной БД) переходит в потоки пула
+    futures = [executor.submit(contextvars.copy_context().run, _call, func)
+               for func in funcs[1:]]
+    try:
+        first = funcs[0]()
+    finally:
+        # Дожидаемся остальных и при ошибке: не оставляем запросы без хозяина
+        wait(futures)
+    return [first, *(future.result() for future in futures)]
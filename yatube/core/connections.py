@@ -0,0 +1,49 @@
+"""Настройка соединений с БД.
+
+apply_pragmas (connection_created) выполняет PRAGMA из
+settings.SQLITE_PRAGMAS на каждом новом соединении SQLite: WAL, чтобы
+читатели не ждали писателя, busy_timeout, чтобы писатель ждал
+блокировку, а не падал с «database is locked», размер кэша и mmap.
+
+check_connections (request_started) — проверка постоянных соединений
+(CONN_MAX_AGE) перед запросом, как CONN_HEALTH_CHECKS в Django 4.1:
+закрываем соединение, если сервер БД его оборвал. У SQLite проверять
+нечего, кроме подмены файла (реплика из simulate_replication): старое
+соединение читало бы удалённый файл вечно.
+"""
+import os
+
+from django.conf import settings
+from django.db import connections
+
+
+def _inode(connection):
+    try:
+        return os.stat(connection.settings_dict['NAME']).st_ino
+    except (OSError, TypeError, ValueError):
+        return None
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    # Мимо курсоров Django: служебные запросы не попадают в логи и счётчики
+    for name, value in settings.SQLITE_PRAGMAS.items():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
+    connection.sqlite_inode = _inode(connection)
+
+
+def is_healthy(connection):
+    if connection.vendor == 'sqlite':
+        return getattr(connection, 'sqlite_inode', None) == _inode(connection)
+    return connection.is_usable()
+
+
+def check_connections(**kwargs):
+    for connection in connections.all():
+        if (connection.connection is None
+                or not connection.settings_dict.get('CONN_HEALTH_CHECKS')
+                or connection.in_atomic_block):
+            continue
+        if not is_healthy(connection):
+            connection.close()
@@ -0,0 +1,207 @@
+"""Очередь фоновых задач в базе данных, без внешнего брокера.
+
+    @task(timeout=600)
+    def generate(post_id):
+        ...
+
+    generate.delay(post.pk)                    # в текущей транзакции
+    generate.delay(post.pk, run_at=tomorrow)   # отложенная задача
+    generate(post.pk)                          # синхронно, как функция
+
+Задача записывается в таблицу core_job в той же транзакции, что и данные,
+поэтому не теряется при откате и не выполняется раньше коммита. Выполняет
+задачи команда runworker.
+
+Воркер забирает задачу, выставляя locked_until = сейчас + timeout. Если
+воркер упал, после этого срока задачу заберёт другой (visibility
+timeout). Там, где БД умеет SELECT ... FOR UPDATE SKIP LOCKED, задача
+берётся так; в SQLite — условным UPDATE по id, который проходит только у
+одного воркера. Ошибка откладывает задачу с экспоненциальной задержкой,
+после max_attempts попыток она помечается failed. Периодические задачи
+из settings.JOBS_PERIODIC хранятся одной строкой и после выполнения
+переносятся на период вперёд.
+
+Задачи регистрируются при импорте модуля с декоратором @task; модули
+приложений импортируются в их AppConfig.ready().
+"""
+import json
+import logging
+import random
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+from .routers import use_primary
+
+logger = logging.getLogger(__name__)
+
+REGISTRY = {}
+
+
+class Task:
+    def __init__(self, func, max_attempts, timeout):
+        self.func = func
+        self.name = f'{func.__module__}.{func.__qualname__}'
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.__doc__ = func.__doc__
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, run_at=None, **kwargs):
+        """Ставим задачу в очередь."""
+        return Job.objects.create(
+            name=self.name,
+            payload=json.dumps({'args': args, 'kwargs': kwargs}),
+            run_at=run_at or timezone.now(),
+            max_attempts=self.max_attempts,
+            timeout=self.timeout,
+        )
+
+
+def task(func=None, *, max_attempts=5, timeout=300):
+    """Регистрируем функцию как фоновую задачу."""
+    def register(func):
+        registered = Task(func, max_attempts, timeout)
+        REGISTRY[registered.name] = registered
+        return registered
+    return register(func) if func else register
+
+
+def schedule_periodic():
+    """Заводим строки периодических задач из settings.JOBS_PERIODIC."""
+    for name, interval in settings.JOBS_PERIODIC.items():
+        registered = REGISTRY[name]
+        job, created = Job.objects.get_or_create(
+            key=f'periodic:{name}',
+            defaults={'name': name, 'interval': interval,
+                      'max_attempts': registered.max_attempts,
+                      'timeout': registered.timeout},
+        )
+        if not created and job.interval != interval:
+            Job.objects.filter(pk=job.pk).update(interval=interval)
+
+
+def _ready(now):
+    return Job.objects.filter(
+        Q(locked_until__isnull=True) | Q(locked_until__lt=now),
+        status=Job.QUEUED, run_at__lte=now,
+    )
+
+
+def claim(worker):
+    """Забираем одну готовую задачу или возвращаем None.
+
+    Блокировка БД (в SQLite — «database is locked») пробрасывается:
+    очередь при этом не пуста, воркер попробует ещё раз.
+    """
+    now = timezone.now()
+    ready = _ready(now).order_by('run_at', 'pk')
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job = ready.select_for_update(skip_locked=True).first()
+            if job is None:
+                return None
+            return _lock(job.pk, job.timeout, worker, now)
+    candidates = ready.values_list('pk', 'timeout')[:settings.JOBS_CLAIM_BATCH]
+    for job_id, timeout in candidates:
+        job = _lock(job_id, timeout, worker, now)
+        if job is not None:
+            return job
+    return None
+
+
+def _lock(job_id, timeout, worker, now):
+    """UPDATE с теми же условиями, что и выборка: из нескольких воркеров,
+    выбравших одну задачу, строку обновит только первый. Чтение — в той же
+    транзакции: если оно сорвётся, задача не останется забранной."""
+    with transaction.atomic():
+        locked = _ready(now).filter(pk=job_id).update(
+            locked_by=worker,
+            locked_until=now + timedelta(seconds=timeout),
+            attempts=F('attempts') + 1,
+        )
+        if not locked:
+            return None
+        return Job.objects.get(pk=job_id)
+
+
+def backoff(attempts):
+    """Задержка перед повтором: растёт вдвое, со случайным разбросом."""
+    delay = min(settings.JOBS_BACKOFF * 2 ** (attempts - 1),
+                settings.JOBS_BACKOFF_MAX)
+    return delay * random.uniform(0.5, 1)
+
+
+def _settle(operation, attempts=5):
+    """Записываем итог задачи, переждав кратковременную блокировку БД:
+    иначе выполненная задача повторится после таймаута."""
+    for attempt in range(attempts):
+        try:
+            return operation()
+        except OperationalError:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(0.05 * 2 ** attempt)
+
+
+def run(job):
+    """Выполняем забранную задачу. True, если успешно."""
+    mine = Job.objects.filter(pk=job.pk, locked_by=job.locked_by)
+    try:
+        registered = REGISTRY.get(job.name)
+        if registered is None:
+            raise LookupError(f'Неизвестная задача {job.name}')
+        payload = json.loads(job.payload)
+        # Задачу ставят вслед за записью: реплика может её ещё не видеть
+        with use_primary():
+            registered.func(*payload['args'], **payload['kwargs'])
+    except Exception:
+        error = traceback.format_exc()
+        logger.error('Задача %s упала:\n%s', job, error)
+        now = timezone.now()
+        if job.attempts < job.max_attempts:
+            retry_at = now + timedelta(seconds=backoff(job.attempts))
+            _settle(lambda: mine.update(
+                run_at=retry_at, locked_by='', locked_until=None,
+                last_error=error))
+        elif job.interval:
+            _settle(lambda: _reschedule(mine, job, now, last_error=error))
+        else:
+            _settle(lambda: mine.update(
+                status=Job.FAILED, locked_by='', locked_until=None,
+                last_error=error))
+        return False
+    if job.interval:
+        _settle(lambda: _reschedule(mine, job, timezone.now(),
+                                    last_error=''))
+    else:
+        _settle(mine.delete)
+    return True
+
+
+def _reschedule(mine, job, now, **fields):
+    return mine.update(run_at=now + timedelta(seconds=job.interval),
+                       attempts=0, locked_by='', locked_until=None,
+                       **fields)
+
+
+def run_pending(worker='inline'):
+    """Выполняем все готовые задачи в текущем потоке: число выполненных.
+
+    Для тестов и разовых запусков (runworker --once).
+    """
+    done = 0
+    while True:
+        job = claim(worker)
+        if job is None:
+            return done
+        run(job)
+        done += 1
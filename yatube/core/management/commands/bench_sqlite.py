@@ -0,0 +1,129 @@
+import os
+import random
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import (OperationalError, close_old_connections, connections,
+                       transaction)
+from django.test.utils import override_settings
+
+ALIAS = 'bench_sqlite'
+ROWS = 1000
+
+
+def _read(cursor):
+    for _ in range(5):
+        cursor.execute('SELECT id, counter FROM bench WHERE id = %s',
+                       [random.randint(1, ROWS)])
+        cursor.fetchone()
+
+
+def _write(cursor):
+    # Чтение, затем запись в одной транзакции, как в view с atomic
+    row_id = random.randint(1, ROWS)
+    cursor.execute('SELECT counter FROM bench WHERE id = %s', [row_id])
+    counter, = cursor.fetchone()
+    cursor.execute('UPDATE bench SET counter = %s WHERE id = %s',
+                   [counter + 1, row_id])
+    cursor.execute('INSERT INTO bench_log (bench_id) VALUES (%s)', [row_id])
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает чтение и запись SQLite из нескольких потоков с '
+            'настройками по умолчанию и с профилем: SQLITE_PRAGMAS, '
+            'постоянные соединения и BEGIN IMMEDIATE. Каждый «запрос» — '
+            'пять чтений или транзакция чтение+запись; без профиля '
+            'соединение закрывается после запроса. БД создаётся во '
+            'временном каталоге.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=3)
+
+    def handle(self, *args, **options):
+        profile = settings.SQLITE_PRAGMAS
+        with tempfile.TemporaryDirectory() as directory:
+            for name, pragmas, database in (
+                    ('без профиля', {}, {}),
+                    ('с профилем', profile, {
+                        'ENGINE': 'core.backends.sqlite3',
+                        'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
+                        'CONN_MAX_AGE': 60,
+                    })):
+                database.setdefault('NAME', os.path.join(
+                    directory, f'{len(pragmas)}.sqlite3'))
+                with override_settings(SQLITE_PRAGMAS=pragmas):
+                    result = self._run(database, options)
+                self.stdout.write(
+                    f'{name}: чтений {result["read"]:.0f}/с, '
+                    f'записей {result["write"]:.0f}/с, '
+                    f'ошибок «database is locked»: {result["locked"]}')
+
+    def _run(self, database, options):
+        connections.databases[ALIAS] = {
+            'ENGINE': 'django.db.backends.sqlite3', **database}
+        try:
+            self._fill()
+            counts = {'read': 0, 'write': 0, 'locked': 0}
+            lock = threading.Lock()
+            stop = threading.Event()
+            threads = [
+                threading.Thread(target=self._work,
+                                 args=(kind, stop, counts, lock))
+                for kind, number in (('read', options['readers']),
+                                     ('write', options['writers']))
+                for _ in range(number)
+            ]
+            for thread in threads:
+                thread.start()
+            time.sleep(options['seconds'])
+            stop.set()
+            for thread in threads:
+                thread.join()
+        finally:
+            connections[ALIAS].close()
+            del connections[ALIAS]
+            del connections.databases[ALIAS]
+        return {'read': counts['read'] / options['seconds'],
+                'write': counts['write'] / options['seconds'],
+                'locked': counts['locked']}
+
+    @staticmethod
+    def _fill():
+        with transaction.atomic(using=ALIAS):
+            with connections[ALIAS].cursor() as cursor:
+                cursor.execute('CREATE TABLE bench (id INTEGER PRIMARY KEY, '
+                               'counter INTEGER NOT NULL)')
+                cursor.execute('CREATE TABLE bench_log '
+                               '(id INTEGER PRIMARY KEY, '
+                               'bench_id INTEGER NOT NULL)')
+                cursor.executemany('INSERT INTO bench (counter) VALUES (%s)',
+                                   [[0]] * ROWS)
+
+    @staticmethod
+    def _work(kind, stop, counts, lock):
+        try:
+            while not stop.is_set():
+                try:
+                    if kind == 'read':
+                        with connections[ALIAS].cursor() as cursor:
+                            _read(cursor)
+                    else:
+                        with transaction.atomic(using=ALIAS):
+                            with connections[ALIAS].cursor() as cursor:
+                                _write(cursor)
+                    result = kind
+                except OperationalError as error:
+                    if 'locked' not in str(error):
+                        raise
+                    result = 'locked'
+                with lock:
+                    counts[result] += 1
+                # Конец «запроса»: без CONN_MAX_AGE соединение закрывается
+                close_old_connections()
+        finally:
+            connections[ALIAS].close()
@@ -0,0 +1,123 @@
+import asyncio
+import io
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from core.asgi import WsgiToAsgi, build_environ
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+from posts.models import Post
+
+
+def _scope(path):
+    return {'type': 'http', 'method': 'GET', 'path': path,
+            'query_string': b'', 'headers': [(b'host', b'localhost')],
+            'server': ('localhost', 80)}
+
+
+def _check(path, status):
+    if not status.startswith('200'):
+        raise CommandError(f'{path}: {status}')
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность страниц лент через WSGI и '
+            'ASGI, с параллельными запросами view (VIEW_QUERY_THREADS) и '
+            'без, при искусственной задержке каждого запроса к БД.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=16,
+                            help='Одновременных запросов и потоков сервера.')
+        parser.add_argument('--latency', type=float, default=5,
+                            help='Задержка запроса к БД, мс.')
+
+    def handle(self, *args, **options):
+        paths = self._paths()
+        delay = options['latency'] / 1000
+
+        def slow(execute, sql, params, many, context):
+            time.sleep(delay)
+            return execute(sql, params, many, context)
+
+        def add_latency(connection, **kwargs):
+            # Объект соединения потока переживает переподключения
+            if slow not in connection.execute_wrappers:
+                connection.execute_wrappers.append(slow)
+
+        for connection in connections.all():
+            connection.close()
+        connection_created.connect(add_latency)
+        try:
+            handler = get_wsgi_application()
+            for path_name, run in (('WSGI', self._wsgi),
+                                   ('ASGI', self._asgi)):
+                for threads in (0, settings.VIEW_QUERY_THREADS):
+                    with override_settings(VIEW_QUERY_THREADS=threads):
+                        run(handler, paths, options)  # прогрев
+                        started = time.monotonic()
+                        run(handler, paths, options)
+                        elapsed = time.monotonic() - started
+                    mode = (f'потоков запросов: {threads}' if threads
+                            else 'запросы по очереди')
+                    self.stdout.write(
+                        f'{path_name}, {mode}: '
+                        f'{options["requests"] / elapsed:.1f} стр/с')
+        finally:
+            connection_created.disconnect(add_latency)
+
+    @staticmethod
+    def _paths():
+        post = (Post.objects.select_related('author', 'group')
+                .exclude(group=None).order_by('-pk').first())
+        if post is None:
+            raise CommandError('Нужен хотя бы один пост с группой.')
+        username = post.author.username
+        return ['/', f'/group/{post.group.slug}/', f'/{username}/',
+                f'/{username}/{post.pk}/']
+
+    @staticmethod
+    def _wsgi(handler, paths, options):
+        """Многопоточный WSGI-сервер: поток на запрос."""
+        def request(path):
+            response = handler(build_environ(_scope(path), io.BytesIO()),
+                               lambda status, headers: _check(path, status))
+            b''.join(response)
+            response.close()
+
+        requests = itertools.islice(itertools.cycle(paths),
+                                    options['requests'])
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            list(executor.map(request, requests))
+
+    @staticmethod
+    def _asgi(handler, paths, options):
+        application = WsgiToAsgi(handler, threads=options['concurrency'])
+
+        async def request(path, semaphore):
+            async def receive():
+                return {'type': 'http.request', 'body': b''}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    _check(path, str(message['status']))
+
+            async with semaphore:
+                await application(_scope(path), receive, send)
+
+        async def run_all():
+            semaphore = asyncio.Semaphore(options['concurrency'])
+            requests = itertools.islice(itertools.cycle(paths),
+                                        options['requests'])
+            await asyncio.gather(*(request(path, semaphore)
+                                   for path in requests))
+
+        try:
+            asyncio.run(run_all())
+        finally:
+            application.executor.shutdown()
@@ -0,0 +1,70 @@
+import logging
+import os
+import signal
+import socket
+import threading
+
+from core import jobs
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = ('Выполняет фоновые задачи из очереди core.jobs в нескольких '
+            'потоках. Можно запускать сколько угодно таких процессов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int,
+                            default=settings.JOBS_CONCURRENCY,
+                            help='Число потоков-воркеров.')
+        parser.add_argument('--poll', type=float,
+                            default=settings.JOBS_POLL_INTERVAL,
+                            help='Пауза, когда очередь пуста, в секундах.')
+        parser.add_argument('--once', action='store_true',
+                            help='Выполнить готовые задачи и выйти.')
+
+    def handle(self, *args, **options):
+        jobs.schedule_periodic()
+        stop = threading.Event()
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(signum, lambda *args: stop.set())
+        prefix = f'{socket.gethostname()}:{os.getpid()}'
+        done = []
+        threads = [
+            threading.Thread(target=self.work,
+                             args=(f'{prefix}:{number}', stop, options, done),
+                             name=f'worker-{number}')
+            for number in range(options['concurrency'])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.stdout.write(self.style.SUCCESS(
+            f'Выполнено задач: {sum(done)}'))
+
+    def work(self, worker, stop, options, done):
+        count = 0
+        try:
+            while not stop.is_set():
+                try:
+                    job = jobs.claim(worker)
+                except OperationalError:
+                    logger.warning('Не удалось забрать задачу',
+                                   exc_info=True)
+                    stop.wait(options['poll'])
+                    continue
+                if job is not None:
+                    jobs.run(job)
+                    count += 1
+                    continue
+                if options['once']:
+                    break
+                stop.wait(options['poll'])
+        finally:
+            done.append(count)
+            connection.close()
@@ -0,0 +1,78 @@
+import contextlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+def _temporary_next_to(path):
+    fd, temporary = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(path)), suffix='.sqlite3')
+    os.close(fd)
+    return temporary
+
+
+def snapshot(source):
+    """Копия файла SQLite через backup API: согласованная, даже если в
+    source в это время пишут."""
+    path = _temporary_next_to(source)
+    with contextlib.closing(sqlite3.connect(source)) as origin:
+        with contextlib.closing(sqlite3.connect(path)) as copy:
+            origin.backup(copy)
+    return path
+
+
+def publish(path, targets):
+    """Подменяем файлы реплик снимком. os.replace атомарен: читатель
+    видит либо старый файл, либо новый целиком."""
+    for target in targets:
+        temporary = _temporary_next_to(target)
+        shutil.copyfile(path, temporary)
+        os.replace(temporary, target)
+
+
+class Command(BaseCommand):
+    help = ('Имитирует асинхронную репликацию для локальной проверки '
+            'core.routers на файлах SQLite: снимок основной БД попадает в '
+            'реплики из DATABASE_REPLICAS через --lag секунд, так что '
+            'реплики отстают на lag–2·lag секунд.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lag', type=float, default=2,
+                            help='Задержка репликации, в секундах.')
+        parser.add_argument('--once', action='store_true',
+                            help='Один снимок без задержки и выход.')
+
+    def handle(self, *args, **options):
+        source = self._path(DEFAULT_DB_ALIAS)
+        targets = [self._path(alias) for alias in settings.DATABASE_REPLICAS]
+        if not targets:
+            raise CommandError('DATABASE_REPLICAS пуст.')
+        if not options['once']:
+            self.stdout.write(
+                f'Реплики: {", ".join(targets)}. Ctrl+C — выход.')
+        try:
+            while True:
+                path = snapshot(source)
+                try:
+                    if not options['once']:
+                        time.sleep(options['lag'])
+                    publish(path, targets)
+                finally:
+                    os.unlink(path)
+                if options['once']:
+                    return
+        except KeyboardInterrupt:
+            pass
+
+    @staticmethod
+    def _path(alias):
+        connection = connections[alias]
+        if connection.vendor != 'sqlite':
+            raise CommandError(f'{alias}: нужна база SQLite.')
+        return connection.settings_dict['NAME']
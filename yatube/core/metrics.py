@@ -0,0 +1,229 @@
+"""Метрики запросов в памяти процесса и их выдача для Prometheus.
+
+MetricsMiddleware измеряет каждый запрос и складывает результат
+в гистограммы по имени URL (view_name с namespace, например api:posts):
+
+- полное время запроса;
+- время и число SQL-запросов — через execute_wrapper, который
+  ставится на каждое соединение при создании (connection_created);
+- время рендера шаблонов — через бэкенд core.backends.templates;
+- попадания и промахи TwoTierCache по уровням.
+
+Измерение текущего запроса лежит в ContextVar, поэтому запросы к БД
+и кэшу из потоков gather() тоже попадают в него. Время БД в таком
+случае суммируется по потокам и может быть больше времени запроса.
+Вне запроса (задачи, команды) обёртки только проверяют ContextVar.
+
+Метрики у каждого процесса свои: Prometheus опрашивает каждый воркер
+отдельно, а перезапуск обнуляет счётчики, что он умеет учитывать.
+Страница /metrics/ доступна персоналу и по токену METRICS_TOKEN.
+"""
+import bisect
+import threading
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+
+PREFIX = 'yatube'
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                   0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+UNRESOLVED = '<unresolved>'
+
+_current = ContextVar('metrics', default=None)
+
+
+class Measurement:
+    """Затраты одного запроса. Пишут в неё и потоки gather()."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.db_time = 0.0
+        self.queries = 0
+        self.template_time = 0.0
+        self.cache = Counter()
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами, как у Prometheus."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip((*self.buckets, '+Inf'), self.counts):
+            total += count
+            yield bound, total
+
+
+class ViewStats:
+    def __init__(self):
+        self.duration = Histogram(SECONDS_BUCKETS)
+        self.db = Histogram(SECONDS_BUCKETS)
+        self.templates = Histogram(SECONDS_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.responses = Counter()
+        self.cache = Counter()
+
+
+class Registry:
+    """Статистика процесса по именам URL."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = defaultdict(ViewStats)
+
+    def record(self, view, status, duration, measurement):
+        with self.lock:
+            stats = self.views[view]
+            stats.duration.observe(duration)
+            stats.db.observe(measurement.db_time)
+            stats.templates.observe(measurement.template_time)
+            stats.queries.observe(measurement.queries)
+            stats.responses[f'{status // 100}xx'] += 1
+            stats.cache.update(measurement.cache)
+
+    def clear(self):
+        with self.lock:
+            self.views.clear()
+
+
+registry = Registry()
+
+
+def start():
+    """Начать измерение запроса; вернуть токен для finish()."""
+    return _current.set(Measurement())
+
+
+def finish(token, view, status, duration):
+    measurement = _current.get()
+    _current.reset(token)
+    registry.record(view or UNRESOLVED, status, duration, measurement)
+
+
+def count_cache(tier, hits, misses):
+    measurement = _current.get()
+    if measurement is None:
+        return
+    with measurement.lock:
+        measurement.cache[tier, 'hit'] += hits
+        measurement.cache[tier, 'miss'] += misses
+
+
+def add_template_time(seconds):
+    measurement = _current.get()
+    if measurement is None:
+        return
+    with measurement.lock:
+        measurement.template_time += seconds
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    measurement = _current.get()
+    if measurement is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        with measurement.lock:
+            measurement.db_time += elapsed
+            measurement.queries += 1
+
+
+def install_wrapper(sender, connection, **kwargs):
+    """connection_created: обёртка живёт на объекте соединения Django,
+    поэтому переподключение её не дублирует."""
+    if execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(execute_wrapper)
+
+
+def _label(value):
+    return (str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n'))
+
+
+def _labels(**labels):
+    return ','.join(f'{name}="{_label(value)}"'
+                    for name, value in labels.items())
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _histogram(lines, name, help_text, views, attribute):
+    lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+    for view, stats in views:
+        histogram = getattr(stats, attribute)
+        total = 0
+        for bound, total in histogram.cumulative():
+            labels = _labels(view=view, le=bound)
+            lines.append(f'{name}_bucket{{{labels}}} {total}')
+        labels = _labels(view=view)
+        lines.append(f'{name}_sum{{{labels}}} {_number(histogram.sum)}')
+        lines.append(f'{name}_count{{{labels}}} {total}')
+
+
+def _counter(lines, name, help_text, samples):
+    lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+    for labels, value in samples:
+        lines.append(f'{name}{{{_labels(**labels)}}} {value}')
+
+
+def _view_metrics(lines, views):
+    _histogram(lines, f'{PREFIX}_request_duration_seconds',
+               'Время обработки запроса.', views, 'duration')
+    _histogram(lines, f'{PREFIX}_request_db_seconds',
+               'Время SQL-запросов за запрос.', views, 'db')
+    _histogram(lines, f'{PREFIX}_request_db_queries',
+               'Число SQL-запросов за запрос.', views, 'queries')
+    _histogram(lines, f'{PREFIX}_request_template_seconds',
+               'Время рендера шаблонов за запрос.', views, 'templates')
+    _counter(lines, f'{PREFIX}_responses_total',
+             'Ответы по классам кодов.', (
+                 ({'view': view, 'status': status}, count)
+                 for view, stats in views
+                 for status, count in sorted(stats.responses.items())))
+    _counter(lines, f'{PREFIX}_request_cache_total',
+             'Обращения к TwoTierCache из запросов.', (
+                 ({'view': view, 'tier': tier, 'result': result}, count)
+                 for view, stats in views
+                 for (tier, result), count in sorted(stats.cache.items())))
+
+
+def _cache_totals():
+    """Накопленные счётчики всех TwoTierCache процесса, в том числе
+    обращения вне запросов."""
+    results = {'hits': 'hit', 'misses': 'miss'}
+    for alias in settings.CACHES:
+        stats = getattr(caches[alias], 'stats', None)
+        if stats is None:
+            continue
+        for key, count in sorted(stats().items()):
+            tier, result = key.rsplit('_', 1)
+            yield {'cache': alias, 'tier': tier,
+                   'result': results[result]}, count
+
+
+def render():
+    """Все метрики процесса в текстовом формате Prometheus 0.0.4."""
+    lines = []
+    with registry.lock:
+        _view_metrics(lines, sorted(registry.views.items()))
+    _counter(lines, f'{PREFIX}_cache_total',
+             'Обращения к TwoTierCache за всё время процесса.',
+             _cache_totals())
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,55 @@
+import time
+
+from django.conf import settings
+
+from . import metrics, routers
+
+PIN_COOKIE = 'primary_pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class PrimaryPinMiddleware:
+    """Read-your-writes между запросами (см. core.routers).
+
+    Небезопасные методы читают из default целиком. Если запрос что-то
+    записал, ставим cookie на REPLICA_PIN_SECONDS, и следующие запросы
+    пользователя тоже читают из default — за это время реплика догонит.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pinned = (request.method not in SAFE_METHODS
+                  or PIN_COOKIE in request.COOKIES)
+        with routers.use_primary(pinned):
+            response = self.get_response(request)
+            wrote = routers.has_written()
+        if wrote:
+            response.set_cookie(PIN_COOKIE, '1',
+                                max_age=settings.REPLICA_PIN_SECONDS,
+                                httponly=True)
+        return response
+
+
+class MetricsMiddleware:
+    """Время, SQL, кэш и шаблоны каждого запроса (см. core.metrics).
+
+    Стоит первой, чтобы время включало остальные middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        token = metrics.start()
+        status = 500
+        try:
+            response = self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            match = getattr(request, 'resolver_match', None)
+            metrics.finish(token, match and match.view_name, status,
+                           time.perf_counter() - started)
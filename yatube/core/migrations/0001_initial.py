@@ -0,0 +1,42 @@
+# Generated by Django 2.2.6 on 2026-10-18 05:46
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, verbose_name='Задача')),
+                ('payload', models.TextField(default='{}', verbose_name='Аргументы')),
+                ('status', models.CharField(choices=[('queued', 'В очереди'), ('failed', 'Ошибка')], default='queued', max_length=10, verbose_name='Статус')),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Запустить после')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Попыток')),
+                ('max_attempts', models.PositiveIntegerField(default=5, verbose_name='Предел попыток')),
+                ('timeout', models.PositiveIntegerField(default=300, verbose_name='Таймаут, с')),
+                ('locked_by', models.CharField(blank=True, max_length=100, verbose_name='Воркер')),
+                ('locked_until', models.DateTimeField(blank=True, null=True, verbose_name='Занята до')),
+                ('key', models.CharField(blank=True, max_length=200, null=True, unique=True, verbose_name='Ключ')),
+                ('interval', models.PositiveIntegerField(blank=True, null=True, verbose_name='Период, с')),
+                ('last_error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Создана')),
+            ],
+            options={
+                'verbose_name': 'Задача',
+                'verbose_name_plural': 'Задачи',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+        ),
+    ]
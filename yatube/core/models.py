@@ -0,0 +1,49 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """Фоновая задача очереди core.jobs."""
+    QUEUED = 'queued'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField(max_length=200, verbose_name='Задача')
+    payload = models.TextField(default='{}', verbose_name='Аргументы')
+    status = models.CharField(max_length=10, choices=STATUSES,
+                              default=QUEUED, verbose_name='Статус')
+    run_at = models.DateTimeField(default=timezone.now,
+                                  verbose_name='Запустить после')
+    attempts = models.PositiveIntegerField(default=0,
+                                           verbose_name='Попыток')
+    max_attempts = models.PositiveIntegerField(default=5,
+                                               verbose_name='Предел попыток')
+    timeout = models.PositiveIntegerField(default=300,
+                                          verbose_name='Таймаут, с')
+    locked_by = models.CharField(max_length=100, blank=True,
+                                 verbose_name='Воркер')
+    locked_until = models.DateTimeField(blank=True, null=True,
+                                        verbose_name='Занята до')
+    # Периодические задачи: одна строка на задачу, после выполнения
+    # переносится на interval секунд вперёд
+    key = models.CharField(max_length=200, unique=True, blank=True,
+                           null=True, verbose_name='Ключ')
+    interval = models.PositiveIntegerField(blank=True, null=True,
+                                           verbose_name='Период, с')
+    last_error = models.TextField(blank=True, verbose_name='Ошибка')
+    created = models.DateTimeField(auto_now_add=True,
+                                   verbose_name='Создана')
+
+    class Meta:
+        verbose_name = 'Задача'
+        verbose_name_plural = 'Задачи'
+        indexes = [
+            models.Index(fields=['status', 'run_at'],
+                         name='job_status_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk}'
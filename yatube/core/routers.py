@@ -0,0 +1,82 @@
+"""Чтение с реплик, запись в основную БД.
+
+Чтение уходит на случайную реплику из settings.DATABASE_REPLICAS, запись
+и чтение внутри транзакции — в default. Реплика отстаёт, поэтому после
+записи чтение закрепляется за default (read-your-writes):
+
+- до конца запроса или задачи — любая запись через ORM включает
+  закрепление в текущем контексте;
+- на следующие REPLICA_PIN_SECONDS секунд — PrimaryPinMiddleware ставит
+  пользователю cookie, и его запросы читают из default, пока она жива.
+
+Очередь задач (core.jobs) и kvstore миниатюр всегда читаются из default:
+первая — чтобы не забрать задачу по устаревшей строке, второй — чтобы
+промах по ещё не доехавшей миниатюре не закэшировался.
+
+Локально с двумя файлами SQLite:
+
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db-replica.sqlite3'),
+        'CONN_HEALTH_CHECKS': True,  # Переоткрывать подменённый файл
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS = ['replica']
+
+и manage.py simulate_replication --lag 3 копирует default в реплику
+с задержкой.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PRIMARY_APPS = {'core', 'thumbnail'}
+
+_pinned = ContextVar('pinned', default=False)
+_wrote = ContextVar('wrote', default=False)
+
+
+def has_written():
+    """Была ли запись через ORM в текущем контексте."""
+    return _wrote.get()
+
+
+@contextmanager
+def use_primary(pinned=True):
+    """Контекст запроса или задачи: pinned — читать только из default.
+
+    Запись внутри блока закрепляет чтение за default до его конца.
+    """
+    pinned_token = _pinned.set(pinned)
+    wrote_token = _wrote.set(False)
+    try:
+        yield
+    finally:
+        _wrote.reset(wrote_token)
+        _pinned.reset(pinned_token)
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if (not replicas or _pinned.get() or _wrote.get()
+                or model._meta.app_label in PRIMARY_APPS
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии default: объекты с них можно связывать
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Схема приходит на реплики вместе с данными
+        return db not in settings.DATABASE_REPLICAS
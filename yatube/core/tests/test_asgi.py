@@ -0,0 +1,93 @@
+import asyncio
+import threading
+
+from django.core.cache import cache
+from django.core.wsgi import get_wsgi_application
+from django.test import TestCase, TransactionTestCase
+from posts.models import Comment, Post, User
+
+from ..asgi import WsgiToAsgi
+from ..concurrency import gather
+
+
+def call(application, scope, body=b''):
+    """Выполняем ASGI-приложение, возвращаем отправленные сообщения."""
+    messages = []
+    incoming = [{'type': 'http.request', 'body': body}]
+
+    async def receive():
+        return incoming.pop(0)
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(application(scope, receive, send))
+    return list(messages)
+
+
+def get(application, path):
+    messages = call(application, {
+        'type': 'http', 'method': 'GET', 'path': path, 'query_string': b'',
+        'headers': [(b'host', b'testserver')],
+    })
+    status = messages[0]['status']
+    body = b''.join(message.get('body', b'') for message in messages[1:])
+    return status, body.decode()
+
+
+# Запросы view в пуле потоков: у каждого потока своё соединение с БД,
+# поэтому данные должны быть закоммичены
+class AsgiTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.application = WsgiToAsgi(get_wsgi_application(), threads=2)
+        self.addCleanup(self.application.executor.shutdown)
+        self.user = User.objects.create_user(username='leo')
+        self.post = Post.objects.create(text='Пост через ASGI',
+                                        author=self.user)
+        Comment.objects.create(post=self.post, author=self.user,
+                               text='Комментарий через ASGI')
+
+    def test_feed_pages(self):
+        for path in ('/', '/leo/', f'/leo/{self.post.pk}/'):
+            with self.subTest(path=path):
+                status, body = get(self.application, path)
+                self.assertEqual(status, 200)
+                self.assertIn('Пост через ASGI', body)
+        _, body = get(self.application, f'/leo/{self.post.pk}/')
+        self.assertIn('Комментарий через ASGI', body)
+
+    def test_missing_post(self):
+        status, _ = get(self.application, '/leo/100500/')
+        self.assertEqual(status, 404)
+
+    def test_lifespan(self):
+        messages = []
+        incoming = [{'type': 'lifespan.startup'},
+                    {'type': 'lifespan.shutdown'}]
+
+        async def receive():
+            return incoming.pop(0)
+
+        async def send(message):
+            messages.append(message['type'])
+
+        asyncio.run(self.application({'type': 'lifespan'}, receive, send))
+        self.assertEqual(messages, ['lifespan.startup.complete',
+                                    'lifespan.shutdown.complete'])
+
+    def test_gather_uses_pool(self):
+        names = gather(lambda: threading.current_thread().name,
+                       lambda: threading.current_thread().name)
+        self.assertEqual(names[0], threading.current_thread().name)
+        self.assertTrue(names[1].startswith('view-query'))
+        with self.assertRaises(ZeroDivisionError):
+            gather(lambda: None, lambda: 1 / 0)
+
+
+class GatherInTransactionTests(TestCase):
+    def test_runs_in_current_thread(self):
+        # Другое соединение не увидело бы незакоммиченных данных теста
+        names = gather(lambda: threading.current_thread().name,
+                       lambda: threading.current_thread().name)
+        self.assertEqual(set(names), {threading.current_thread().name})
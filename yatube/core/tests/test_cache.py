@@ -0,0 +1,76 @@
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+from ..cache import TwoTierCache
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'l2': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'two-tier-tests',
+    },
+}
+
+
+@override_settings(CACHES=CACHES)
+class TwoTierCacheTests(SimpleTestCase):
+    def setUp(self):
+        caches['l2'].clear()
+        self.cache = TwoTierCache('', {'OPTIONS': {
+            'L2': 'l2', 'L1_TIMEOUT': 5, 'L1_MAX_ENTRIES': 2,
+            'L1_BYPASS': ['fresh:'],
+        }})
+
+    def test_read_through_l1(self):
+        self.cache.set('key', 'value')
+        caches['l2'].delete('key')
+        self.assertEqual(self.cache.get('key'), 'value')
+        self.assertEqual(self.cache.stats()['l1_hits'], 1)
+
+    def test_fill_l1_from_l2(self):
+        caches['l2'].set('key', 'value')
+        self.assertEqual(self.cache.get('key'), 'value')
+        self.assertEqual(self.cache.get('key'), 'value')
+        self.assertEqual(self.cache.stats(), {
+            'l1_hits': 1, 'l1_misses': 1, 'l2_hits': 1, 'l2_misses': 0})
+
+    def test_l1_expires(self):
+        self.cache.set('key', 'value')
+        caches['l2'].set('key', 'new value')
+        with mock.patch('core.cache.time.monotonic',
+                        return_value=10 ** 9):
+            self.assertEqual(self.cache.get('key'), 'new value')
+
+    def test_l1_is_bounded_lru(self):
+        for key in ('a', 'b', 'c'):
+            self.cache.set(key, key)
+        caches['l2'].clear()
+        self.assertEqual(self.cache.get_many(['a', 'b', 'c']),
+                         {'b': 'b', 'c': 'c'})
+
+    def test_bypass_prefix_reads_l2(self):
+        self.cache.set('fresh:version', 1)
+        caches['l2'].set('fresh:version', 2)
+        self.assertEqual(self.cache.get('fresh:version'), 2)
+
+    def test_delete_and_clear_both_tiers(self):
+        self.cache.set('key', 'value')
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+        self.cache.set('key', 'value')
+        self.cache.clear()
+        self.assertIsNone(caches['l2'].get('key'))
+        self.assertIsNone(self.cache.get('key'))
+
+
+class TestSettingsTests(SimpleTestCase):
+    # Тесты не трогают общий файловый кэш из settings
+    def test_shared_cache_in_memory(self):
+        self.assertEqual(
+            settings.CACHES['shared']['BACKEND'],
+            'django.core.cache.backends.locmem.LocMemCache')
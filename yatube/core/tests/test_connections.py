@@ -0,0 +1,55 @@
+import os
+import shutil
+import tempfile
+
+from django.db import connections, transaction
+from django.test import SimpleTestCase
+from django.test.utils import CaptureQueriesContext
+
+from ..connections import check_connections
+
+ALIAS = 'connections_test'
+
+
+# Отдельная БД в файле: у тестовой in-memory нет ни WAL, ни файла
+class SqliteProfileTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'db.sqlite3')
+        connections.databases[ALIAS] = {
+            'ENGINE': 'core.backends.sqlite3', 'NAME': self.path,
+            'OPTIONS': {'transaction_mode': 'immediate'},
+            'CONN_MAX_AGE': 60, 'CONN_HEALTH_CHECKS': True,
+        }
+        self.addCleanup(connections.databases.pop, ALIAS)
+        self.addCleanup(connections.__delitem__, ALIAS)
+        self.connection = connections[ALIAS]
+        self.addCleanup(self.connection.close)
+        self.connection.ensure_connection()
+
+    def pragma(self, name):
+        return self.connection.connection.execute(
+            f'PRAGMA {name}').fetchone()[0]
+
+    def test_pragmas(self):
+        self.assertEqual(self.pragma('journal_mode'), 'wal')
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('temp_store'), 2)
+
+    def test_immediate_transactions(self):
+        with CaptureQueriesContext(self.connection) as queries:
+            with transaction.atomic(using=ALIAS):
+                self.connection.cursor().execute('SELECT 1')
+        self.assertEqual(queries[0]['sql'], 'BEGIN IMMEDIATE')
+
+    def test_health_check_closes_replaced_database(self):
+        check_connections()
+        self.assertIsNotNone(self.connection.connection)
+        # Файл подменили, как делает simulate_replication
+        copy = f'{self.path}.copy'
+        shutil.copyfile(self.path, copy)
+        os.replace(copy, self.path)
+        check_connections()
+        self.assertIsNone(self.connection.connection)
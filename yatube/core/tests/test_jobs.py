@@ -0,0 +1,107 @@
+import threading
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from .. import jobs
+from ..models import Job
+
+executed = []
+executed_lock = threading.Lock()
+
+
+@jobs.task
+def record(value):
+    with executed_lock:
+        executed.append(value)
+
+
+@jobs.task(max_attempts=2)
+def explode():
+    raise RuntimeError('сбой')
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        executed.clear()
+
+    def test_delay_and_run(self):
+        record.delay('значение')
+        self.assertEqual(executed, [])
+        self.assertEqual(jobs.run_pending(), 1)
+        self.assertEqual(executed, ['значение'])
+        self.assertFalse(Job.objects.exists())
+
+    def test_scheduled_job_waits(self):
+        record.delay(1, run_at=timezone.now() + timedelta(hours=1))
+        self.assertEqual(jobs.run_pending(), 0)
+        Job.objects.update(run_at=timezone.now())
+        self.assertEqual(jobs.run_pending(), 1)
+
+    def test_retry_with_backoff_then_fail(self):
+        job = explode.delay()
+        jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertEqual(job.attempts, 1)
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('RuntimeError', job.last_error)
+        Job.objects.update(run_at=timezone.now())
+        jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(jobs.run_pending(), 0)
+
+    def test_only_one_worker_locks_a_job(self):
+        job = record.delay(1)
+        now = timezone.now()
+        # Оба воркера выбрали одну задачу, UPDATE пройдёт только у первого
+        self.assertIsNotNone(jobs._lock(job.pk, 60, 'a', now))
+        self.assertIsNone(jobs._lock(job.pk, 60, 'b', now))
+
+    def test_visibility_timeout(self):
+        record.delay(1)
+        first = jobs.claim('a')
+        self.assertIsNone(jobs.claim('b'))
+        # Воркер a пропал: после таймаута задачу забирает b
+        Job.objects.update(locked_until=timezone.now() - timedelta(1))
+        second = jobs.claim('b')
+        self.assertEqual(second.pk, first.pk)
+        self.assertEqual(second.attempts, 2)
+        jobs.run(first)
+        self.assertTrue(Job.objects.exists())
+        jobs.run(second)
+        self.assertFalse(Job.objects.exists())
+
+    @override_settings(JOBS_PERIODIC={'core.tests.test_jobs.record': 60})
+    def test_periodic_job_is_rescheduled(self):
+        jobs.schedule_periodic()
+        jobs.schedule_periodic()
+        job = Job.objects.get()
+        self.assertEqual(job.interval, 60)
+        job.payload = '{"args": ["каждую минуту"], "kwargs": {}}'
+        job.save()
+        self.assertEqual(jobs.run_pending(), 1)
+        job.refresh_from_db()
+        self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=50))
+        self.assertEqual(executed, ['каждую минуту'])
+
+
+# Несколько воркеров в разных потоках, каждый со своим соединением
+class ConcurrentWorkersTests(TransactionTestCase):
+    def setUp(self):
+        executed.clear()
+
+    @override_settings(JOBS_PERIODIC={})
+    def test_each_job_runs_once(self):
+        for value in range(40):
+            record.delay(value)
+        out = StringIO()
+        call_command('runworker', concurrency=4, once=True, poll=0.01,
+                     stdout=out)
+        self.assertEqual(sorted(executed), list(range(40)))
+        self.assertIn('Выполнено задач: 40', out.getvalue())
+        self.assertFalse(Job.objects.exists())
@@ -0,0 +1,128 @@
+from django.core.cache import caches
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from posts.models import Post, User
+
+from .. import metrics
+from ..cache import TwoTierCache
+from ..concurrency import gather
+
+CACHES = {
+    'default': {
+        'BACKEND': 'core.cache.TwoTierCache',
+        'OPTIONS': {'L2': 'l2'},
+    },
+    'l2': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'metrics-tests',
+    },
+}
+
+
+def sample(text, name, **labels):
+    """Значение строки метрики с данными метками или None."""
+    prefix = f'{name}{{{metrics._labels(**labels)}}} '
+    for line in text.splitlines():
+        if line.startswith(prefix):
+            return float(line[len(prefix):])
+    return None
+
+
+@override_settings(CACHES=CACHES, METRICS_TOKEN='')
+class MetricsTest(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        metrics.registry.clear()
+        self.author = User.objects.create_user(username='leo')
+        Post.objects.create(text='Пост', author=self.author)
+        self.staff = Client()
+        self.staff.force_login(User.objects.create_user(
+            username='admin', is_staff=True))
+
+    def scrape(self):
+        response = self.staff.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_request_costs_by_view(self):
+        Client().get(reverse('index'))
+        Client().get(reverse('profile', args=['leo']))
+        text = self.scrape()
+        for view in ('index', 'profile'):
+            with self.subTest(view=view):
+                self.assertEqual(sample(
+                    text, 'yatube_request_duration_seconds_count',
+                    view=view), 1)
+                self.assertGreater(sample(
+                    text, 'yatube_request_db_queries_sum', view=view), 0)
+                self.assertGreater(sample(
+                    text, 'yatube_request_db_seconds_sum', view=view), 0)
+                self.assertGreater(sample(
+                    text, 'yatube_request_template_seconds_sum',
+                    view=view), 0)
+                self.assertEqual(sample(
+                    text, 'yatube_responses_total', view=view,
+                    status='2xx'), 1)
+        self.assertGreater(sample(
+            text, 'yatube_request_cache_total', view='index', tier='l1',
+            result='miss'), 0)
+        self.assertEqual(sample(
+            text, 'yatube_request_duration_seconds_bucket', view='index',
+            le='+Inf'), 1)
+
+    def test_namespaced_and_unresolved(self):
+        Client().get(reverse('api:posts'))
+        Client().get('/no/such/page/')
+        text = self.scrape()
+        self.assertEqual(sample(
+            text, 'yatube_request_template_seconds_sum', view='api:posts'), 0)
+        self.assertEqual(sample(
+            text, 'yatube_responses_total', view=metrics.UNRESOLVED,
+            status='4xx'), 1)
+
+    def test_counts_gather_threads(self):
+        token = metrics.start()
+        gather(lambda: list(Post.objects.all()),
+               lambda: list(User.objects.all()))
+        measurement = metrics._current.get()
+        metrics.finish(token, 'gathered', 200, 0.01)
+        self.assertEqual(measurement.queries, 2)
+        self.assertIsNone(metrics._current.get())
+
+    def test_process_cache_totals(self):
+        caches['default'].get('missing')
+        text = self.scrape()
+        self.assertIsInstance(caches['default'], TwoTierCache)
+        self.assertGreaterEqual(sample(
+            text, 'yatube_cache_total', cache='default', tier='l2',
+            result='miss'), 1)
+
+    def test_access(self):
+        self.assertEqual(Client().get(reverse('metrics')).status_code, 403)
+        with override_settings(METRICS_TOKEN='s3cret'):
+            response = Client().get(reverse('metrics'),
+                                    HTTP_AUTHORIZATION='Bearer s3cret')
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(
+                response['Content-Type'].startswith('text/plain'))
+            response = Client().get(reverse('metrics'),
+                                    HTTP_AUTHORIZATION='Bearer other')
+            self.assertEqual(response.status_code, 403)
+
+    # прокси на том же хосте: адрес клиента не даёт доступа
+    def test_proxied_request_without_credentials(self):
+        with override_settings(INTERNAL_IPS=['127.0.0.1']):
+            response = Client().get(reverse('metrics'),
+                                    REMOTE_ADDR='127.0.0.1',
+                                    HTTP_X_FORWARDED_FOR='203.0.113.7')
+        self.assertEqual(response.status_code, 403)
+
+
+class HistogramTest(TestCase):
+    def test_buckets_are_cumulative(self):
+        histogram = metrics.Histogram((1, 5))
+        for value in (0, 1, 3, 7):
+            histogram.observe(value)
+        self.assertEqual(list(histogram.cumulative()),
+                         [(1, 2), (5, 3), ('+Inf', 4)])
+        self.assertEqual(histogram.sum, 11)
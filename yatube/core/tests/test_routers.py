@@ -0,0 +1,110 @@
+import os
+import sqlite3
+import tempfile
+from contextlib import closing
+
+from django.core.management import call_command
+from django.db import router
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from posts.models import Post
+
+from ..concurrency import gather
+from ..management.commands.simulate_replication import publish, snapshot
+from ..middleware import PIN_COOKIE, PrimaryPinMiddleware
+from ..models import Job
+from ..routers import use_primary
+
+
+def read_alias():
+    return router.db_for_read(Post)
+
+
+def write():
+    return router.db_for_write(Post)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], REPLICA_PIN_SECONDS=5)
+class ReplicaRouterTests(SimpleTestCase):
+    def test_reads_go_to_replica_writes_to_primary(self):
+        with use_primary(False):
+            self.assertEqual(read_alias(), 'replica')
+            self.assertEqual(write(), 'default')
+
+    def test_reads_after_write_stay_on_primary(self):
+        with use_primary(False):
+            write()
+            self.assertEqual(read_alias(), 'default')
+            # Потоки gather() наследуют закрепление
+            self.assertEqual(gather(read_alias, read_alias),
+                             ['default', 'default'])
+        with use_primary(False):
+            self.assertEqual(read_alias(), 'replica')
+
+    def test_job_queue_reads_primary(self):
+        with use_primary(False):
+            self.assertEqual(router.db_for_read(Job), 'default')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        with use_primary(False):
+            self.assertEqual(read_alias(), 'default')
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], REPLICA_PIN_SECONDS=5)
+class PrimaryPinMiddlewareTests(SimpleTestCase):
+    def request(self, method='get', cookies=None, view=read_alias):
+        seen = []
+
+        def get_response(request):
+            seen.append(view())
+            return HttpResponse()
+
+        request = getattr(RequestFactory(), method)('/')
+        request.COOKIES.update(cookies or {})
+        response = PrimaryPinMiddleware(get_response)(request)
+        return seen[0], response
+
+    def test_read_only_request(self):
+        alias, response = self.request()
+        self.assertEqual(alias, 'replica')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_write_pins_next_requests(self):
+        _, response = self.request('post', view=write)
+        cookie = response.cookies[PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], 5)
+        alias, _ = self.request(cookies={PIN_COOKIE: cookie.value})
+        self.assertEqual(alias, 'default')
+
+    def test_unsafe_method_reads_primary(self):
+        alias, response = self.request('post')
+        self.assertEqual(alias, 'default')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+
+class SimulateReplicationTests(SimpleTestCase):
+    def test_replica_gets_snapshot(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        primary = os.path.join(directory.name, 'primary.sqlite3')
+        replica = os.path.join(directory.name, 'replica.sqlite3')
+        with closing(sqlite3.connect(primary)) as connection:
+            connection.execute('CREATE TABLE post (text TEXT)')
+            connection.execute("INSERT INTO post VALUES ('первый')")
+            connection.commit()
+            path = snapshot(primary)
+            connection.execute("INSERT INTO post VALUES ('второй')")
+            connection.commit()
+        publish(path, [replica])
+        os.unlink(path)
+        with closing(sqlite3.connect(replica)) as connection:
+            rows = connection.execute('SELECT text FROM post').fetchall()
+        # Реплика отстаёт: запись после снимка в неё не попала
+        self.assertEqual(rows, [('первый',)])
+        self.assertEqual(sorted(os.listdir(directory.name)),
+                         ['primary.sqlite3', 'replica.sqlite3'])
+
+    def test_requires_replicas(self):
+        with self.assertRaisesMessage(Exception, 'DATABASE_REPLICAS'):
+            call_command('simulate_replication', once=True)
@@ -0,0 +1,126 @@
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import caches
+from django.template import Context, Template
+from django.test import SimpleTestCase, override_settings
+
+from ..cache import FileBasedCache, Fragment, get_or_compute
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'single-flight-tests',
+    },
+}
+
+# Как в settings: TwoTierCache над FileBasedCache
+SHARED_DIR = tempfile.mkdtemp(prefix='single-flight-')
+SHARED_CACHES = {
+    'default': {
+        'BACKEND': 'core.cache.TwoTierCache',
+        'OPTIONS': {'L2': 'shared'},
+    },
+    'shared': {
+        'BACKEND': 'core.cache.FileBasedCache',
+        'LOCATION': SHARED_DIR,
+    },
+}
+
+
+@override_settings(CACHES=CACHES)
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = caches['default']
+        self.cache.clear()
+        self.rebuilds = 0
+        self.rebuilds_lock = threading.Lock()
+
+    def slow_compute(self):
+        with self.rebuilds_lock:
+            self.rebuilds += 1
+        time.sleep(0.2)
+        return 'свежее'
+
+    def run_concurrently(self, func, count=20):
+        results = []
+        barrier = threading.Barrier(count)
+
+        def worker():
+            barrier.wait()
+            results.append(func())
+
+        threads = [threading.Thread(target=worker) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return list(results)
+
+    # истёкший ключ: пересчитывает один запрос, остальные читают старое
+    def test_expired_key_rebuilt_once(self):
+        self.cache.set('key', Fragment('старое', time.time() - 1, 0.2), 60)
+        results = self.run_concurrently(
+            lambda: get_or_compute('key', self.slow_compute, 30,
+                                   cache=self.cache))
+        self.assertEqual(self.rebuilds, 1)
+        self.assertEqual(results.count('свежее'), 1)
+        self.assertEqual(results.count('старое'), 19)
+        self.assertEqual(self.cache.get('key').value, 'свежее')
+
+    # пустой ключ: остальные запросы дожидаются первого
+    def test_missing_key_coalesced(self):
+        results = self.run_concurrently(
+            lambda: get_or_compute('key', self.slow_compute, 30,
+                                   cache=self.cache))
+        self.assertEqual(self.rebuilds, 1)
+        self.assertEqual(results, ['свежее'] * 20)
+
+    # свежее значение пересчитывается досрочно лишь около срока
+    def test_probabilistic_early_expiry(self):
+        self.cache.set('key', Fragment('старое', time.time() + 1000, 0.2),
+                       60)
+        value = get_or_compute('key', self.slow_compute, 30,
+                               cache=self.cache)
+        self.assertEqual(value, 'старое')
+        with mock.patch('core.cache.random.random', return_value=0.9999):
+            self.cache.set('key', Fragment('старое', time.time() + 1, 1),
+                           60)
+            value = get_or_compute('key', self.slow_compute, 30,
+                                   cache=self.cache)
+        self.assertEqual(value, 'свежее')
+
+    # тег {% cache %} при одновременном рендере истёкшего фрагмента
+    def test_template_tag_rebuilt_once(self):
+        template = Template('{% load singleflight %}'
+                            '{% cache 30 feed %}{{ compute }}{% endcache %}')
+        results = self.run_concurrently(
+            lambda: template.render(Context({'compute': self.slow_compute})))
+        self.assertEqual(self.rebuilds, 1)
+        self.assertEqual(results, ['свежее'] * 20)
+
+
+@override_settings(CACHES=SHARED_CACHES)
+class SharedCacheSingleFlightTests(SingleFlightTests):
+    """Те же проверки на кэше из settings: блокировка берётся в L2."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(SHARED_DIR, ignore_errors=True)
+
+    def test_add_is_atomic(self):
+        shared = caches['shared']
+        results = self.run_concurrently(lambda: shared.add('lock', 1, 10))
+        self.assertEqual(results.count(True), 1)
+
+    def test_add_replaces_expired(self):
+        shared = caches['shared']
+        self.assertIsInstance(shared, FileBasedCache)
+        shared.set('lock', 1, -1)
+        self.assertTrue(shared.add('lock', 2, 10))
+        self.assertFalse(shared.add('lock', 3, 10))
+        self.assertEqual(shared.get('lock'), 2)
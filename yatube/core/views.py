@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_safe
+
+from . import metrics
+
+
+def _has_metrics_token(request):
+    token = settings.METRICS_TOKEN
+    return bool(token) and constant_time_compare(
+        request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}')
+
+
+@require_safe
+def metrics_view(request):
+    """Метрики процесса для Prometheus: персоналу и по METRICS_TOKEN.
+
+    Адрес клиента не проверяем: за прокси на том же хосте все запросы
+    приходят с 127.0.0.1.
+    """
+    if not (request.user.is_staff or _has_metrics_token(request)):
+        raise PermissionDenied
+    return HttpResponse(metrics.render(),
+                        content_type='text/plain; version=0.0.4')
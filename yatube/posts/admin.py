@@ -1,6 +1,21 @@
 from django.contrib import admin
 
 from .models import Comment, Follow, Group, Post
+from .search import fts_enabled, fts_query, matching
+
+
+class FullTextSearchMixin:
+    """Поиск в админке через FTS5-индекс вместо LIKE '%q%'."""
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term or not fts_enabled():
+            return super().get_search_results(request, queryset,
+                                              search_term)
+        if not fts_query(search_term):
+            # Одни знаки препинания: MATCH '' — синтаксическая ошибка FTS5
+            return queryset.none(), False
+        return queryset.filter(
+            pk__in=matching(self.model, search_term)), False
 
 
 @admin.register(Group)
@@ -13,7 +28,7 @@ class GroupAdmin(admin.ModelAdmin):
 
 
 @admin.register(Post)
-class PostAdmin(admin.ModelAdmin):
+class PostAdmin(FullTextSearchMixin, admin.ModelAdmin):
     """Вывод в навигацию для PostAdmin"""
     list_display = ('pk', 'text', 'pub_date', 'author', 'group')
     search_fields = ('text',)  # Строка поиска
@@ -22,7 +37,7 @@ class PostAdmin(admin.ModelAdmin):
 
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(FullTextSearchMixin, admin.ModelAdmin):
     """Вывод в навигацию для CommentAdmin"""
     list_display = ('post', 'author', 'text', 'created',)
     search_fields = ('text',)
@@ -0,0 +1,49 @@
+"""Версии кэша лент.
+
+Ключ фрагмента ленты включает версию области (главная, группа, профиль),
+поэтому вместо поиска и удаления старых ключей достаточно сменить
+версию: сигналы делают это при любом изменении постов и комментариев.
+Версия — время последнего изменения, её же можно отдавать клиенту как
+Last-Modified.
+"""
+import time
+
+from django.core.cache import cache
+
+INDEX = 'index'
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+def profile_scope(author_id):
+    return f'profile:{author_id}'
+
+
+def post_scopes(author_id, group_id):
+    """Ленты, в которые попадает пост."""
+    scopes = [INDEX, profile_scope(author_id)]
+    if group_id:
+        scopes.append(group_scope(group_id))
+    return scopes
+
+
+def _version_key(scope):
+    return f'feed_version:{scope}'
+
+
+def feed_version(scope):
+    """Текущая версия ленты. Версии хранятся без срока жизни."""
+    key = _version_key(scope)
+    version = cache.get(key)
+    if version is not None:
+        return version
+    cache.add(key, time.time(), None)
+    return cache.get(key)
+
+
+def bump_feeds(scopes):
+    """Сбрасываем кэш лент: фрагменты старых версий больше не читаются."""
+    now = time.time()
+    cache.set_many({_version_key(scope): now for scope in scopes}, None)
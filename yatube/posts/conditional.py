@@ -0,0 +1,104 @@
+"""Условные GET-запросы (ETag / Last-Modified) для лент и постов.
+
+Валидатор строится из версий кэша лент и времени изменения поста, то есть
+из одного-двух дешёвых запросов. Если он совпал с присланным клиентом,
+view не вызывается вовсе: ни основных запросов к БД, ни шаблонов.
+"""
+import hashlib
+from datetime import datetime
+from functools import wraps
+
+from django.utils import timezone
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from . import cache
+from .models import Group, Post, User
+
+
+def _from_version(version):
+    return datetime.fromtimestamp(version, tz=timezone.utc)
+
+
+def index_validator(request):
+    version = cache.feed_version(cache.INDEX)
+    return (version, request.GET.get('after'),
+            request.GET.get('before')), _from_version(version)
+
+
+def group_validator(request, slug):
+    group_id = (Group.objects.filter(slug=slug)
+                .values_list('pk', flat=True).first())
+    if group_id is None:
+        return None, None
+    version = cache.feed_version(cache.group_scope(group_id))
+    return (version, request.GET.get('after'),
+            request.GET.get('before')), _from_version(version)
+
+
+def profile_validator(request, username):
+    """Версия профиля меняется и с постами, и с подписками."""
+    author_id = (User.objects.filter(username=username)
+                 .values_list('pk', flat=True).first())
+    if author_id is None:
+        return None, None
+    version = cache.feed_version(cache.profile_scope(author_id))
+    return (version, request.GET.get('after'),
+            request.GET.get('before')), _from_version(version)
+
+
+def post_validator(request, username, post_id):
+    """Пост меняется при правке и комментариях, карточка автора —
+    вместе с версией его профиля."""
+    # Ищем по первичному ключу и сверяем автора здесь: с условием на
+    # username SQLite начал бы с auth_user и сортировал посты автора
+    post = (Post.objects.filter(pk=post_id)
+            .values_list('updated', 'author', 'author__username')
+            .order_by('pk').first())
+    if post is None or post[2] != username:
+        return None, None
+    updated, author_id, _ = post
+    version = cache.feed_version(cache.profile_scope(author_id))
+    return (updated.isoformat(), version), max(updated,
+                                               _from_version(version))
+
+
+def conditional_page(validator):
+    """Отвечаем 304 Not Modified, если страница не менялась.
+
+    validator(request, *args, **kwargs) возвращает части ETag и время
+    изменения либо (None, None), если валидатор посчитать нельзя.
+    Страница зависит и от зрителя (меню, кнопки автора), поэтому в ETag
+    попадает id пользователя, а ответ помечается Vary: Cookie.
+    """
+    def validate(request, *args, **kwargs):
+        if not hasattr(request, '_page_validator'):
+            request._page_validator = validator(request, *args, **kwargs)
+        return request._page_validator
+
+    def etag(request, *args, **kwargs):
+        parts = validate(request, *args, **kwargs)[0]
+        if parts is None:
+            return None
+        raw = ':'.join(str(part) for part in (*parts, request.user.pk))
+        return hashlib.md5(raw.encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        return validate(request, *args, **kwargs)[1]
+
+    def decorator(view):
+        conditional_view = condition(etag_func=etag,
+                                     last_modified_func=last_modified)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if request.user.is_authenticated:
+                patch_cache_control(response, private=True, no_cache=True)
+            else:
+                patch_cache_control(response, public=True, max_age=0,
+                                    must_revalidate=True)
+            patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapper
+    return decorator
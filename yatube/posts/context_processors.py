@@ -0,0 +1,7 @@
+from django.conf import settings
+
+
+def cache_timeouts(request):
+    """Сроки жизни фрагментов для тега {% cache %}."""
+    return {'FEED_CACHE_TIMEOUT': settings.FEED_CACHE_TIMEOUT,
+            'POST_CACHE_TIMEOUT': settings.POST_CACHE_TIMEOUT}
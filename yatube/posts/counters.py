@@ -0,0 +1,89 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Шаблоны берут числа из сохранённых полей вместо COUNT(*) на каждый пост и
+карточку профиля. Сигналы меняют счётчики атомарными UPDATE ... + 1, а
+команда recount пересчитывает их с нуля, если они разошлись с данными.
+"""
+from core.jobs import task
+from django.db.models import Count, F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Now
+
+from .models import Comment, Follow, Post, User, UserCounter
+
+
+def _bump(queryset, deltas, **extra):
+    """UPDATE field = field + delta, не уходя ниже нуля."""
+    floor = {f'{field}__gte': -delta
+             for field, delta in deltas.items() if delta < 0}
+    changes = {field: F(field) + delta for field, delta in deltas.items()}
+    return queryset.filter(**floor).update(**changes, **extra)
+
+
+def bump_user(user_id, **deltas):
+    """Сдвигаем счётчики пользователя: bump_user(1, posts_count=1)."""
+    updated = _bump(UserCounter.objects.filter(user=user_id), deltas)
+    if not updated and min(deltas.values()) > 0:
+        # Пользователь создан до появления счётчиков.
+        recount_users(User.objects.filter(pk=user_id))
+
+
+def bump_comments(post_id, delta):
+    # updated меняется вместе со счётчиком: от него зависит кэш поста.
+    _bump(Post.objects.filter(pk=post_id), {'comments_count': delta},
+          updated=Now())
+
+
+def _count(model, field):
+    """Подзапрос COUNT(*) по внешнему ключу field модели model."""
+    rows = (model.objects.filter(**{field: OuterRef('pk')})
+            .order_by().values(field).annotate(total=Count('pk'))
+            .values('total'))
+    return Coalesce(Subquery(rows), 0)
+
+
+def recount_users(users=None):
+    """Пересчитываем счётчики пользователей, возвращаем число правок."""
+    users = User.objects.all() if users is None else users
+    missing = users.filter(counter__isnull=True).values_list('pk', flat=True)
+    UserCounter.objects.bulk_create(
+        [UserCounter(user_id=pk) for pk in missing.iterator()],
+        batch_size=500, ignore_conflicts=True)
+    real = {
+        'posts_count': _count(Post, 'author'),
+        'followers_count': _count(Follow, 'author'),
+        'following_count': _count(Follow, 'user'),
+    }
+    drifted = (UserCounter.objects.filter(user__in=users)
+               .annotate(**{f'real_{field}': value
+                            for field, value in real.items()})
+               .exclude(**{field: F(f'real_{field}') for field in real})
+               .values_list('pk', flat=True))
+    return UserCounter.objects.filter(pk__in=list(drifted)).update(**real)
+
+
+def recount_posts(batch_size=10000):
+    """Исправляем comments_count у разошедшихся постов.
+
+    Посты проверяются диапазонами id по batch_size, чтобы список
+    разошедшихся не рос с таблицей (после импорта расходятся все посты с
+    комментариями).
+    """
+    real = _count(Comment, 'post')
+    last = Post.objects.aggregate(last=Max('pk'))['last'] or 0
+    fixed = 0
+    for start in range(0, last, batch_size):
+        drifted = (Post.objects.filter(pk__gt=start,
+                                       pk__lte=start + batch_size)
+                   .annotate(real_comments=real)
+                   .exclude(comments_count=F('real_comments'))
+                   .values_list('pk', flat=True))
+        fixed += Post.objects.filter(pk__in=list(drifted)).update(
+            comments_count=real, updated=Now())
+    return fixed
+
+
+@task(timeout=3600)
+def recount():
+    """Полный пересчёт, раз в сутки по JOBS_PERIODIC: (постов,
+    пользователей) с исправленными счётчиками."""
+    return recount_posts(), recount_users()
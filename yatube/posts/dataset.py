@@ -0,0 +1,88 @@
+"""Детерминированный набор данных для manage.py benchmark.
+
+generate() отдаёт записи в формате export_yatube, их загружает
+transfer.Importer: пачками, со счётчиками и лентами, как после импорта.
+Случайные числа и тексты Faker берутся из одного seed, поэтому одни и те
+же параметры дают одни и те же данные.
+
+Популярность степенная: у k-го пользователя вес 1/k^exponent. По этим
+весам выбираются авторы постов и те, на кого подписываются, так что
+у немногих авторов много постов и подписчиков, а у большинства — мало.
+"""
+import datetime as dt
+import itertools
+import random
+
+from faker import Faker
+
+START = dt.datetime(2020, 1, 1, tzinfo=dt.timezone.utc)
+
+DEFAULTS = {
+    'users': 500,
+    'posts': 10000,
+    'comments': 10000,
+    'groups': 20,
+    'follows': 10,  # Подписок на пользователя в среднем
+    'days': 365,
+    'exponent': 1.1,
+    'seed': 1,
+}
+
+
+def _weights(count, exponent):
+    """Накопленные веса для random.choices: k-й получает 1/k^exponent."""
+    return list(itertools.accumulate(
+        1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+def generate(**params):
+    """Записи пользователей, групп, постов, комментариев и подписок."""
+    params = {**DEFAULTS, **params}
+    rng = random.Random(params['seed'])
+    fake = Faker('ru_RU')
+    fake.seed_instance(params['seed'])
+    users = [f'user{number}' for number in range(params['users'])]
+    weights = _weights(len(users), params['exponent'])
+    slugs = [f'group{number}' for number in range(params['groups'])]
+    step = dt.timedelta(days=params['days']) / max(params['posts'], 1)
+
+    def pub_date(post_id):
+        return START + step * post_id
+
+    for username in users:
+        yield {'type': 'user', 'username': username,
+               'first_name': fake.first_name(),
+               'last_name': fake.last_name(),
+               'email': f'{username}@example.com', 'date_joined': START}
+    for slug in slugs:
+        yield {'type': 'group', 'slug': slug,
+               'title': fake.catch_phrase(), 'description': fake.text()}
+    for post_id in range(1, params['posts'] + 1):
+        author = rng.choices(users, cum_weights=weights)[0]
+        group = rng.choice(slugs) if slugs and rng.random() < 0.6 else None
+        yield {'type': 'post', 'id': post_id, 'author': author,
+               'group': group, 'pub_date': pub_date(post_id),
+               'text': fake.paragraph(nb_sentences=rng.randint(1, 8))}
+    for comment_id in range(1, params['comments'] + 1):
+        if not params['posts']:
+            break
+        post_id = rng.randint(1, params['posts'])
+        created = pub_date(post_id) + dt.timedelta(
+            minutes=rng.randint(1, 60 * 24))
+        yield {'type': 'comment', 'id': comment_id, 'post': post_id,
+               'author': rng.choice(users), 'created': created,
+               'text': fake.sentence()}
+    yield from _follows(rng, users, weights, params['follows'])
+
+
+def _follows(rng, users, weights, average):
+    for username in users:
+        number = min(rng.randint(0, 2 * average), len(users) - 1)
+        authors = set()
+        # Повторы и подписка на себя отбрасываются
+        while len(authors) < number:
+            author = rng.choices(users, cum_weights=weights)[0]
+            if author != username:
+                authors.add(author)
+        for author in sorted(authors):
+            yield {'type': 'follow', 'user': username, 'author': author}
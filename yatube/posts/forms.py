@@ -1,5 +1,7 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
+from .images import NO_IMAGE, ingest
 from .models import Comment, Post
 
 
@@ -8,6 +10,20 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image',)
 
+    def clean_image(self):
+        """Новую картинку уменьшаем и очищаем от метаданных, её размеры,
+        цвет и превью сохраняем в посте."""
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            image, description = ingest(image)
+        elif not image:
+            description = NO_IMAGE
+        else:
+            return image
+        for field, value in description.items():
+            setattr(self.instance, field, value)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
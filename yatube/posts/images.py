@@ -0,0 +1,98 @@
+"""Приём картинок постов.
+
+Загрузка целиком пишется во временный файл (TemporaryFileUploadHandler),
+размеры читаются из заголовка без декодирования. JPEG открывается в
+режиме draft — декодер сразу уменьшает картинку в 2–8 раз, — поэтому
+в памяти оказывается не больше POST_IMAGE_MAX_PIXELS точек. Дальше
+поворот по EXIF, уменьшение до POST_IMAGE_MAX_SIZE и пересохранение без
+метаданных.
+
+Заодно для карточки считаются размеры, основной цвет и крошечное превью
+(describe): их шаблон показывает, пока грузится миниатюра.
+"""
+import base64
+import io
+import os
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+PLACEHOLDER_SIZE = 16
+# describe() для поста без картинки
+NO_IMAGE = {'image_width': None, 'image_height': None, 'image_color': '',
+            'image_placeholder': ''}
+
+
+def _open(file, draft_size):
+    """Картинка в draft-режиме и её размеры из заголовка."""
+    file.seek(0)
+    try:
+        image = Image.open(file)
+        size = image.size
+        image.draft('RGB', (draft_size, draft_size))
+    except (OSError, Image.DecompressionBombError):
+        raise ValidationError('Не удалось прочитать изображение.',
+                              code='invalid_image')
+    width, height = image.size
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Слишком большое изображение: %(width)s×%(height)s.',
+            code='too_large', params={'width': width, 'height': height})
+    return image, size
+
+
+def describe(image, size=None):
+    """Поля поста для карточки: размеры, основной цвет и превью-заглушка.
+
+    size — настоящие размеры, если image уже уменьшена.
+    """
+    width, height = size or image.size
+    small = image.convert('RGB')
+    small.thumbnail((64, 64))
+    palette = small.quantize(colors=4)
+    _, index = max(palette.getcolors())
+    red, green, blue = palette.getpalette()[index * 3:index * 3 + 3]
+    small.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+    output = io.BytesIO()
+    small.save(output, 'JPEG', quality=40)
+    placeholder = base64.b64encode(output.getvalue()).decode()
+    return {
+        'image_width': width,
+        'image_height': height,
+        'image_color': f'#{red:02x}{green:02x}{blue:02x}',
+        'image_placeholder': f'data:image/jpeg;base64,{placeholder}',
+    }
+
+
+def describe_file(file):
+    """describe() для уже сохранённой картинки: декодируется в draft-режиме
+    сразу маленькой, размеры берутся из заголовка."""
+    image, (width, height) = _open(file, 64)
+    # Поворот на 90° по EXIF меняет местами стороны
+    if image.getexif().get(0x0112) in (5, 6, 7, 8):
+        width, height = height, width
+    return describe(ImageOps.exif_transpose(image), (width, height))
+
+
+def ingest(upload):
+    """Проверенная и уменьшенная копия загруженной картинки и её describe().
+    """
+    max_size = settings.POST_IMAGE_MAX_SIZE
+    image, _ = _open(upload, max_size)
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_size, max_size), Image.LANCZOS)
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image_format, extension = 'PNG', '.png'
+        options = {'optimize': True}
+    else:
+        image = image.convert('RGB')
+        image_format, extension = 'JPEG', '.jpg'
+        options = {'quality': settings.POST_IMAGE_QUALITY,
+                   'optimize': True, 'progressive': True}
+    output = io.BytesIO()
+    # Без exif= и icc_profile= метаданные в новый файл не попадают
+    image.save(output, image_format, **options)
+    name = os.path.splitext(os.path.basename(upload.name))[0] + extension
+    return ContentFile(output.getvalue(), name=name), describe(image)
@@ -0,0 +1,401 @@
+import datetime as dt
+import json
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.db.backends.signals import connection_created
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from posts import urls
+from posts.dataset import DEFAULTS, generate
+from posts.models import Follow, Group, Post, User
+from posts.paginator import encode_cursor
+from posts.transfer import Importer
+
+# Отдельный кэш: прогон начинается с пустого и не трогает общий
+CACHES = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': f'benchmark-{alias}'}
+    for alias in ('default', 'shared')
+}
+VIEWERS = 10  # Самые активные авторы, от их имени идут запросы с входом
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, percent):
+    """Ближайший ранг: значение, не меньше которого percent% выборки."""
+    ordered = sorted(values)
+    rank = math.ceil(percent / 100 * len(ordered)) - 1
+    return ordered[max(rank, 0)]
+
+
+class QueryCounter:
+    """Считает запросы всех соединений, и потоков gather() тоже."""
+
+    def __init__(self):
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self.lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def install(self, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+
+class Sample:
+    """Воспроизводимый выбор объектов для запросов из загруженных данных.
+
+    Посты выбираются равномерно по id, поэтому авторы попадают в запросы
+    так же часто, как пишут: популярные профили открываются чаще.
+    """
+
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        self.anonymous = Client()
+        self.last_post = Post.objects.order_by('-pk').values_list(
+            'pk', flat=True).first()
+        if self.last_post is None:
+            raise CommandError('В наборе данных нет постов.')
+        self.groups = list(Group.objects.order_by('pk').values_list(
+            'slug', flat=True))
+        self.viewers = []
+        for user in (User.objects.order_by('-counter__posts_count', 'pk')
+                     [:VIEWERS]):
+            client = Client()
+            client.force_login(user)
+            self.viewers.append({
+                'client': client,
+                'posts': list(user.posts.order_by('pk').values_list(
+                    'pk', flat=True)),
+                'comments': list(user.comments.order_by('pk').values_list(
+                    'pk', 'post', 'post__author__username')),
+                'following': list(Follow.objects.filter(user=user)
+                                  .order_by('pk')
+                                  .values_list('author__username',
+                                               flat=True)),
+                'username': user.username,
+            })
+
+    def post(self):
+        start = self.rng.randint(1, self.last_post)
+        return (Post.objects.filter(pk__gte=start).order_by('pk')
+                .values('id', 'pub_date', 'text', 'author__username')
+                .first())
+
+    def viewer(self):
+        return self.rng.choice(self.viewers)
+
+    def page(self, post):
+        """Первая страница или страница старше поста — листание вглубь."""
+        if self.rng.random() < 0.5:
+            return ''
+        return f'?after={encode_cursor([post["pub_date"], post["id"]])}'
+
+
+def _get(url, client, write=False):
+    return {'method': 'get', 'url': url, 'data': None, 'client': client,
+            'write': write}
+
+
+def _post(url, data, client):
+    return {'method': 'post', 'url': url, 'data': data, 'client': client,
+            'write': True}
+
+
+def _post_url(name, post):
+    return reverse(name, args=[post['author__username'], post['id']])
+
+
+def _own_post(sample):
+    viewer = sample.viewer()
+    post_id = sample.rng.choice(viewer['posts'])
+    return viewer, [viewer['username'], post_id]
+
+
+def _comment_delete(sample):
+    viewers = [viewer for viewer in sample.viewers if viewer['comments']]
+    if not viewers:
+        return None
+    viewer = sample.rng.choice(viewers)
+    comment_id, post_id, author = sample.rng.choice(viewer['comments'])
+    return _get(reverse('comment_delete',
+                        args=[author, post_id, comment_id]),
+                viewer['client'], write=True)
+
+
+def _search(sample):
+    words = [word.strip('.,') for word in sample.post()['text'].split()]
+    return _get(f'{reverse("search")}?q={sample.rng.choice(words)}',
+                sample.anonymous)
+
+
+def _group_posts(sample):
+    if not sample.groups:
+        return None
+    slug = sample.rng.choice(sample.groups)
+    return _get(reverse('group_posts', args=[slug]), sample.anonymous)
+
+
+def _index(sample):
+    return _get(reverse('index') + sample.page(sample.post()),
+                sample.anonymous)
+
+
+def _profile(sample):
+    post = sample.post()
+    return _get(reverse('profile', args=[post['author__username']])
+                + sample.page(post), sample.anonymous)
+
+
+def _profile_unfollow(sample):
+    viewers = [viewer for viewer in sample.viewers if viewer['following']]
+    if not viewers:
+        return None
+    viewer = sample.rng.choice(viewers)
+    author = sample.rng.choice(viewer['following'])
+    return _get(reverse('profile_unfollow', args=[author]),
+                viewer['client'], write=True)
+
+
+def _post_edit(sample):
+    viewer, args = _own_post(sample)
+    return _post(reverse('post_edit', args=args),
+                 {'text': 'Исправленный текст'}, viewer['client'])
+
+
+def _post_delete(sample):
+    viewer, args = _own_post(sample)
+    return _get(reverse('post_delete', args=args), viewer['client'],
+                write=True)
+
+
+# Имя URL из posts/urls.py: запрос для него. Запросы на запись
+# выполняются в транзакции и откатываются, набор данных не меняется.
+SCENARIOS = {
+    'index': _index,
+    'new_post': lambda sample: _post(
+        reverse('new_post'), {'text': 'Новый пост'},
+        sample.viewer()['client']),
+    'group_posts': _group_posts,
+    'follow_index': lambda sample: _get(reverse('follow_index'),
+                                        sample.viewer()['client']),
+    'search': _search,
+    'profile_follow': lambda sample: _get(
+        reverse('profile_follow', args=[sample.post()['author__username']]),
+        sample.viewer()['client'], write=True),
+    'profile_unfollow': _profile_unfollow,
+    'profile': _profile,
+    'post': lambda sample: _get(_post_url('post', sample.post()),
+                                sample.anonymous),
+    'post_edit': _post_edit,
+    'post_delete': _post_delete,
+    'add_comment': lambda sample: _post(
+        _post_url('add_comment', sample.post()), {'text': 'Комментарий'},
+        sample.viewer()['client']),
+    'comment_delete': _comment_delete,
+    '404': lambda sample: _get(reverse('404'), sample.anonymous),
+    '500': lambda sample: _get(reverse('500'), sample.anonymous),
+}
+
+
+def _send(request):
+    """Ответ или имя исключения вместо кода ответа."""
+    method = getattr(request['client'], request['method'])
+    try:
+        if not request['write']:
+            return method(request['url'], request['data'])
+        with transaction.atomic():
+            response = method(request['url'], request['data'])
+            transaction.set_rollback(True)
+            return response
+    except Exception as error:
+        return type(error).__name__
+
+
+@contextmanager
+def benchmark_database(path, params, fresh):
+    """default указывает на файл SQLite с набором данных, как у
+    тест-раннера. Набор с теми же параметрами берётся готовым.
+
+    Возвращает, был ли набор загружен заново.
+    """
+    marker = f'{path}.json'
+    reuse = not fresh and os.path.exists(path) and _read(marker) == params
+    if not reuse:
+        for name in (path, f'{path}-wal', f'{path}-shm', marker):
+            if os.path.exists(name):
+                os.remove(name)
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    old_test_name = test_settings.get('NAME')
+    test_settings['NAME'] = path
+    old_name = connection.creation.create_test_db(
+        verbosity=0, autoclobber=True, serialize=False, keepdb=True)
+    try:
+        if not reuse:
+            Importer().load(generate(**params))
+            with open(marker, 'w') as file:
+                json.dump(params, file)
+        yield not reuse
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0,
+                                            keepdb=True)
+        test_settings['NAME'] = old_test_name
+
+
+def _read(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный прогон всех URL posts/urls.py на большом '
+            'детерминированном наборе данных (posts.dataset): задержка '
+            'p50/p95/p99, число запросов к БД и размер ответа для каждого '
+            'URL. Результат сохраняется в JSON, --compare сравнивает его с '
+            'прошлым прогоном. Набор данных лежит в отдельном файле SQLite '
+            'и при тех же параметрах загружается один раз.')
+
+    def add_arguments(self, parser):
+        for name, default in DEFAULTS.items():
+            parser.add_argument(f'--{name}', type=type(default),
+                                default=default)
+        parser.add_argument('--requests', type=int, default=50,
+                            help='Измеряемых запросов на URL.')
+        parser.add_argument('--warmup', type=int, default=5,
+                            help='Запросов на URL до замеров.')
+        parser.add_argument('--db', default=os.path.join(
+            tempfile.gettempdir(), 'yatube-benchmark.sqlite3'))
+        parser.add_argument('--fresh', action='store_true',
+                            help='Загрузить набор данных заново.')
+        parser.add_argument('--output', help='Файл результата, по '
+                            'умолчанию benchmark-<время>.json.')
+        parser.add_argument('--compare', help='Результат прошлого прогона.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Набор данных хранится в файле SQLite.')
+        params = {name: options[name] for name in DEFAULTS}
+        overrides = {'CACHES': CACHES, 'DEBUG': False,
+                     'ALLOWED_HOSTS': ['testserver']}
+        with override_settings(**overrides):
+            with benchmark_database(options['db'], params,
+                                    options['fresh']) as loaded:
+                if loaded:
+                    self.stdout.write(
+                        f'Набор данных загружен в {options["db"]}')
+                results = self._run(options)
+        report = {
+            'created': dt.datetime.now(dt.timezone.utc).isoformat(),
+            'dataset': params,
+            'requests': options['requests'],
+            'view_query_threads': settings.VIEW_QUERY_THREADS,
+            'urls': results,
+        }
+        output = options['output'] or (
+            f'benchmark-{dt.datetime.now():%Y%m%d-%H%M%S}.json')
+        with open(output, 'w') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        self._print(results)
+        if options['compare']:
+            self._compare(report, options['compare'])
+        self.stdout.write(self.style.SUCCESS(f'Результат: {output}'))
+
+    def _run(self, options):
+        sample = Sample(options['seed'])
+        counter = QueryCounter()
+        for each in connections.all():
+            counter.install(each)
+        connection_created.connect(counter.install)
+        try:
+            names = [pattern.name for pattern in urls.urlpatterns]
+            missing = [name for name in names if name not in SCENARIOS]
+            if missing:
+                self.stderr.write(f'Нет сценария для URL: {missing}')
+            return {name: self._measure(SCENARIOS[name], sample, counter,
+                                        options)
+                    for name in names if name in SCENARIOS}
+        finally:
+            connection_created.disconnect(counter.install)
+
+    @staticmethod
+    def _measure(scenario, sample, counter, options):
+        timings, queries, sizes, statuses = [], [], [], {}
+        for number in range(options['warmup'] + options['requests']):
+            request = scenario(sample)
+            if request is None:
+                return {'skipped': 'нет данных для запроса'}
+            counter.count = 0
+            started = time.perf_counter()
+            response = _send(request)
+            elapsed = time.perf_counter() - started
+            if number < options['warmup']:
+                continue
+            timings.append(elapsed * 1000)
+            queries.append(counter.count)
+            status = getattr(response, 'status_code', response)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+            sizes.append(len(getattr(response, 'content', b'')))
+        result = {'method': request['method'].upper()}
+        result.update((f'p{percent}_ms', round(percentile(timings, percent),
+                                               2))
+                      for percent in PERCENTILES)
+        result.update({
+            'mean_ms': round(sum(timings) / len(timings), 2),
+            'queries_mean': round(sum(queries) / len(queries), 1),
+            'queries_max': max(queries),
+            'bytes_mean': round(sum(sizes) / len(sizes)),
+            'statuses': statuses,
+        })
+        return result
+
+    def _print(self, results):
+        self.stdout.write(f'{"URL":<18}{"p50":>9}{"p95":>9}{"p99":>9}'
+                          f'{"запросов":>10}{"байт":>9}  ответы')
+        for name, result in results.items():
+            if 'skipped' in result:
+                self.stdout.write(f'{name:<18}пропущен: {result["skipped"]}')
+                continue
+            self.stdout.write(
+                f'{name:<18}{result["p50_ms"]:>9.2f}{result["p95_ms"]:>9.2f}'
+                f'{result["p99_ms"]:>9.2f}{result["queries_mean"]:>10.1f}'
+                f'{result["bytes_mean"]:>9}  {result["statuses"]}')
+
+    def _compare(self, report, path):
+        previous = _read(path)
+        if previous is None:
+            raise CommandError(f'Не удалось прочитать {path}.')
+        if previous.get('dataset') != report['dataset']:
+            self.stderr.write('Наборы данных различаются, сравнение '
+                              'приблизительное.')
+        self.stdout.write(f'Изменение относительно {path}:')
+        for name, result in report['urls'].items():
+            old = previous.get('urls', {}).get(name)
+            if not old or 'skipped' in old or 'skipped' in result:
+                continue
+            changes = ', '.join(
+                f'{key} {old[key]} → {result[key]} '
+                f'({_change(old[key], result[key])})'
+                for key in ('p50_ms', 'p95_ms', 'queries_mean'))
+            self.stdout.write(f'  {name}: {changes}')
+
+
+def _change(old, new):
+    if not old:
+        return '—'
+    return f'{(new - old) / old:+.0%}'
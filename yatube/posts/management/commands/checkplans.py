@@ -0,0 +1,120 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from posts.models import Comment, Follow, Group, Post, User
+
+# «SCAN posts_post» — полный проход по таблице, в старых версиях SQLite
+# «SCAN TABLE posts_post». Проход по индексу («SCAN ... USING INDEX»)
+# допустим только с LIMIT: без временной сортировки он идёт в порядке
+# ленты и останавливается на странице.
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?\w+( AS \w+)?$')
+INDEX_SCAN = re.compile(
+    r'^SCAN (TABLE )?\w+( AS \w+)? USING (COVERING )?INDEX')
+TEMP_SORT = re.compile(r'USE TEMP B-TREE')
+
+# Планы, которые индексом не исправить
+ALLOWED = {
+    # Поиск сортирует по релевантности bm25, она считается на лету;
+    # comment_matches — не больше SEARCH_CANDIDATES совпадений
+    'search': re.compile(r'USE TEMP B-TREE|^SCAN comment_matches$'),
+}
+
+# Отдельный пустой кэш: данные проверки откатываются и не должны попасть
+# в общий
+CACHES = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': f'checkplans-{alias}'}
+    for alias in ('default', 'shared')
+}
+
+
+def is_bad(step, sql):
+    return bool(FULL_SCAN.match(step) or TEMP_SORT.search(step)
+                or (INDEX_SCAN.match(step) and ' LIMIT ' not in sql))
+
+
+class Command(BaseCommand):
+    help = ('Открывает все страницы лент на тестовых данных, выполняет '
+            'EXPLAIN QUERY PLAN для каждого запроса и завершается с '
+            'ошибкой, если план читает таблицу целиком или сортирует во '
+            'временном B-дереве. Данные создаются в транзакции и '
+            'откатываются.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Проверяются только планы SQLite.')
+        problems = []
+        checked = 0
+        # TIMELINE_FANOUT_LIMIT=0: лента подписок читает и разложенные
+        # записи, и посты pull-авторов
+        with override_settings(CACHES=CACHES, TIMELINE_FANOUT_LIMIT=0):
+            with transaction.atomic():
+                for name, url, client in self._pages():
+                    with CaptureQueriesContext(connection) as queries:
+                        response = client.get(url)
+                    if response.status_code != 200:
+                        raise CommandError(f'{url}: {response.status_code}')
+                    for query in queries.captured_queries:
+                        if not query['sql'].startswith('SELECT'):
+                            continue
+                        checked += 1
+                        problems.extend(
+                            f'{name}: {detail}\n    {query["sql"]}'
+                            for detail in self._bad_steps(name, query['sql']))
+                transaction.set_rollback(True)
+        for problem in problems:
+            self.stderr.write(problem)
+        if problems:
+            raise CommandError(f'Плохих планов: {len(problems)}.')
+        self.stdout.write(self.style.SUCCESS(
+            f'Проверено запросов: {checked}, плохих планов нет.'))
+
+    @staticmethod
+    def _bad_steps(name, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            steps = [row[-1] for row in cursor.fetchall()]
+        allowed = ALLOWED.get(name)
+        return [step for step in steps
+                if is_bad(step, sql)
+                and not (allowed and allowed.search(step))]
+
+    @staticmethod
+    def _pages():
+        author, other, reader = (
+            User.objects.create_user(username=f'checkplans_{name}')
+            for name in ('author', 'other', 'reader'))
+        group = Group.objects.create(title='checkplans', slug='checkplans')
+        post = Post.objects.create(text='checkplans', author=author,
+                                   group=group)
+        Post.objects.create(text='checkplans', author=other)
+        Comment.objects.create(post=post, author=reader, text='checkplans')
+        Follow.objects.create(user=reader, author=author)
+        Follow.objects.create(user=reader, author=other)
+        anonymous = Client()
+        logged_in = Client()
+        logged_in.force_login(reader)
+        profile = reverse('profile', args=[author.username])
+        return [
+            ('index', reverse('index'), anonymous),
+            ('group', reverse('group_posts', args=[group.slug]), anonymous),
+            ('profile', profile, anonymous),
+            ('profile', profile, logged_in),
+            ('post', reverse('post', args=[author.username, post.pk]),
+             logged_in),
+            ('follow', reverse('follow_index'), logged_in),
+            ('search', f'{reverse("search")}?q=checkplans', anonymous),
+            ('api', reverse('api:posts'), anonymous),
+            ('api', reverse('api:group_posts', args=[group.slug]),
+             anonymous),
+            ('api', reverse('api:profile_posts', args=[author.username]),
+             anonymous),
+            ('api', reverse('api:post_comments', args=[post.pk]),
+             anonymous),
+            ('api', f'{reverse("api:posts")}?ids={post.pk}', anonymous),
+            ('api', reverse('api:feed'), logged_in),
+        ]
@@ -0,0 +1,47 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand
+from posts.images import describe_file
+from posts.models import Post
+from posts.thumbnails import touch_posts
+
+
+class Command(BaseCommand):
+    help = ('Заполняет размеры, основной цвет и превью картинок постов, '
+            'загруженных до их появления.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Пересчитать и уже заполненные посты.')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        posts = (Post.objects.exclude(image='').exclude(image__isnull=True)
+                 .only('image').order_by('pk'))
+        if not options['all']:
+            posts = posts.filter(image_width__isnull=True)
+        batch = []
+        described = failed = 0
+        for post in posts.iterator(chunk_size=options['batch_size']):
+            try:
+                with post.image.open('rb') as file:
+                    description = describe_file(file)
+            except (OSError, ValidationError) as error:
+                failed += 1
+                self.stderr.write(f'Пост {post.pk}: {error}')
+                continue
+            for field, value in description.items():
+                setattr(post, field, value)
+            batch.append(post)
+            if len(batch) >= options['batch_size']:
+                described += self._save(batch)
+                batch = []
+        described += self._save(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f'Описано картинок: {described}, ошибок: {failed}'))
+
+    @staticmethod
+    def _save(posts):
+        Post.objects.bulk_update(posts, ['image_width', 'image_height',
+                                         'image_color', 'image_placeholder'])
+        touch_posts([post.pk for post in posts])
+        return len(posts)
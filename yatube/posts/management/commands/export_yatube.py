@@ -0,0 +1,30 @@
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, OutputWrapper
+from posts.transfer import dumps, export_records, open_jsonl
+
+
+class Command(BaseCommand):
+    help = ('Выгружает пользователей, группы, посты, комментарии и '
+            'подписки в JSONL для import_yatube. Записи читаются из БД '
+            'курсором, память не растёт с числом постов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-',
+                            help='Файл (.gz — со сжатием), «-» — stdout.')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Строк за одно чтение из курсора.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if path == '-':
+            output, report = nullcontext(self.stdout), self.stderr
+        else:
+            output, report = open_jsonl(path, 'w'), self.stdout
+        written = 0
+        with output as file:
+            stream = file if path == '-' else OutputWrapper(file)
+            for record in export_records(options['chunk_size']):
+                stream.write(dumps(record))
+                written += 1
+        report.write(self.style.SUCCESS(f'Выгружено записей: {written}'))
@@ -0,0 +1,43 @@
+import sys
+import time
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+from posts.transfer import TYPES, Importer, open_jsonl
+
+
+class Command(BaseCommand):
+    help = ('Загружает JSONL из export_yatube пачками bulk_create, мимо '
+            'сигналов, затем пересчитывает счётчики, ссылки на картинки и '
+            'ленты и сбрасывает кэш лент. Записи, которые уже есть, '
+            'пропускаются: прерванный импорт можно повторить. Миниатюры '
+            'картинок строит rebuild_thumbnails.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-',
+                            help='Файл (.gz — со сжатием), «-» — stdin.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Записей в одном bulk_create.')
+        parser.add_argument('--batches-per-transaction', type=int,
+                            default=20,
+                            help='Пачек в одной транзакции.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        source = (nullcontext(sys.stdin) if path == '-'
+                  else open_jsonl(path, 'r'))
+        importer = Importer(options['batch_size'],
+                            options['batches_per_transaction'])
+        started = time.monotonic()
+        try:
+            with source as lines:
+                counts = importer.run(lines)
+        except (ValueError, IntegrityError) as error:
+            raise CommandError(
+                f'{error}. Загруженные пачки сохранены, повторный запуск '
+                f'их пропустит.')
+        summary = ', '.join(f'{kind}: {counts[kind]}' for kind in TYPES)
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено за {time.monotonic() - started:.1f} с — {summary}; '
+            f'лент подписок заполнено: {counts["timeline"]}'))
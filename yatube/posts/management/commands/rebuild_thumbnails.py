@@ -0,0 +1,115 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+from posts.models import Post
+from posts.thumbnails import build, image_file, touch_posts
+
+# Каждые столько картинок — строка прогресса и обновление карточек постов
+PROGRESS_EVERY = 100
+# Посты читаются пачками по id: весь список в память не загружается
+BATCH_SIZE = 1000
+
+
+def _init_worker():
+    django.setup()
+
+
+def _build(item):
+    """Выполняется в процессе пула: (id поста, построено, пропущено,
+    ошибка). Ошибки отдельных вариантов build() пишет в лог."""
+    post_id, image = item
+    try:
+        built, skipped, failed = build(image_file(image))
+    except Exception as error:
+        return post_id, 0, 0, f'{type(error).__name__}: {error}'
+    error = f'не построено вариантов: {failed}' if failed else None
+    return post_id, built, skipped, error
+
+
+def _batches(after):
+    """(id, картинка) постов с id больше after, пачками по BATCH_SIZE."""
+    images = (Post.objects.exclude(image='').exclude(image__isnull=True)
+              .order_by('pk'))
+    while True:
+        batch = list(images.filter(pk__gt=after)
+                     .values_list('pk', 'image')[:BATCH_SIZE])
+        if not batch:
+            return
+        yield batch
+        after = batch[-1][0]
+
+
+class Command(BaseCommand):
+    help = ('Строит недостающие варианты миниатюр (POST_THUMBNAILS) для '
+            'картинок всех постов на всех ядрах. Готовые варианты '
+            'пропускаются, поэтому прерванный запуск можно повторить или '
+            'продолжить с --after.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Число процессов; 0 — без пула, в текущем процессе.')
+        parser.add_argument(
+            '--after', type=int, default=0,
+            help='Начать с постов, id которых больше указанного.')
+        parser.add_argument('--chunksize', type=int, default=16)
+
+    def handle(self, *args, **options):
+        total = (Post.objects.filter(pk__gt=options['after'])
+                 .exclude(image='').exclude(image__isnull=True).count())
+        built = skipped = failed = 0
+        touched = []
+        last_id = options['after']
+        started = time.monotonic()
+        results = self._results(_batches(options['after']), options)
+        for done, result in enumerate(results, 1):
+            post_id, post_built, post_skipped, error = result
+            built += post_built
+            skipped += post_skipped
+            last_id = post_id
+            if post_built:
+                touched.append(post_id)
+            if error:
+                failed += 1
+                self.stderr.write(f'Пост {post_id}: {error}')
+            if done % PROGRESS_EVERY == 0:
+                # Всё до last_id готово: прерванный запуск продолжается
+                # с --after last_id
+                touch_posts(touched)
+                touched = []
+                self.stdout.write(f'{done} из {total}, '
+                                  f'{self._rate(done, started)}, '
+                                  f'последний id: {last_id}')
+        touch_posts(touched)
+        self.stdout.write(self.style.SUCCESS(
+            f'Картинок: {total}, построено вариантов: {built}, '
+            f'пропущено: {skipped}, ошибок: {failed}, '
+            f'{self._rate(total, started)}. Последний id: {last_id}'))
+
+    def _results(self, batches, options):
+        if not options['workers']:
+            return (result for batch in batches
+                    for result in map(_build, batch))
+        pool = ProcessPoolExecutor(max_workers=options['workers'],
+                                   initializer=_init_worker)
+        return self._drain(pool, batches, options['chunksize'])
+
+    @staticmethod
+    def _drain(pool, batches, chunksize):
+        # pool.map() сразу ставит в очередь всё, что ему дали, поэтому
+        # отдаём пулу по одной пачке
+        with pool:
+            for batch in batches:
+                # Дочерние процессы открывают свои соединения с БД
+                connections.close_all()
+                yield from pool.map(_build, batch, chunksize=chunksize)
+
+    @staticmethod
+    def _rate(count, started):
+        elapsed = time.monotonic() - started
+        rate = count / elapsed if elapsed else 0
+        return f'{elapsed:.1f} с, {rate:.1f} картинок/с'
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from posts.counters import recount
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов, комментариев и подписок.'
+
+    def handle(self, *args, **options):
+        posts, users = recount()
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено постов: {posts}, пользователей: {users}'))
@@ -0,0 +1,64 @@
+"""Счётчики ссылок на файлы картинок постов.
+
+Картинки лежат в ContentAddressedStorage, и один файл может принадлежать
+многим постам. Сигналы постов вызывают acquire() и release(); файл и его
+миниатюры удаляет фоновая задача, когда на него не остаётся ссылок.
+"""
+import logging
+
+from core.jobs import task
+from django.core.exceptions import SuspiciousFileOperation
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from sorl.thumbnail import delete
+
+from .models import MediaFile, Post
+from .thumbnails import image_file
+
+logger = logging.getLogger(__name__)
+
+
+def acquire(name):
+    _, created = MediaFile.objects.get_or_create(
+        name=name, defaults={'references': 1})
+    if not created:
+        MediaFile.objects.filter(name=name).update(
+            references=F('references') + 1)
+
+
+def release(name):
+    MediaFile.objects.filter(name=name, references__gt=0).update(
+        references=F('references') - 1)
+    deleted, _ = MediaFile.objects.filter(name=name, references=0).delete()
+    if deleted:
+        delete_file.delay(name)
+
+
+def recount():
+    """Пересчитываем ссылки по постам, например после импорта мимо
+    сигналов. Возвращаем число исправленных файлов."""
+    names = (Post.objects.exclude(image='').exclude(image__isnull=True)
+             .order_by().values_list('image', flat=True).distinct())
+    MediaFile.objects.bulk_create(
+        [MediaFile(name=name) for name in names.iterator()],
+        batch_size=500, ignore_conflicts=True)
+    real = Coalesce(Subquery(
+        Post.objects.filter(image=OuterRef('pk')).order_by()
+        .values('image').annotate(total=Count('pk')).values('total')), 0)
+    drifted = (MediaFile.objects.annotate(real_references=real)
+               .exclude(references=F('real_references'))
+               .values_list('pk', flat=True))
+    return MediaFile.objects.filter(pk__in=list(drifted)).update(
+        references=real)
+
+
+@task
+def delete_file(name):
+    # Тот же файл могли загрузить заново, пока задача ждала в очереди
+    if MediaFile.objects.filter(name=name).exists():
+        return
+    try:
+        delete(image_file(name))
+    except SuspiciousFileOperation:
+        # Имя из времён до ContentAddressedStorage вне MEDIA_ROOT
+        logger.warning('Не удалось удалить файл %s', name, exc_info=True)
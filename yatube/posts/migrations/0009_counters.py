@@ -0,0 +1,64 @@
+# Generated by Django 2.2.6 on 2026-10-18 05:22
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    UserCounter = apps.get_model('posts', 'UserCounter')
+
+    def count(model, field):
+        rows = (model.objects.filter(**{field: OuterRef('pk')})
+                .order_by().values(field).annotate(total=Count('pk'))
+                .values('total'))
+        return Coalesce(Subquery(rows), 0)
+
+    Post.objects.update(comments_count=count(Comment, 'post'))
+    users = User.objects.annotate(
+        posts_count=count(Post, 'author'),
+        followers_count=count(Follow, 'author'),
+        following_count=count(Follow, 'user'),
+    ).values_list('pk', 'posts_count', 'followers_count', 'following_count')
+    UserCounter.objects.bulk_create(
+        [UserCounter(user_id=pk, posts_count=posts,
+                     followers_count=followers, following_count=following)
+         for pk, posts, followers, following in users.iterator()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0008_timelineentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counter', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Записей')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='Подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='Подписан')),
+            ],
+            options={
+                'verbose_name': 'Счётчики пользователя',
+                'verbose_name_plural': 'Счётчики пользователей',
+            },
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Комментариев'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
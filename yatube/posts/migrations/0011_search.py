@@ -0,0 +1,53 @@
+from django.db import migrations
+
+# Внешние (external content) FTS5-таблицы: текст хранится только в самих
+# таблицах постов и комментариев, индекс синхронизируют триггеры.
+FTS_TABLES = (('posts_post_fts', 'posts_post'),
+              ('posts_comment_fts', 'posts_comment'))
+
+CREATE_SQL = (
+    """CREATE VIRTUAL TABLE {fts} USING fts5(
+        text, content='{table}', content_rowid='id', tokenize='unicode61'
+    )""",
+    """CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN
+        INSERT INTO {fts}(rowid, text) VALUES (new.id, new.text);
+    END""",
+    """CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN
+        INSERT INTO {fts}({fts}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END""",
+    """CREATE TRIGGER {fts}_au AFTER UPDATE OF text ON {table} BEGIN
+        INSERT INTO {fts}({fts}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO {fts}(rowid, text) VALUES (new.id, new.text);
+    END""",
+    "INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+)
+
+DROP_SQL = (
+    'DROP TRIGGER IF EXISTS {fts}_ai',
+    'DROP TRIGGER IF EXISTS {fts}_ad',
+    'DROP TRIGGER IF EXISTS {fts}_au',
+    'DROP TABLE IF EXISTS {fts}',
+)
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for fts, table in FTS_TABLES:
+            for statement in statements:
+                schema_editor.execute(statement.format(fts=fts, table=table))
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_post_updated'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE_SQL), run(DROP_SQL)),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 2.2.6 on 2026-10-18 05:36
+
+from django.db import migrations, models
+from django.db.models import Count
+import posts.storage
+
+
+def fill_media_files(apps, schema_editor):
+    """Уже загруженные картинки остаются под старыми именами."""
+    Post = apps.get_model('posts', 'Post')
+    MediaFile = apps.get_model('posts', 'MediaFile')
+    images = (Post.objects.exclude(image='').exclude(image__isnull=True)
+              .order_by().values('image').annotate(total=Count('pk'))
+              .values_list('image', 'total'))
+    MediaFile.objects.bulk_create(
+        [MediaFile(name=name, references=total)
+         for name, total in images.iterator()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaFile',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False, verbose_name='Файл')),
+                ('references', models.PositiveIntegerField(default=0, verbose_name='Ссылок')),
+            ],
+            options={
+                'verbose_name': 'Файл картинки',
+                'verbose_name_plural': 'Файлы картинок',
+            },
+        ),
+        # Хранилище не меняет схему, а пересоздание таблицы в SQLite
+        # удалило бы триггеры полнотекстового индекса (0011_search)
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.AlterField(
+                model_name='post',
+                name='image',
+                field=models.ImageField(blank=True, null=True, storage=posts.storage.ContentAddressedStorage(), upload_to='posts/'),
+            ),
+        ]),
+        migrations.RunPython(fill_media_files, migrations.RunPython.noop),
+    ]
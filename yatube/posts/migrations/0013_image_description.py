@@ -0,0 +1,33 @@
+# Generated by Django 2.2.6 on 2026-10-18 05:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_media_files'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_color',
+            field=models.CharField(blank=True, editable=False, max_length=7, verbose_name='Основной цвет'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Высота'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_placeholder',
+            field=models.TextField(blank=True, editable=False, verbose_name='Превью картинки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Ширина'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.2.6 on 2026-10-18 07:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_pull_authors(apps, schema_editor):
+    """Авторы выше порога уже пропускали раскладку."""
+    UserCounter = apps.get_model('posts', 'UserCounter')
+    UserCounter.objects.filter(
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+    ).update(timeline_pending=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_field_options'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usercounter',
+            name='timeline_pending',
+            field=models.BooleanField(default=False, verbose_name='Лента подписчиков не разложена'),
+        ),
+        migrations.RunPython(mark_pull_authors, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,8 @@
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from .storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
@@ -21,26 +23,69 @@ class Group(models.Model):
         return self.title
 
 
+class PostManager(models.Manager):
+    def for_feed(self):
+        """Посты для ленты: автор и группа одним JOIN, без лишних колонок.
+
+        Число комментариев хранится в comments_count, поэтому страница
+        из любого числа постов рендерится за постоянное число запросов.
+        """
+        return (self.get_queryset().select_related('author', 'group')
+                .defer('author__password', 'group__description'))
+
+
 class Post(models.Model):
     text = models.TextField(verbose_name='Описание')
     pub_date = models.DateTimeField(auto_now_add=True,
                                     verbose_name='Дата публикации')
+    updated = models.DateTimeField(auto_now=True,
+                                   verbose_name='Дата изменения')
     author = models.ForeignKey(User, on_delete=models.CASCADE,
                                related_name='posts', verbose_name='Автор')
     group = models.ForeignKey(Group, on_delete=models.SET_NULL, blank=True,
                               null=True, related_name='posts',
                               verbose_name='Группа')
-    image = models.ImageField(upload_to='posts/', blank=True, null=True)
+    image = models.ImageField(upload_to='posts/', blank=True, null=True,
+                              storage=ContentAddressedStorage())
+    comments_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Комментариев')
+    # Заполняются при загрузке картинки (posts.images.describe)
+    image_width = models.PositiveIntegerField(
+        null=True, blank=True, editable=False, verbose_name='Ширина')
+    image_height = models.PositiveIntegerField(
+        null=True, blank=True, editable=False, verbose_name='Высота')
+    image_color = models.CharField(max_length=7, blank=True, editable=False,
+                                   verbose_name='Основной цвет')
+    image_placeholder = models.TextField(blank=True, editable=False,
+                                         verbose_name='Превью картинки')
+
+    objects = PostManager()
 
     class Meta:
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
         ordering = ('-pub_date',)
+        # Ленты листаются по ключу (pub_date, id), см. CursorPaginator
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_date_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_date_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_date_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
 
+class CommentManager(models.Manager):
+    def for_feed(self):
+        """Комментарии вместе с авторами."""
+        return (self.get_queryset().select_related('author')
+                .defer('author__password'))
+
+
 class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE,
                              related_name='comments',
@@ -52,10 +97,16 @@ class Comment(models.Model):
     created = models.DateTimeField(auto_now_add=True,
                                    verbose_name='Дата публикации')
 
+    objects = CommentManager()
+
     class Meta:
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
         ordering = ('-created',)
+        indexes = [
+            models.Index(fields=['post', '-created', '-id'],
+                         name='comment_post_created_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -73,6 +124,74 @@ class Follow(models.Model):
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
         unique_together = ('user', 'author',)
+        # Подписчики автора: раскладка ленты и кнопка «Подписаться»
+        indexes = [
+            models.Index(fields=['author', 'user'],
+                         name='follow_author_user_idx'),
+        ]
 
     def __str__(self):
         return f'{self.user} подписан на {self.author}'
+
+
+class UserCounter(models.Model):
+    """Счётчики пользователя, поддерживаются сигналами."""
+    user = models.OneToOneField(User, primary_key=True,
+                                related_name='counter',
+                                on_delete=models.CASCADE,
+                                verbose_name='Пользователь')
+    posts_count = models.PositiveIntegerField(default=0,
+                                              verbose_name='Записей')
+    followers_count = models.PositiveIntegerField(
+        default=0, verbose_name='Подписчиков')
+    following_count = models.PositiveIntegerField(default=0,
+                                                  verbose_name='Подписан')
+    # Раскладку постов автора пропускали, пока подписчиков было больше
+    # TIMELINE_FANOUT_LIMIT (см. posts.timeline)
+    timeline_pending = models.BooleanField(
+        default=False, verbose_name='Лента подписчиков не разложена')
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+    def __str__(self):
+        return f'Счётчики {self.user}'
+
+
+class MediaFile(models.Model):
+    """Файл картинки и число постов, которые на него ссылаются."""
+    name = models.CharField(max_length=100, primary_key=True,
+                            verbose_name='Файл')
+    references = models.PositiveIntegerField(default=0,
+                                             verbose_name='Ссылок')
+
+    class Meta:
+        verbose_name = 'Файл картинки'
+        verbose_name_plural = 'Файлы картинок'
+
+    def __str__(self):
+        return self.name
+
+
+class TimelineEntry(models.Model):
+    """Запись домашней ленты подписчика, раскладывается при публикации."""
+    user = models.ForeignKey(User, related_name='timeline',
+                             on_delete=models.CASCADE,
+                             verbose_name='Подписчик')
+    post = models.ForeignKey(Post, related_name='timeline_entries',
+                             on_delete=models.CASCADE,
+                             verbose_name='Пост')
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        unique_together = ('user', 'post',)
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='timeline_user_date_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.post} в ленте {self.user}'
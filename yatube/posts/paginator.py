@@ -0,0 +1,145 @@
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+def encode_cursor(values):
+    """Упаковываем значения ключа сортировки в строку для URL."""
+    raw = json.dumps([
+        value.isoformat() if hasattr(value, 'isoformat') else value
+        for value in values
+    ])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Распаковываем курсор. Испорченный курсор даёт None.
+
+    Типы значений здесь не проверяются: это делает
+    CursorPaginator.parse_cursor по полям ключа.
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw.decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if not isinstance(values, list) or not all(
+            isinstance(value, (str, int, float)) for value in values):
+        return None
+    try:
+        return [
+            parse_datetime(value) or value if isinstance(value, str)
+            else value
+            for value in values
+        ]
+    except ValueError:
+        return None
+
+
+class CursorPaginator(Paginator):
+    """Пагинатор по ключу (pub_date, id) без COUNT(*) и OFFSET.
+
+    Страница выбирается условием «старше/новее курсора», поэтому её
+    стоимость не зависит от глубины листания. Номер страницы условный:
+    1 — самая свежая страница, 2 — любая другая; num_pages показывает,
+    есть ли страница старше. Точное число записей по-прежнему доступно
+    через count, но запрос выполняется только при обращении к нему.
+    """
+
+    def __init__(self, object_list, per_page, key=('pub_date', 'id')):
+        super().__init__(object_list, per_page)
+        self.key = key
+        self.next_cursor = None
+        self.previous_cursor = None
+
+    @property
+    def num_pages(self):
+        number = 2 if self.previous_cursor else 1
+        return number + 1 if self.next_cursor else number
+
+    def _cursor_for(self, obj):
+        return encode_cursor(getattr(obj, field) for field in self.key)
+
+    def key_fields(self):
+        """Поля модели, задающие типы значений курсора."""
+        meta = self.object_list.model._meta
+        return [meta.get_field(name) for name in self.key]
+
+    def parse_cursor(self, cursor):
+        """Значения курсора в типах полей ключа; None, если курсор
+        испорчен или не подходит к ключу."""
+        values = decode_cursor(cursor)
+        if values is None or len(values) != len(self.key):
+            return None
+        try:
+            return [field.to_python(value)
+                    for field, value in zip(self.key_fields(), values)]
+        except (ValidationError, TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _seek(key, values, older):
+        """Условие «строго после курсора» для составного ключа."""
+        lookup = 'lt' if older else 'gt'
+        condition = Q()
+        for index, field in enumerate(key):
+            step = Q(**{f'{field}__{lookup}': values[index]})
+            for prev_field, prev_value in zip(key[:index], values):
+                step &= Q(**{prev_field: prev_value})
+            condition |= step
+        return condition
+
+    def _fetch(self, queryset, key, after, before):
+        """До per_page + 1 строк за курсором в порядке обхода."""
+        order = [f'-{field}' for field in key]
+        if before:
+            queryset = queryset.filter(self._seek(key, before, older=False))
+            order = list(key)
+        elif after:
+            queryset = queryset.filter(self._seek(key, after, older=True))
+        return list(queryset.order_by(*order)[:self.per_page + 1])
+
+    def get_rows(self, after, before):
+        return self._fetch(self.object_list, self.key, after, before)
+
+    def get_page(self, after=None, before=None):
+        """Страница старше курсора after или новее курсора before."""
+        after = self.parse_cursor(after)
+        before = None if after else self.parse_cursor(before)
+
+        rows = self.get_rows(after, before)
+        if before and not rows:
+            # Новее курсора ничего нет — отдаём первую страницу.
+            return self.get_page()
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if before:
+            rows.reverse()
+            has_newer, has_older = has_more, True
+        else:
+            has_newer, has_older = bool(after), has_more
+        if rows:
+            self.previous_cursor = (
+                self._cursor_for(rows[0]) if has_newer else None)
+            self.next_cursor = (
+                self._cursor_for(rows[-1]) if has_older else None)
+        elif after:
+            self.previous_cursor = encode_cursor(after)
+        return Page(rows, 2 if self.previous_cursor else 1, self)
+
+
+def get_page(request, object_list):
+    """Курсорная страница ленты по параметрам after/before запроса."""
+    paginator = CursorPaginator(object_list,
+                                settings.PAGINATOR_NUMBER_OF_PAGES)
+    return paginator.get_page(request.GET.get('after'),
+                              request.GET.get('before'))
@@ -0,0 +1,179 @@
+"""Полнотекстовый поиск по постам и комментариям (SQLite FTS5).
+
+Индексы posts_post_fts и posts_comment_fts создаёт миграция 0011_search,
+их синхронизируют триггеры. Пост находится и по своему тексту, и по
+тексту комментариев; релевантность — лучшая из оценок bm25. Результаты
+листаются курсором по (score, id), как и ленты.
+
+bm25 считается для каждой найденной строки до сортировки, поэтому
+кандидатов ограничивает SEARCH_CANDIDATES: по запросу вроде «а*» ранжируются
+только самые новые совпадения из постов и из комментариев, а не весь индекс.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+from django.utils.functional import cached_property
+
+from .models import Post
+from .paginator import CursorPaginator
+
+WORD = re.compile(r'\w+')
+
+FTS_TABLES = (('posts_post_fts', 'posts_post'),
+              ('posts_comment_fts', 'posts_comment'))
+
+# Те же триггеры, что создаёт миграция 0011_search
+TRIGGERS_SQL = (
+    """CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+        INSERT INTO {fts}(rowid, text) VALUES (new.id, new.text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+        INSERT INTO {fts}({fts}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF text ON {table}
+    BEGIN
+        INSERT INTO {fts}({fts}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO {fts}(rowid, text) VALUES (new.id, new.text);
+    END""",
+)
+
+# FTS5 отдаёт совпадения по rowid и с LIMIT останавливается, не оценивая
+# остальные строки
+MATCHES_SQL = """
+    SELECT post_id, MAX(score) AS score FROM (
+        SELECT * FROM (
+            SELECT rowid AS post_id, -bm25(posts_post_fts) AS score
+            FROM posts_post_fts WHERE posts_post_fts MATCH %s
+            ORDER BY rowid DESC LIMIT %s
+        )
+        UNION ALL
+        SELECT comment.post_id, comment_matches.score FROM (
+            SELECT rowid AS comment_id, -bm25(posts_comment_fts) AS score
+            FROM posts_comment_fts WHERE posts_comment_fts MATCH %s
+            ORDER BY rowid DESC LIMIT %s
+        ) AS comment_matches
+        JOIN posts_comment AS comment
+        ON comment.id = comment_matches.comment_id
+    ) GROUP BY post_id
+"""
+
+
+def fts_query(text):
+    """Превращаем ввод пользователя в безопасный запрос FTS5.
+
+    Каждое слово берётся в кавычки, последнее ищется как префикс, так что
+    операторы и спецсимволы FTS5 из строки поиска не интерпретируются.
+    """
+    words = WORD.findall(text)
+    if not words:
+        return ''
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def fts_enabled():
+    return connection.vendor == 'sqlite'
+
+
+def restore_triggers(using='default', **kwargs):
+    """post_migrate: возвращаем триггеры индекса.
+
+    SQLite добавляет и меняет поля пересозданием таблицы, и триггеры
+    старой таблицы пропадают. Если их пришлось создать заново, индекс
+    перестраивается целиком.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for fts, table in FTS_TABLES:
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE name IN (%s, %s)",
+                [fts, f'{fts}_ai'])
+            found = {name for name, in cursor.fetchall()}
+            if fts not in found or f'{fts}_ai' in found:
+                continue
+            for statement in TRIGGERS_SQL:
+                cursor.execute(statement.format(fts=fts, table=table))
+            cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def matching(model, text):
+    """Условие pk__in по индексу модели для фильтрации queryset."""
+    table = f'{model._meta.db_table}_fts'
+    return RawSQL(f'SELECT rowid FROM {table} WHERE {table} MATCH %s',
+                  [fts_query(text)])
+
+
+class SearchPaginator(CursorPaginator):
+    """Курсор по (score, id): сначала самые релевантные посты."""
+
+    def __init__(self, query, per_page):
+        super().__init__(Post.objects.none(), per_page, key=('score', 'id'))
+        self.query = fts_query(query)
+
+    def key_fields(self):
+        return [FloatField(), Post._meta.get_field('id')]
+
+    def match_params(self):
+        limit = settings.SEARCH_CANDIDATES
+        return [self.query, limit, self.query, limit]
+
+    @cached_property
+    def count(self):
+        if not self.query:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM ({MATCHES_SQL})',
+                           self.match_params())
+            return cursor.fetchone()[0]
+
+    def get_rows(self, after, before):
+        if not self.query:
+            return []
+        sql = f'SELECT post_id, score FROM ({MATCHES_SQL})'
+        params = self.match_params()
+        cursor_values = before or after
+        if cursor_values:
+            lookup = '>' if before else '<'
+            sql += (f' WHERE score {lookup} %s'
+                    f' OR (score = %s AND post_id {lookup} %s)')
+            score, post_id = cursor_values
+            params += [score, score, post_id]
+        order = 'ASC' if before else 'DESC'
+        sql += f' ORDER BY score {order}, post_id {order} LIMIT %s'
+        params.append(self.per_page + 1)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            scores = dict(cursor.fetchall())
+        posts = Post.objects.for_feed().in_bulk(list(scores))
+        rows = []
+        for post_id, score in scores.items():
+            if post_id in posts:
+                posts[post_id].score = score
+                rows.append(posts[post_id])
+        return rows
+
+
+def get_search_page(request, query):
+    """Страница результатов. Без FTS5 (не SQLite) ищем через LIKE."""
+    if fts_enabled():
+        paginator = SearchPaginator(query,
+                                    settings.PAGINATOR_NUMBER_OF_PAGES)
+    else:
+        posts = Post.objects.for_feed()
+        if query:
+            posts = posts.filter(Q(text__icontains=query)
+                                 | Q(comments__text__icontains=query))
+        else:
+            posts = posts.none()
+        paginator = CursorPaginator(posts.distinct(),
+                                    settings.PAGINATOR_NUMBER_OF_PAGES)
+    return paginator.get_page(request.GET.get('after'),
+                              request.GET.get('before'))
@@ -0,0 +1,151 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import media, thumbnails, timeline
+from .cache import INDEX, bump_feeds, group_scope, post_scopes, profile_scope
+from .counters import bump_comments, bump_user
+from .models import Comment, Follow, Group, Post, User, UserCounter
+
+
+@receiver(post_save, sender=User)
+def user_created(sender, instance, created, **kwargs):
+    """Заводим счётчики новому пользователю."""
+    if created:
+        UserCounter.objects.get_or_create(user=instance)
+
+
+def invalidate_feeds(scopes):
+    """Меняем версии лент сразу и ещё раз после фиксации транзакции:
+    параллельный запрос мог успеть закэшировать старые данные под
+    промежуточной версией."""
+    bump_feeds(scopes)
+    transaction.on_commit(lambda: bump_feeds(scopes))
+
+
+def _previous(instance, *fields):
+    if not instance.pk:
+        return None
+    return (type(instance).objects.filter(pk=instance.pk)
+            .values_list(*fields).first())
+
+
+@receiver(pre_save, sender=User)
+def user_changing(sender, instance, update_fields=None, **kwargs):
+    """Запоминаем имя: оно есть в карточках постов."""
+    instance._previous_username = None
+    if update_fields is None or 'username' in update_fields:
+        instance._previous_username = _previous(instance, 'username')
+
+
+@receiver(post_save, sender=User)
+def user_renamed(sender, instance, created, **kwargs):
+    """Сбрасываем ленты с карточками переименованного автора."""
+    previous = getattr(instance, '_previous_username', None)
+    if created or previous is None or previous == (instance.username,):
+        return
+    groups = (Post.objects.filter(author=instance, group__isnull=False)
+              .values_list('group', flat=True).distinct())
+    invalidate_feeds([INDEX, profile_scope(instance.pk),
+                      *map(group_scope, groups)])
+
+
+@receiver(pre_save, sender=Group)
+def group_changing(sender, instance, **kwargs):
+    """Запоминаем slug и название: они есть в карточках постов."""
+    instance._previous_card = _previous(instance, 'slug', 'title')
+
+
+@receiver(post_save, sender=Group)
+def group_renamed(sender, instance, created, **kwargs):
+    """Сбрасываем ленты с карточками постов переименованной группы."""
+    previous = getattr(instance, '_previous_card', None)
+    if created or previous in (None, (instance.slug, instance.title)):
+        return
+    authors = (Post.objects.filter(group=instance)
+               .values_list('author', flat=True).distinct())
+    invalidate_feeds([INDEX, group_scope(instance.pk),
+                      *map(profile_scope, authors)])
+
+
+def invalidate_post_feeds(post_id):
+    post = Post.objects.filter(pk=post_id).values_list('author', 'group')
+    for author_id, group_id in post:
+        invalidate_feeds(post_scopes(author_id, group_id))
+
+
+@receiver(pre_save, sender=Post)
+def post_changing(sender, instance, **kwargs):
+    """Запоминаем прежние группу и картинку: пост мог уйти из группы,
+    а картинку могли заменить."""
+    instance._previous_group_id = instance._previous_image = None
+    if instance.pk:
+        previous = (Post.objects.filter(pk=instance.pk)
+                    .values_list('group', 'image').first())
+        if previous:
+            instance._previous_group_id, instance._previous_image = previous
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    """Новый пост попадает в ленты подписчиков и в счётчик автора,
+    для новой картинки строятся миниатюры."""
+    if created:
+        bump_user(instance.author_id, posts_count=1)
+        timeline.fan_out(instance)
+    image = instance.image.name if instance.image else None
+    previous_image = getattr(instance, '_previous_image', None)
+    if image != previous_image:
+        if image:
+            media.acquire(image)
+            thumbnails.generate.delay(instance.pk)
+        if previous_image:
+            media.release(previous_image)
+    scopes = post_scopes(instance.author_id, instance.group_id)
+    previous_group_id = getattr(instance, '_previous_group_id', None)
+    if previous_group_id and previous_group_id != instance.group_id:
+        scopes.append(group_scope(previous_group_id))
+    invalidate_feeds(scopes)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    bump_user(instance.author_id, posts_count=-1)
+    if instance.image:
+        media.release(instance.image.name)
+    invalidate_feeds(post_scopes(instance.author_id, instance.group_id))
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        bump_comments(instance.post_id, 1)
+    invalidate_post_feeds(instance.post_id)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    bump_comments(instance.post_id, -1)
+    invalidate_post_feeds(instance.post_id)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    """Подписка добавляет в ленту уже опубликованные посты автора."""
+    if created:
+        bump_user(instance.author_id, followers_count=1)
+        bump_user(instance.user_id, following_count=1)
+        timeline.backfill(instance.user, instance.author)
+        invalidate_feeds([profile_scope(instance.author_id),
+                          profile_scope(instance.user_id)])
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    """Отписка убирает посты автора из ленты."""
+    bump_user(instance.author_id, followers_count=-1)
+    bump_user(instance.user_id, following_count=-1)
+    timeline.drop(instance.user_id, instance.author_id)
+    timeline.author_unfollowed(instance.author_id)
+    invalidate_feeds([profile_scope(instance.author_id),
+                      profile_scope(instance.user_id)])
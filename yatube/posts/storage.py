@@ -0,0 +1,30 @@
+import hashlib
+import os
+import posixpath
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Файл называется sha256 своего содержимого: posts/ab/abcd….jpg.
+
+    Одинаковые загрузки сохраняются один раз и получают одно имя, поэтому
+    и миниатюры sorl (они привязаны к имени исходника) общие для всех
+    постов с этой картинкой. Сколько постов ссылается на файл, считает
+    MediaFile (posts.media), он же удаляет файл без ссылок.
+    """
+
+    def save(self, name, content, max_length=None):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        name = posixpath.join(posixpath.dirname(name), digest[:2],
+                              digest + extension)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
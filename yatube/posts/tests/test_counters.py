@@ -0,0 +1,62 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Post, User, UserCounter
+
+
+# Счётчики постов, комментариев и подписок
+class CounterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='leo')
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.author = User.objects.create_user(username='leo1')
+        self.post = Post.objects.create(text='Текст', author=self.author)
+
+    def counter(self, user):
+        return UserCounter.objects.get(user=user)
+
+    def test_posts_count(self):
+        self.authorized_client.post(reverse('new_post'), {'text': 'Пост'})
+        self.assertEqual(self.counter(self.user).posts_count, 1)
+        post = Post.objects.get(author=self.user)
+        self.authorized_client.get(reverse('post_delete', kwargs={
+            'username': self.user.username, 'post_id': post.id}))
+        self.assertEqual(self.counter(self.user).posts_count, 0)
+
+    def test_comments_count(self):
+        url = reverse('add_comment', kwargs={
+            'username': self.author.username, 'post_id': self.post.id})
+        self.authorized_client.post(url, {'text': 'Комментарий'})
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+        comment = Comment.objects.get(post=self.post)
+        self.authorized_client.get(reverse('comment_delete', kwargs={
+            'username': self.author.username, 'post_id': self.post.id,
+            'comment_id': comment.id}))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+
+    def test_follow_counts(self):
+        url_kwargs = {'username': self.author.username}
+        self.authorized_client.get(reverse('profile_follow',
+                                           kwargs=url_kwargs))
+        self.assertEqual(self.counter(self.author).followers_count, 1)
+        self.assertEqual(self.counter(self.user).following_count, 1)
+        self.authorized_client.get(reverse('profile_unfollow',
+                                           kwargs=url_kwargs))
+        self.assertEqual(self.counter(self.author).followers_count, 0)
+        self.assertEqual(self.counter(self.user).following_count, 0)
+
+    def test_recount_repairs_drift(self):
+        UserCounter.objects.filter(user=self.author).update(posts_count=7)
+        UserCounter.objects.filter(user=self.user).delete()
+        Post.objects.filter(pk=self.post.pk).update(comments_count=3)
+        call_command('recount', stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+        self.assertEqual(self.counter(self.author).posts_count, 1)
+        self.assertEqual(self.counter(self.user).posts_count, 0)
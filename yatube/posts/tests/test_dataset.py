@@ -0,0 +1,43 @@
+from collections import Counter
+
+from django.db.models import F
+from django.test import TestCase
+
+from ..dataset import generate
+from ..management.commands.benchmark import percentile
+from ..models import Follow, Post, TimelineEntry, UserCounter
+from ..transfer import Importer
+
+PARAMS = {'users': 30, 'posts': 300, 'comments': 100, 'groups': 3,
+          'follows': 3, 'seed': 7}
+
+
+# Набор данных для manage.py benchmark
+class DatasetTests(TestCase):
+    def test_deterministic(self):
+        self.assertEqual(list(generate(**PARAMS)), list(generate(**PARAMS)))
+        self.assertNotEqual(list(generate(**PARAMS)),
+                            list(generate(**{**PARAMS, 'seed': 8})))
+
+    def test_power_law_authors(self):
+        authors = Counter(record['author'] for record in generate(**PARAMS)
+                          if record['type'] == 'post')
+        (top, top_posts), = authors.most_common(1)
+        self.assertEqual(top, 'user0')
+        self.assertGreater(top_posts, 300 / 30 * 3)
+
+    def test_loads_with_counters_and_timelines(self):
+        Importer().load(generate(**PARAMS))
+        self.assertEqual(Post.objects.count(), 300)
+        self.assertFalse(Follow.objects.filter(
+            user=F('author')).exists())
+        counter = UserCounter.objects.get(user__username='user0')
+        self.assertEqual(counter.posts_count,
+                         Post.objects.filter(author__username='user0').count())
+        self.assertTrue(TimelineEntry.objects.exists())
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual([percentile(values, percent)
+                          for percent in (50, 95, 99)], [50, 95, 99])
+        self.assertEqual(percentile([3], 99), 3)
@@ -1,10 +1,12 @@
+import io
 import shutil
 import tempfile
 
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
 from ..forms import PostForm
 from ..models import Group, Post, User
@@ -136,3 +138,51 @@ class PostFormImageTests(TestCase):
                                          content_type='text') and 1
             ).exists()
         )
+
+
+def jpeg_upload(size, orientation=None):
+    image = Image.new('RGB', size, (200, 30, 30))
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    output = io.BytesIO()
+    image.save(output, 'JPEG', exif=exif.tobytes())
+    return SimpleUploadedFile('photo.jpg', output.getvalue(), 'image/jpeg')
+
+
+# Картинка уменьшается и очищается от метаданных ещё в форме
+@override_settings(POST_IMAGE_MAX_SIZE=500)
+class PostFormIngestTests(TestCase):
+    def form(self, upload):
+        return PostForm(data={'text': 'Текст'}, files={'image': upload})
+
+    def test_downscale_rotate_and_strip(self):
+        form = self.form(jpeg_upload((4000, 3000), orientation=6))
+        self.assertTrue(form.is_valid(), form.errors)
+        image = Image.open(form.cleaned_data['image'])
+        # Поворот на 90° по EXIF: портретная картинка
+        self.assertEqual(image.size, (375, 500))
+        self.assertFalse(image.getexif())
+        post = form.instance
+        self.assertEqual((post.image_width, post.image_height), (375, 500))
+        color = bytes.fromhex(post.image_color[1:])
+        for channel, expected in zip(color, (200, 30, 30)):
+            self.assertAlmostEqual(channel, expected, delta=8)
+        self.assertTrue(post.image_placeholder.startswith(
+            'data:image/jpeg;base64,'))
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=1000 * 1000)
+    def test_jpeg_decoded_in_draft_mode(self):
+        # 12 Мп, но JPEG декодируется сразу уменьшенным в 8 раз
+        form = self.form(jpeg_upload((4000, 3000)))
+        self.assertTrue(form.is_valid(), form.errors)
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100 * 100)
+    def test_rejects_too_many_pixels(self):
+        output = io.BytesIO()
+        Image.new('RGB', (1000, 1000)).save(output, 'PNG')
+        upload = SimpleUploadedFile('bomb.png', output.getvalue(),
+                                    'image/png')
+        form = self.form(upload)
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
@@ -0,0 +1,31 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+
+from ..management.commands.checkplans import is_bad
+from ..models import Post
+
+
+class CheckPlansTests(TestCase):
+    def test_feed_queries_use_indexes(self):
+        out = StringIO()
+        call_command('checkplans', stdout=out)
+        self.assertIn('плохих планов нет', out.getvalue())
+        # Данные проверки откатываются
+        self.assertFalse(Post.objects.exists())
+
+
+class PlanRulesTests(SimpleTestCase):
+    def test_rules(self):
+        limited = 'SELECT ... LIMIT 11'
+        self.assertTrue(is_bad('SCAN posts_post', limited))
+        self.assertTrue(is_bad('SCAN TABLE posts_post', limited))
+        self.assertTrue(is_bad('USE TEMP B-TREE FOR ORDER BY', limited))
+        self.assertTrue(is_bad('SCAN posts_post USING INDEX post_date_idx',
+                               'SELECT ...'))
+        self.assertFalse(is_bad('SCAN posts_post USING INDEX post_date_idx',
+                                limited))
+        self.assertFalse(is_bad(
+            'SEARCH posts_post USING INDEX post_author_date_idx '
+            '(author_id=?)', limited))
@@ -0,0 +1,94 @@
+from django.contrib.admin.sites import site
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Comment, Post, User
+from ..search import fts_query
+
+
+# Полнотекстовый поиск по постам и комментариям
+class SearchTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.author = User.objects.create_user(username='leo')
+        self.post = Post.objects.create(text='Ловим окуня на блесну',
+                                        author=self.author)
+        self.other = Post.objects.create(text='Пишем про погоду',
+                                         author=self.author)
+        Comment.objects.create(post=self.other, author=self.author,
+                               text='А окунь клюёт в дождь?')
+
+    def search(self, query, **params):
+        response = self.client.get(reverse('search'), {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.context['page']
+
+    def test_finds_post_by_text_and_by_comment(self):
+        self.assertEqual(list(self.search('окуня')), [self.post])
+        self.assertEqual(list(self.search('окунь')), [self.other])
+        self.assertCountEqual(self.search('оку'), [self.post, self.other])
+
+    def test_edit_and_delete_update_index(self):
+        self.post.text = 'Ловим щуку'
+        self.post.save()
+        self.assertEqual(list(self.search('окуня')), [])
+        self.assertEqual(list(self.search('щуку')), [self.post])
+        self.other.comments.all().delete()
+        self.assertEqual(list(self.search('окунь')), [])
+
+    def test_operators_are_not_interpreted(self):
+        self.assertEqual(fts_query('NOT "x" OR y*'), '"NOT" "x" "OR" "y"*')
+        self.assertEqual(list(self.search('окуня OR (')), [])
+        self.assertEqual(list(self.search('!!!')), [])
+
+    @override_settings(PAGINATOR_NUMBER_OF_PAGES=2)
+    def test_pages(self):
+        for number in range(3):
+            Post.objects.create(text=f'окунь {number}', author=self.author)
+        first = self.search('окунь')
+        self.assertTrue(first.has_next())
+        second = self.search('окунь', after=first.paginator.next_cursor)
+        found = [*first, *second]
+        self.assertEqual(len(set(found)), 4)
+        self.assertFalse(second.has_next())
+
+    # широкий запрос ранжирует только новейшие совпадения: два поста
+    # и пост с комментарием, старый пост «окуня» не попадает
+    @override_settings(SEARCH_CANDIDATES=2)
+    def test_candidates_capped(self):
+        newer = [Post.objects.create(text=f'окунь {number}',
+                                     author=self.author)
+                 for number in range(2)]
+        page = self.search('окун')
+        self.assertCountEqual(page, [*newer, self.other])
+        self.assertEqual(page.paginator.count, 3)
+
+    # /search/ не должен совпасть с профилем: имя зарезервировано
+    def test_search_username_reserved(self):
+        response = self.client.post(reverse('signup'), {
+            'username': 'search', 'password1': 'Sup3r-secret',
+            'password2': 'Sup3r-secret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('username', response.context['form'].errors)
+        self.assertFalse(User.objects.filter(username='search').exists())
+
+    def test_admin_search(self):
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        request = RequestFactory().get('/', {'q': 'окуня'})
+        request.user = admin
+        model_admin = site._registry[Post]
+        queryset, _ = model_admin.get_search_results(
+            request, Post.objects.all(), 'окуня')
+        self.assertEqual(list(queryset), [self.post])
+
+    def test_admin_search_without_words(self):
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        client = Client()
+        client.force_login(admin)
+        for query in ('!!!', '"'):
+            for name in ('admin:posts_post_changelist',
+                         'admin:posts_comment_changelist'):
+                with self.subTest(query=query, name=name):
+                    response = client.get(reverse(name), {'q': query})
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(response.context['cl'].result_count, 0)
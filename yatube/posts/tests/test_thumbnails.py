@@ -0,0 +1,180 @@
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from core.jobs import run_pending
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import get_thumbnail
+
+from ..models import MediaFile, Post, User
+from ..thumbnails import ready_thumbnail
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+# Миниатюры строятся фоновой задачей, а не при рендере страницы
+class ThumbnailTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, True)
+        cache.clear()
+        self.user = User.objects.create_user(username='leo')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def upload(self, content=SMALL_GIF, build=True):
+        image = SimpleUploadedFile('small.gif', content, 'image/gif')
+        self.client.post(reverse('new_post'),
+                         {'text': 'С картинкой', 'image': image})
+        if build:
+            run_pending()
+        return Post.objects.filter(author=self.user).latest('pk')
+
+    def test_thumbnail_ready_after_save(self):
+        post = self.upload()
+        for geometry, options in settings.POST_THUMBNAILS.values():
+            self.assertIsNotNone(ready_thumbnail(post.image, geometry,
+                                                 **options))
+        thumbnail = ready_thumbnail(post.image, '960x339', crop='center',
+                                    upscale=True)
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, thumbnail.url)
+
+    def upload_without_thumbnails(self):
+        return self.upload(build=False)
+
+    def test_render_never_decodes_image(self):
+        post = self.upload_without_thumbnails()
+        self.assertIsNone(ready_thumbnail(post.image, '960x339',
+                                          crop='center', upscale=True))
+        with mock.patch('sorl.thumbnail.default.engine.get_image',
+                        side_effect=AssertionError('decode on render')):
+            response = self.client.get(reverse('index'))
+        self.assertContains(response, '<svg class="card-img"')
+
+    def test_rebuild_command_skips_ready_variants(self):
+        post = self.upload_without_thumbnails()
+        variants = len(settings.POST_THUMBNAILS)
+        out = StringIO()
+        call_command('rebuild_thumbnails', workers=0, stdout=out)
+        self.assertIn(f'построено вариантов: {variants}, пропущено: 0',
+                      out.getvalue())
+        for geometry, options in settings.POST_THUMBNAILS.values():
+            self.assertIsNotNone(ready_thumbnail(post.image, geometry,
+                                                 **options))
+        call_command('rebuild_thumbnails', workers=0, stdout=out)
+        self.assertIn(f'построено вариантов: 0, пропущено: {variants}',
+                      out.getvalue())
+        call_command('rebuild_thumbnails', workers=0, after=post.pk,
+                     stdout=out)
+        self.assertIn('Картинок: 0', out.getvalue())
+
+    def test_rebuild_command_progress(self):
+        first = self.upload_without_thumbnails()
+        # Другая картинка: одинаковые хранятся одним файлом
+        second = self.upload(SMALL_GIF.replace(b'\xFF\xFF\xFF', b'\0\0\0'),
+                             build=False)
+        command = 'posts.management.commands.rebuild_thumbnails'
+        out = StringIO()
+        with mock.patch(f'{command}.PROGRESS_EVERY', 1):
+            # Каждая картинка в своей пачке: проверяем переход между ними
+            with mock.patch(f'{command}.BATCH_SIZE', 1):
+                with mock.patch(f'{command}.touch_posts') as touch_posts:
+                    call_command('rebuild_thumbnails', workers=0,
+                                 stdout=out)
+        # Карточки обновляются по ходу, а не одним UPDATE в конце
+        self.assertEqual(touch_posts.call_args_list[:2],
+                         [mock.call([first.pk]), mock.call([second.pk])])
+        self.assertIn(f'последний id: {first.pk}', out.getvalue())
+        self.assertIn(f'последний id: {second.pk}', out.getvalue())
+
+    # упавший вариант не мешает остальным и попадает в лог
+    def test_variant_error_does_not_stop_others(self):
+        post = self.upload_without_thumbnails()
+
+        def no_webp(image, geometry, **options):
+            if options.get('format') == 'WEBP':
+                raise OSError('нет кодека WEBP')
+            return get_thumbnail(image, geometry, **options)
+
+        out, err = StringIO(), StringIO()
+        with mock.patch('posts.thumbnails.get_thumbnail', no_webp):
+            with self.assertLogs('posts.thumbnails', 'ERROR') as logs:
+                call_command('rebuild_thumbnails', workers=0, stdout=out,
+                             stderr=err)
+        self.assertEqual(len(logs.records), 2)
+        self.assertIn('ошибок: 1', out.getvalue())
+        self.assertIn('не построено вариантов: 2', err.getvalue())
+        for geometry, options in settings.POST_THUMBNAILS.values():
+            ready = ready_thumbnail(post.image, geometry, **options)
+            if options.get('format') == 'WEBP':
+                self.assertIsNone(ready)
+            else:
+                self.assertIsNotNone(ready)
+
+    def test_reposted_image_stored_once(self):
+        first = self.upload()
+        second = self.upload()
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(
+            MediaFile.objects.get(name=first.image.name).references, 2)
+        thumbnail = ready_thumbnail(first.image, '960x339', crop='center',
+                                    upscale=True)
+        storage = first.image.storage
+        first.delete()
+        self.assertTrue(storage.exists(second.image.name))
+        second.delete()
+        run_pending()
+        self.assertFalse(storage.exists(second.image.name))
+        self.assertFalse(storage.exists(thumbnail.name))
+        self.assertFalse(MediaFile.objects.exists())
+
+    def test_feed_resolves_thumbnails_in_one_query(self):
+        posts = []
+        for shade in range(3):
+            output = BytesIO()
+            Image.new('RGB', (4, 2), (shade, 0, 0)).save(output, 'GIF')
+            posts.append(self.upload(output.getvalue()))
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('index'))
+        kvstore_queries = [query for query in queries.captured_queries
+                           if 'thumbnail_kvstore' in query['sql']]
+        self.assertEqual(len(kvstore_queries), 1)
+        for post in response.context['page']:
+            self.assertIn(post.thumbnails['card'].url,
+                          response.content.decode())
+
+    def test_card_has_lazy_image_with_placeholder(self):
+        post = self.upload()
+        Post.objects.filter(pk=post.pk).update(image_width=None,
+                                               image_color='')
+        out = StringIO()
+        call_command('describe_images', stdout=out)
+        self.assertIn('Описано картинок: 1', out.getvalue())
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertTrue(post.image_color.startswith('#'))
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, 'loading="lazy"')
+        self.assertContains(response, 'srcset=')
+        self.assertContains(response, post.image_placeholder)
@@ -0,0 +1,94 @@
+import datetime as dt
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from ..models import (Comment, Follow, Group, MediaFile, Post, TimelineEntry,
+                      User, UserCounter)
+
+
+# Выгрузка export_yatube и загрузка import_yatube
+class TransferTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'dump.jsonl.gz')
+        author = User.objects.create_user(username='leo', password='secret')
+        reader = User.objects.create_user(username='leo1')
+        group = Group.objects.create(title='Группа', slug='group')
+        self.pub_date = timezone.now() - dt.timedelta(days=30, microseconds=7)
+        post = Post.objects.create(text='Пост', author=author, group=group,
+                                   image='posts/picture.png')
+        Post.objects.filter(pk=post.pk).update(pub_date=self.pub_date)
+        Comment.objects.create(post=post, author=reader, text='Комментарий')
+        Follow.objects.create(user=reader, author=author)
+        self.post_id = post.pk
+        self.password = author.password
+
+    def export(self):
+        call_command('export_yatube', self.path, stdout=StringIO())
+
+    def load(self, *args, **options):
+        call_command('import_yatube', *args, stdout=StringIO(), **options)
+
+    def test_round_trip(self):
+        self.export()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        MediaFile.objects.all().delete()
+        self.load(self.path, batch_size=1)
+        post = Post.objects.get()
+        self.assertEqual(post.pk, self.post_id)
+        self.assertEqual(post.pub_date, self.pub_date)
+        self.assertEqual(post.author.username, 'leo')
+        self.assertEqual(post.author.password, self.password)
+        self.assertEqual(post.group.slug, 'group')
+        self.assertEqual(post.comments_count, 1)
+        # Сигналы пропущены, их работу сделал пересчёт
+        counter = UserCounter.objects.get(user=post.author)
+        self.assertEqual((counter.posts_count, counter.followers_count),
+                         (1, 1))
+        self.assertEqual(MediaFile.objects.get().references, 1)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user__username='leo1', post=post).exists())
+
+    def test_repeated_import_skips_existing(self):
+        self.export()
+        output = StringIO()
+        call_command('import_yatube', self.path, stdout=output)
+        self.assertIn('post: 0, comment: 0, follow: 0', output.getvalue())
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertEqual(Follow.objects.count(), 1)
+
+    def test_conflicting_ids_in_target(self):
+        self.export()
+        # В целевой БД под тем же id другой пост другого автора
+        Post.objects.all().delete()
+        other = User.objects.create_user(username='local')
+        Post.objects.create(id=self.post_id, text='Местный', author=other)
+        with self.assertRaisesMessage(CommandError,
+                                      f'Post id={self.post_id}'):
+            self.load(self.path)
+        self.assertEqual(Post.objects.get().text, 'Местный')
+        self.assertFalse(Comment.objects.exists())
+
+    def test_export_to_stdout(self):
+        output = StringIO()
+        call_command('export_yatube', stdout=output, stderr=StringIO())
+        types = [json.loads(line)['type']
+                 for line in output.getvalue().splitlines()]
+        self.assertEqual(types, ['user', 'user', 'group', 'post', 'comment',
+                                 'follow'])
+
+    def test_unknown_author(self):
+        with open(self.path[:-3], 'w', encoding='utf-8') as file:
+            file.write(json.dumps({'type': 'post', 'id': 100, 'text': 'Пост',
+                                   'author': 'nobody'}))
+        with self.assertRaisesMessage(CommandError, 'nobody'):
+            self.load(self.path[:-3])
@@ -1,11 +1,23 @@
+import threading
+import time
+from unittest import mock
+
+from core import metrics
+from core.cache import Fragment
 from django import forms
 from django.conf import settings as st
 from django.core.cache import cache
 from django.core.cache.utils import make_template_fragment_key
-from django.test import Client, TestCase
+from django.db import connection
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from ..models import Comment, Follow, Group, Post, User
+from ..cache import INDEX, feed_version
+from ..models import (Comment, Follow, Group, Post, TimelineEntry, User,
+                      UserCounter)
+from ..paginator import encode_cursor, get_page
 
 
 class PostPagesTests(TestCase):
@@ -173,6 +185,56 @@ class PaginatorViewsTest(TestCase):
                 self.assertEqual(len(response.context.get('page').object_list),
                                  st.PAGINATOR_NUMBER_OF_PAGES)
 
+    # курсорная навигация: «старше» ведёт на остаток, «новее» — обратно
+    def test_paginator_cursor_pages(self):
+        response = self.authorized_client.get(reverse('index'))
+        first_page = response.context['page']
+        self.assertFalse(first_page.has_previous())
+        self.assertTrue(first_page.has_next())
+
+        response = self.authorized_client.get(
+            reverse('index'),
+            {'after': first_page.paginator.next_cursor})
+        second_page = response.context['page']
+        self.assertEqual(len(second_page.object_list), 3)
+        self.assertFalse(second_page.has_next())
+        self.assertTrue(second_page.has_previous())
+        self.assertFalse(set(first_page) & set(second_page))
+
+        response = self.authorized_client.get(
+            reverse('index'),
+            {'before': second_page.paginator.previous_cursor})
+        self.assertEqual(list(response.context['page']), list(first_page))
+        self.assertFalse(response.context['page'].has_previous())
+
+    # испорченный курсор отдаёт первую страницу
+    def test_paginator_broken_cursor(self):
+        response = self.authorized_client.get(reverse('index'),
+                                              {'after': 'мусор'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['page'].object_list),
+                         st.PAGINATOR_NUMBER_OF_PAGES)
+
+    # курсор читается, но значения не того типа
+    def test_paginator_mistyped_cursor(self):
+        urls = [
+            reverse('index'),
+            reverse('group_posts', kwargs={'slug': self.group.slug}),
+            reverse('profile', kwargs={'username': self.user}),
+            reverse('follow_index'),
+        ]
+        cursors = [['x', 1], [1.5, 1], ['2020-01-01T00:00:00', 'abc'],
+                   ['2020-01-01T00:00:00+00:00']]
+        for url in urls:
+            for values in cursors:
+                for name in ('after', 'before'):
+                    with self.subTest(url=url, values=values, name=name):
+                        response = self.authorized_client.get(
+                            url, {name: encode_cursor(values)})
+                        self.assertEqual(response.status_code, 200)
+                        self.assertFalse(
+                            response.context['page'].has_previous())
+
 
 # (Спринт 6) Тест image
 class PostCreateFormTests(TestCase):
@@ -223,12 +285,101 @@ class CacheTests(TestCase):
     def setUp(self):
         self.guest_client = Client()
 
-    # проверка кэша по ключу
+    # проверка кэша по ключу: версия ленты, курсор и пользователь
     def test_cash_index(self):
         self.guest_client.get(reverse('index'))
-        key = make_template_fragment_key('index_page')
+        key = make_template_fragment_key(
+            'index_page', [feed_version(INDEX), '', '', None])
         self.assertTrue(cache.get(key))
 
+    # новый пост виден сразу, несмотря на кэш
+    def test_cache_invalidated_by_new_post(self):
+        user = User.objects.create_user(username='leo')
+        Post.objects.create(text='Первый пост', author=user)
+        self.guest_client.get(reverse('index'))
+        Post.objects.create(text='Второй пост', author=user)
+        response = self.guest_client.get(reverse('index'))
+        self.assertContains(response, 'Второй пост')
+
+    # карточка поста кэшируется по id, времени изменения, автору и группе
+    def test_post_card_cache(self):
+        user = User.objects.create_user(username='leo')
+        post = Post.objects.create(text='Старый текст', author=user)
+        self.guest_client.get(reverse('index'))
+        key = make_template_fragment_key(
+            'post_card', [post.pk, post.updated.isoformat(), 'leo', '', ''])
+        self.assertIn('Старый текст', cache.get(key).value)
+
+        post.text = 'Новый текст'
+        post.save()
+        response = self.guest_client.get(reverse('post', kwargs={
+            'username': user.username, 'post_id': post.id}))
+        self.assertContains(response, 'Новый текст')
+
+    # новые имя автора и название группы видны в закэшированных лентах
+    def test_card_follows_author_and_group_renames(self):
+        user = User.objects.create_user(username='leo')
+        group = Group.objects.create(title='Группа', slug='slug')
+        Post.objects.create(text='Пост', author=user, group=group)
+        urls = [
+            reverse('index'),
+            reverse('group_posts', kwargs={'slug': 'slug'}),
+            reverse('profile', kwargs={'username': 'leo'}),
+        ]
+        for url in urls:
+            self.guest_client.get(url)
+        user.username = 'tolstoy'
+        user.save()
+        group.title = 'Клуб'
+        group.save()
+        urls[2] = reverse('profile', kwargs={'username': 'tolstoy'})
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertContains(response, '@tolstoy')
+                self.assertContains(response, '#Клуб')
+
+    # тёплая главная не обращается к БД: страница читается только
+    # внутри кэшируемого фрагмента
+    def test_warm_index_skips_queries(self):
+        user = User.objects.create_user(username='leo')
+        Post.objects.create(text='Пост', author=user)
+        self.guest_client.get(reverse('index'))
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(reverse('index'))
+        self.assertContains(response, 'Пост')
+
+    # на тёплых страницах группы и профиля остаются только запросы
+    # группы и автора, постов среди них нет
+    def test_warm_feed_pages_skip_post_queries(self):
+        user = User.objects.create_user(username='leo')
+        group = Group.objects.create(title='Группа', slug='slug')
+        Post.objects.create(text='Пост', author=user, group=group)
+        urls = [
+            reverse('group_posts', kwargs={'slug': group.slug}),
+            reverse('profile', kwargs={'username': user.username}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.guest_client.get(url)
+                with CaptureQueriesContext(connection) as context:
+                    response = self.guest_client.get(url)
+                self.assertContains(response, 'Пост')
+                self.assertTrue(context.captured_queries)
+                for query in context.captured_queries:
+                    self.assertNotIn('"posts_post"', query['sql'])
+
+    # разные страницы ленты кэшируются раздельно
+    def test_cache_per_page(self):
+        user = User.objects.create_user(username='leo')
+        for i in range(st.PAGINATOR_NUMBER_OF_PAGES + 1):
+            Post.objects.create(text=f'Пост номер {i}', author=user)
+        response = self.guest_client.get(reverse('index'))
+        self.assertNotContains(response, 'Пост номер 0')
+        cursor = response.context['page'].paginator.next_cursor
+        response = self.guest_client.get(reverse('index'), {'after': cursor})
+        self.assertContains(response, 'Пост номер 0')
+
 
 # (Спринт 6) Тестирование подписок
 class TestFollowComment(TestCase):
@@ -304,3 +455,224 @@ class TestFollowComment(TestCase):
             data={'text': 'Текст2'}, follow=True, )
         count_new_comment = Comment.objects.filter(text='Текст2').count()
         self.assertEqual(count_new_comment, 0)
+
+    # Пост раскладывается в ленту подписчика и убирается при отписке
+    def test_timeline_fan_out(self):
+        self.authorized_client.get(reverse('profile_follow', kwargs={
+            'username': self.author_user.username}))
+        new_post = Post.objects.create(text='Новый пост',
+                                       author=self.author_user)
+        entries = TimelineEntry.objects.filter(user=self.user)
+        self.assertEqual(set(entries.values_list('post', flat=True)),
+                         {self.post.id, new_post.id})
+        response = self.authorized_client.get(reverse('follow_index'))
+        self.assertEqual(list(response.context['page']),
+                         [new_post, self.post])
+
+        self.authorized_client.get(reverse('profile_unfollow', kwargs={
+            'username': self.author_user.username}))
+        self.assertFalse(entries.exists())
+
+    # Посты популярных авторов не раскладываются, а читаются напрямую
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_timeline_pull_author(self):
+        self.authorized_client.get(reverse('profile_follow', kwargs={
+            'username': self.author_user.username}))
+        new_post = Post.objects.create(text='Новый пост',
+                                       author=self.author_user)
+        self.assertFalse(TimelineEntry.objects.exists())
+        response = self.authorized_client.get(reverse('follow_index'))
+        self.assertEqual(list(response.context['page']),
+                         [new_post, self.post])
+
+    # Автор опустился до порога: посты, не разложенные выше него,
+    # остаются в ленте
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_timeline_author_back_under_limit(self):
+        other = User.objects.create_user(username='other')
+        Follow.objects.create(user=self.user, author=self.author_user)
+        Follow.objects.create(user=other, author=self.author_user)
+        new_post = Post.objects.create(text='Новый пост',
+                                       author=self.author_user)
+        Follow.objects.get(user=other).delete()
+        response = self.authorized_client.get(reverse('follow_index'))
+        self.assertEqual(list(response.context['page']),
+                         [new_post, self.post])
+
+    # Подписка ушла каскадом вместе с подписчиком
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_timeline_author_under_limit_by_cascade(self):
+        other = User.objects.create_user(username='other')
+        Follow.objects.create(user=self.user, author=self.author_user)
+        Follow.objects.create(user=other, author=self.author_user)
+        new_post = Post.objects.create(text='Новый пост',
+                                       author=self.author_user)
+        other.delete()
+        response = self.authorized_client.get(reverse('follow_index'))
+        self.assertEqual(list(response.context['page']),
+                         [new_post, self.post])
+
+    # Счётчик миновал порог, не совпав с ним: так бывает при
+    # одновременных отписках и после recount
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_timeline_author_skips_limit_value(self):
+        others = [User.objects.create_user(username=f'other{i}')
+                  for i in range(2)]
+        Follow.objects.create(user=self.user, author=self.author_user)
+        for other in others:
+            Follow.objects.create(user=other, author=self.author_user)
+        new_post = Post.objects.create(text='Новый пост',
+                                       author=self.author_user)
+        UserCounter.objects.filter(user=self.author_user).update(
+            followers_count=0)
+        Follow.objects.filter(user__in=others).delete()
+        response = self.authorized_client.get(reverse('follow_index'))
+        self.assertEqual(list(response.context['page']),
+                         [new_post, self.post])
+        self.assertFalse(UserCounter.objects.get(
+            user=self.author_user).timeline_pending)
+
+
+# Число запросов к БД не зависит от числа постов на странице
+class FeedQueriesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='leo')
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.group = Group.objects.create(title='Группа', slug='slug')
+        Follow.objects.create(user=self.user, author=self.user)
+
+    def add_posts(self, count):
+        for i in range(count):
+            post = Post.objects.create(text=f'Пост {i}', author=self.user,
+                                       group=self.group)
+            Comment.objects.create(post=post, author=self.user, text='К')
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            self.authorized_client.get(url)
+        return len(context)
+
+    def test_constant_queries_per_page(self):
+        urls = [
+            reverse('index'),
+            reverse('group_posts', kwargs={'slug': self.group.slug}),
+            reverse('profile', kwargs={'username': self.user.username}),
+            reverse('follow_index'),
+        ]
+        self.add_posts(1)
+        few = [self.count_queries(url) for url in urls]
+        self.add_posts(st.PAGINATOR_NUMBER_OF_PAGES)
+        many = [self.count_queries(url) for url in urls]
+        self.assertEqual(few, many)
+
+    def test_post_view_queries(self):
+        self.add_posts(1)
+        post = Post.objects.get()
+        for i in range(5):
+            Comment.objects.create(post=post, author=self.user, text='К')
+        url = reverse('post', kwargs={'username': self.user.username,
+                                      'post_id': post.id})
+        few = self.count_queries(url)
+        Comment.objects.create(post=post, author=self.user, text='К')
+        self.assertEqual(self.count_queries(url), few)
+
+
+# Условные GET-запросы: 304 без запросов к БД, пока данные не менялись
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.user = User.objects.create_user(username='leo')
+        self.group = Group.objects.create(title='Группа', slug='slug')
+        self.post = Post.objects.create(text='Текст', author=self.user,
+                                        group=self.group)
+
+    def test_not_modified(self):
+        urls = [
+            reverse('index'),
+            reverse('group_posts', kwargs={'slug': self.group.slug}),
+            reverse('profile', kwargs={'username': self.user.username}),
+            reverse('post', kwargs={'username': self.user.username,
+                                    'post_id': self.post.id}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('must-revalidate', response['Cache-Control'])
+                self.assertIn('Cookie', response['Vary'])
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(response.status_code, 304)
+
+    def test_not_modified_skips_queries(self):
+        response = self.guest_client.get(reverse('index'))
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(
+                reverse('index'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_modified_after_changes(self):
+        post_url = reverse('post', kwargs={'username': self.user.username,
+                                           'post_id': self.post.id})
+        index_etag = self.guest_client.get(reverse('index'))['ETag']
+        post_etag = self.guest_client.get(post_url)['ETag']
+        Comment.objects.create(post=self.post, author=self.user, text='К')
+        response = self.guest_client.get(reverse('index'),
+                                         HTTP_IF_NONE_MATCH=index_etag)
+        self.assertEqual(response.status_code, 200)
+        response = self.guest_client.get(post_url,
+                                         HTTP_IF_NONE_MATCH=post_etag)
+        self.assertEqual(response.status_code, 200)
+
+
+def slow_get_page(request, object_list):
+    time.sleep(0.2)
+    return get_page(request, object_list)
+
+
+# Одновременные запросы главной около истечения фрагмента: посты из БД
+# читает один запрос. Запросы считает core.metrics во всех потоках.
+class FeedExpiryQueriesTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.registry.clear()
+        user = User.objects.create_user(username='leo')
+        Post.objects.create(text='Пост', author=user)
+
+    def index_queries(self, count=1):
+        """Число запросов к БД за count одновременных загрузок главной."""
+        metrics.registry.clear()
+        barrier = threading.Barrier(count)
+
+        def worker():
+            barrier.wait()
+            Client().get(reverse('index'))
+
+        threads = [threading.Thread(target=worker) for _ in range(count)]
+        with mock.patch('posts.views.get_page', slow_get_page):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        stats = metrics.registry.views['index']
+        self.assertEqual(sum(stats.responses.values()), count)
+        return stats.queries.sum
+
+    def test_expired_fragment_queried_once(self):
+        cold = self.index_queries()
+        self.assertGreater(cold, 0)
+        key = make_template_fragment_key(
+            'index_page', [feed_version(INDEX), '', '', None])
+        cache.set(key, Fragment(cache.get(key).value, time.time() - 1, 0.2),
+                  60)
+        self.assertEqual(self.index_queries(10), cold)
+        self.assertEqual(self.index_queries(10), 0)
+
+    def test_missing_fragment_queried_once(self):
+        cold = self.index_queries()
+        cache.clear()
+        self.assertEqual(self.index_queries(10), cold)
@@ -0,0 +1,179 @@
+"""Миниатюры картинок постов.
+
+Миниатюры всех размеров из settings.POST_THUMBNAILS строятся заранее
+фоновой задачей (core.jobs) после сохранения поста. View достают готовые
+миниатюры всех постов страницы из kvstore sorl одним запросом
+(prefetch), шаблон берёт их из post.thumbnails и, пока миниатюры нет,
+выводит заглушку — при рендере страницы картинка не декодируется.
+"""
+import logging
+
+from core.jobs import task
+from django.conf import settings
+from django.db.models.functions import Now
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from .cache import bump_feeds, post_scopes
+from .images import describe_file
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+
+class ReadyThumbnailBackend(ThumbnailBackend):
+
+    def get_thumbnail_file(self, file_, geometry_string, **options):
+        """Файл миниатюры с тем же именем, что даст get_thumbnail(), но без
+        открытия картинки."""
+        source = ImageFile(file_)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def get_ready_thumbnail(self, file_, geometry_string, **options):
+        """Миниатюра из kvstore или None, если её ещё не построили."""
+        return default.kvstore.get(
+            self.get_thumbnail_file(file_, geometry_string, **options))
+
+
+backend = ReadyThumbnailBackend()
+
+
+def image_file(name):
+    """Исходник по имени: миниатюры sorl привязаны к имени и хранилищу."""
+    return ImageFile(name, Post._meta.get_field('image').storage)
+
+
+def ready_thumbnail(image, geometry, **options):
+    if not image:
+        return None
+    return backend.get_ready_thumbnail(image, geometry, **options)
+
+
+def _lookup(keys):
+    """Записи kvstore по ключам: один get_many к кэшу и один запрос к БД
+    за промахами. Отсутствие записи кэшируется, как это делает sorl."""
+    kvstore = default.kvstore
+    if not isinstance(kvstore, cached_db_kvstore.KVStore):
+        return {key: kvstore._get(key) for key in keys}
+    empty = cached_db_kvstore.EMPTY_VALUE
+    raw_keys = {add_prefix(key): key for key in keys}
+    values = kvstore.cache.get_many(list(raw_keys))
+    missing = [raw for raw in raw_keys if raw not in values]
+    if missing:
+        rows = dict(KVStoreModel.objects.filter(key__in=missing)
+                    .values_list('key', 'value'))
+        fetched = {raw: rows.get(raw, empty) for raw in missing}
+        kvstore.cache.set_many(fetched, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(fetched)
+    return {key: deserialize_image_file(values[raw])
+            for raw, key in raw_keys.items() if values[raw] != empty}
+
+
+class PageThumbnails:
+    """Готовые миниатюры постов страницы.
+
+    Разрешаются при первом обращении: если карточки и лента взяты из
+    кэша фрагментов, kvstore не трогается вовсе.
+    """
+
+    def __init__(self, posts):
+        self._files = {}
+        for post in posts:
+            if not post.image:
+                continue
+            for variant, (geometry, options) in (
+                    settings.POST_THUMBNAILS.items()):
+                self._files[post.pk, variant] = backend.get_thumbnail_file(
+                    post.image, geometry, **options)
+        self._ready = None
+
+    def get(self, post_id, variant):
+        if self._ready is None:
+            self._ready = _lookup({thumbnail.key
+                                   for thumbnail in self._files.values()})
+        thumbnail = self._files.get((post_id, variant))
+        return thumbnail and self._ready.get(thumbnail.key)
+
+
+class PostThumbnails:
+    """post.thumbnails: в шаблоне {{ post.thumbnails.card.url }}."""
+
+    def __init__(self, page_thumbnails, post_id):
+        self._page_thumbnails = page_thumbnails
+        self._post_id = post_id
+
+    def __getitem__(self, variant):
+        return self._page_thumbnails.get(self._post_id, variant)
+
+
+def prefetch(posts):
+    """Раздаём постам страницы общий PageThumbnails."""
+    posts = list(posts)
+    page_thumbnails = PageThumbnails(posts)
+    for post in posts:
+        post.thumbnails = PostThumbnails(page_thumbnails, post.pk)
+    return posts
+
+
+def build(image):
+    """Строим недостающие варианты картинки: (построено, пропущено,
+    с ошибкой). Ошибка одного варианта (например, нет кодека WEBP)
+    не мешает построить остальные."""
+    built = skipped = failed = 0
+    for name, (geometry, options) in settings.POST_THUMBNAILS.items():
+        if ready_thumbnail(image, geometry, **options) is not None:
+            skipped += 1
+            continue
+        try:
+            get_thumbnail(image, geometry, **options)
+        except Exception:
+            logger.exception('Миниатюра %s для %s не построена', name, image)
+            failed += 1
+            continue
+        built += 1
+    return built, skipped, failed
+
+
+def touch_posts(post_ids):
+    """Карточки постов и ленты с ними перерисуются с новыми миниатюрами."""
+    posts = Post.objects.filter(pk__in=post_ids)
+    scopes = set()
+    for author_id, group_id in posts.values_list('author', 'group'):
+        scopes.update(post_scopes(author_id, group_id))
+    posts.update(updated=Now())
+    bump_feeds(scopes)
+
+
+@task(timeout=600)
+def generate(post_id):
+    """Строим миниатюры поста и сбрасываем кэш его карточки и лент.
+
+    Ставится в очередь сигналом при сохранении новой картинки.
+    """
+    post = (Post.objects.filter(pk=post_id)
+            .only('image', 'image_width').first())
+    if post is None or not post.image:
+        return
+    failed = build(post.image)[2]
+    if post.image_width is None:
+        # Картинка сохранена в обход PostForm (админка, shell)
+        Post.objects.filter(pk=post_id).update(**describe_file(post.image))
+    touch_posts([post_id])
+    if failed:
+        # Повтор задачи построит только упавшие варианты
+        raise RuntimeError(f'Не построено миниатюр: {failed}')
@@ -0,0 +1,177 @@
+"""Материализованная домашняя лента (fan-out on write).
+
+При публикации пост раскладывается в ленты подписчиков автора, и страница
+подписок читается одним диапазоном по индексу (user, pub_date). Авторов с
+огромным числом подписчиков не раскладываем: их посты подмешиваются при
+чтении (pull), иначе одна публикация превращалась бы в миллион вставок.
+"""
+from core.jobs import task
+from django.conf import settings
+
+from .models import Follow, Post, TimelineEntry, UserCounter
+from .paginator import CursorPaginator
+
+
+def pull_authors(user):
+    """Авторы из подписок пользователя, чьи посты читаются напрямую."""
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    return list(Follow.objects.filter(
+        user=user, author__counter__followers_count__gt=limit,
+    ).values_list('author', flat=True))
+
+
+def followers_count(author):
+    return (UserCounter.objects.filter(user=author)
+            .values_list('followers_count', flat=True).first()) or 0
+
+
+def is_pull_author(author):
+    """Автор со слишком большим числом подписчиков для раскладки."""
+    return followers_count(author) > settings.TIMELINE_FANOUT_LIMIT
+
+
+def _mark_pending(author):
+    """Раскладку автора пропустили: разложим, когда он опустится до
+    порога."""
+    UserCounter.objects.filter(user=author, timeline_pending=False).update(
+        timeline_pending=True)
+
+
+def fan_out(post):
+    """Раскладываем новый пост в ленты подписчиков автора.
+
+    Немногих подписчиков обходим сразу, иначе раскладку делает фоновая
+    задача, чтобы не задерживать ответ автору.
+    """
+    followers = followers_count(post.author_id)
+    if followers > settings.TIMELINE_FANOUT_LIMIT:
+        _mark_pending(post.author_id)
+        return
+    if followers > settings.TIMELINE_INLINE_FANOUT:
+        fan_out_post.delay(post.pk)
+    else:
+        fan_out_post(post.pk)
+
+
+@task(timeout=3600)
+def fan_out_post(post_id):
+    post = Post.objects.filter(pk=post_id).only('author', 'pub_date').first()
+    if post is None:
+        return
+    followers = Follow.objects.filter(
+        author=post.author_id).values_list('user', flat=True)
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post_id=post_id,
+                       pub_date=post.pub_date)
+         for user_id in followers.iterator()),
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        # Задачу могли повторить после частичной раскладки
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user, author):
+    """Новая подписка: добавляем в ленту последние посты автора."""
+    if is_pull_author(author):
+        _mark_pending(author.pk)
+        return
+    posts = (author.posts.order_by('-pub_date')
+             .values_list('id', 'pub_date')
+             [:settings.TIMELINE_BACKFILL])
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user=user, post_id=post_id, pub_date=pub_date)
+         for post_id, pub_date in posts],
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def author_unfollowed(author_id):
+    """Отписка: если автор опустился до порога раскладки, его посты,
+    опубликованные выше порога, надо разложить — pull для него больше
+    не работает. Раскладка как у fan_out: сразу или фоновой задачей.
+
+    Переход через порог узнаём по флагу timeline_pending, а не по
+    равенству счётчика порогу: при одновременных отписках и после
+    recount счётчик может миновать это значение. Флаг снимается одним
+    UPDATE, поэтому раскладку запускает ровно одна отписка.
+    """
+    cleared = UserCounter.objects.filter(
+        user=author_id, timeline_pending=True,
+        followers_count__lte=settings.TIMELINE_FANOUT_LIMIT,
+    ).update(timeline_pending=False)
+    if not cleared:
+        return
+    if followers_count(author_id) > settings.TIMELINE_INLINE_FANOUT:
+        refill_followers.delay(author_id)
+    else:
+        refill_followers(author_id)
+
+
+@task(timeout=3600)
+def refill_followers(author_id):
+    """Последние TIMELINE_BACKFILL постов автора в ленты всех подписчиков."""
+    if is_pull_author(author_id):
+        # Пока задача ждала, автор снова набрал подписчиков
+        _mark_pending(author_id)
+        return
+    posts = list(Post.objects.filter(author=author_id)
+                 .order_by('-pub_date').values_list('id', 'pub_date')
+                 [:settings.TIMELINE_BACKFILL])
+    followers = Follow.objects.filter(
+        author=author_id).values_list('user', flat=True)
+    for user_id in followers.iterator():
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(user_id=user_id, post_id=post_id,
+                           pub_date=pub_date)
+             for post_id, pub_date in posts],
+            batch_size=settings.TIMELINE_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+
+
+def drop(user, author):
+    """Отписка: убираем посты автора из ленты пользователя."""
+    TimelineEntry.objects.filter(user=user, post__author=author).delete()
+
+
+class TimelinePaginator(CursorPaginator):
+    """Курсорный пагинатор ленты подписок.
+
+    Разложенные записи и посты pull-авторов читаются отдельными
+    диапазонами по одному курсору (pub_date, id) и сливаются.
+    """
+
+    def __init__(self, user, per_page):
+        entries = (TimelineEntry.objects.filter(user=user)
+                   .select_related('post__author', 'post__group')
+                   .defer('post__author__password',
+                          'post__group__description')
+                   .order_by('-pub_date', '-post'))
+        super().__init__(entries, per_page)
+        self.pull_authors = pull_authors(user)
+
+    def get_rows(self, after, before):
+        entries = self._fetch(self.object_list, ('pub_date', 'post_id'),
+                              after, before)
+        posts = {entry.post_id: entry.post for entry in entries}
+        # По запросу на автора: каждый читает не больше страницы по
+        # индексу (author, -pub_date, -id), а с author__in SQLite
+        # отсортировал бы все посты этих авторов
+        for author_id in self.pull_authors:
+            pulled = Post.objects.for_feed().filter(author=author_id)
+            for post in self._fetch(pulled, ('pub_date', 'id'),
+                                    after, before):
+                posts.setdefault(post.id, post)
+        rows = sorted(posts.values(),
+                      key=lambda post: (post.pub_date, post.id),
+                      reverse=not before)
+        return rows[:self.per_page + 1]
+
+
+def get_timeline_page(request):
+    """Страница ленты подписок текущего пользователя."""
+    paginator = TimelinePaginator(request.user,
+                                  settings.PAGINATOR_NUMBER_OF_PAGES)
+    return paginator.get_page(request.GET.get('after'),
+                              request.GET.get('before'))
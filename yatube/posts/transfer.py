@@ -0,0 +1,335 @@
+"""Перенос данных в JSONL и обратно (export_yatube и import_yatube).
+
+Одна строка файла — одна запись {"type": "post", ...}. Типы идут в
+порядке TYPES, поэтому запись ссылается только на уже прочитанные.
+Пользователи и группы ссылаются по username и slug: импорт держит их
+id в словарях. Посты и комментарии сохраняют свои id, и таблица
+соответствия на каждый пост не нужна.
+
+Импорт пишет пачками bulk_create, мимо сигналов, а в конце делает то же,
+что они: пересчитывает счётчики и ссылки на картинки, заполняет ленты
+новых подписок и сбрасывает кэш лент. Уже существующие записи
+пропускаются, поэтому прерванный импорт можно запустить заново. Пост или
+комментарий с тем же id, но другим автором или датой — это другая
+запись, а не повтор: импорт останавливается с ошибкой, иначе
+комментарии из файла попали бы к чужим постам.
+"""
+import gzip
+import json
+from collections import Counter
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import media, timeline
+from .cache import INDEX, bump_feeds, post_scopes, profile_scope
+from .counters import recount_posts, recount_users
+from .models import Comment, Follow, Group, Post, User
+
+TYPES = ('user', 'group', 'post', 'comment', 'follow')
+
+# Тип: (модель, поля, ссылки {ключ записи: поле для values()})
+LAYOUT = {
+    'user': (User, ('username', 'first_name', 'last_name', 'email',
+                    'password', 'is_active', 'date_joined'), {}),
+    'group': (Group, ('slug', 'title', 'description'), {}),
+    'post': (Post, ('id', 'text', 'pub_date', 'updated', 'image',
+                    'image_width', 'image_height', 'image_color',
+                    'image_placeholder'),
+             {'author': 'author__username', 'group': 'group__slug'}),
+    'comment': (Comment, ('id', 'text', 'created'),
+                {'post': 'post', 'author': 'author__username'}),
+    'follow': (Follow, (), {'user': 'user__username',
+                            'author': 'author__username'}),
+}
+
+
+def _default(value):
+    # DjangoJSONEncoder обрезает время до миллисекунд
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} не сериализуется в JSON')
+
+
+def dumps(record):
+    return json.dumps(record, ensure_ascii=False, default=_default)
+
+
+def open_jsonl(path, mode):
+    """Файл JSONL в UTF-8, с расширением .gz — сжатый."""
+    if path.endswith('.gz'):
+        return gzip.open(path, f'{mode}t', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def export_records(chunk_size=2000):
+    """Все записи в порядке TYPES, по chunk_size строк из курсора."""
+    for kind in TYPES:
+        model, fields, references = LAYOUT[kind]
+        rows = (model.objects.order_by('pk')
+                .values(*fields, *references.values()))
+        for row in rows.iterator(chunk_size=chunk_size):
+            record = {'type': kind}
+            record.update((field, row[field]) for field in fields)
+            record.update((key, row[lookup])
+                          for key, lookup in references.items())
+            yield record
+
+
+# Поля auto_now и auto_now_add со значениями флагов: на время импорта
+# флаги снимаются
+AUTO_DATES = {field: (field.auto_now, field.auto_now_add)
+              for model in (Post, Comment)
+              for field in model._meta.concrete_fields
+              if getattr(field, 'auto_now', False)
+              or getattr(field, 'auto_now_add', False)}
+
+
+def parse(lines):
+    """Записи из строк JSONL."""
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as error:
+            raise ValueError(f'Строка {number}: {error}')
+        if record.get('type') not in LAYOUT:
+            raise ValueError(
+                f'Строка {number}: неизвестный тип {record.get("type")}')
+        yield record
+
+
+def _values(model, record, fields):
+    """Поля модели из записи; дату из AUTO_DATES, которой нет в записи,
+    ставим сами."""
+    values = {}
+    for name in fields:
+        field = model._meta.get_field(name)
+        if name in record:
+            values[name] = field.to_python(record[name])
+        elif field in AUTO_DATES:
+            values[name] = timezone.now()
+    return values
+
+
+# Поля, по которым запись с тем же id признаётся той же самой
+IDENTITY = {
+    Post: ('author', 'pub_date'),
+    Comment: ('post', 'author', 'created'),
+}
+
+
+def _missing(model, objects):
+    """Объекты, которых ещё нет в БД. Не ignore_conflicts: INSERT OR
+    IGNORE в SQLite молча пропустил бы и строку с NULL в NOT NULL.
+
+    Объект с уже занятым id пропускается, только если совпадают поля
+    IDENTITY, иначе ValueError.
+    """
+    fields = IDENTITY[model]
+    attnames = [model._meta.get_field(name).attname for name in fields]
+    existing = {row[0]: row[1:] for row in model.objects.filter(
+        pk__in=[obj.pk for obj in objects if obj.pk is not None],
+    ).values_list('pk', *fields)}
+    missing = []
+    for obj in objects:
+        if obj.pk not in existing:
+            missing.append(obj)
+        elif existing[obj.pk] != tuple(getattr(obj, name)
+                                       for name in attnames):
+            raise ValueError(
+                f'{model.__name__} id={obj.pk} уже есть в БД, '
+                f'но это другая запись; импортируйте в пустую БД')
+    return missing
+
+
+class _KeepDates:
+    """Отключает AUTO_DATES: иначе bulk_create заменил бы даты из файла
+    текущим временем."""
+
+    def __enter__(self):
+        for field in AUTO_DATES:
+            field.auto_now = field.auto_now_add = False
+
+    def __exit__(self, *exc_info):
+        for field, (auto_now, auto_now_add) in AUTO_DATES.items():
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Importer:
+    """Импорт потока строк JSONL.
+
+    Строки читаются по одной, записи копятся в пачки одного типа по
+    batch_size, а каждые batches_per_transaction пачек фиксируются
+    одной транзакцией. Память не растёт с числом постов: в словарях
+    только пользователи, группы и затронутые области кэша.
+    """
+
+    def __init__(self, batch_size=1000, batches_per_transaction=20):
+        self.batch_size = batch_size
+        self.batches_per_transaction = batches_per_transaction
+        self.users = dict(User.objects.values_list('username', 'id'))
+        self.groups = dict(Group.objects.values_list('slug', 'id'))
+        # Подписки из файла получат id больше этого
+        self.last_follow = (Follow.objects.aggregate(last=Max('pk'))['last']
+                            or 0)
+        self.authors = set()
+        self.scopes = {INDEX}
+        self.counts = Counter()
+
+    def run(self, lines):
+        """Импортирует строки, возвращает число записей по типам."""
+        return self.load(parse(lines))
+
+    def load(self, records):
+        """Импортирует записи-словари, например из posts.dataset."""
+        batches = self._batches(records)
+        with _KeepDates():
+            while True:
+                # Строки разбираются до начала транзакции
+                chunk = list(islice(batches, self.batches_per_transaction))
+                if not chunk:
+                    break
+                with transaction.atomic():
+                    for kind, records in chunk:
+                        self.counts[kind] += getattr(
+                            self, f'_import_{kind}')(records)
+        self.finish()
+        return self.counts
+
+    def finish(self):
+        """Работа пропущенных сигналов. Число подписок, для которых
+        заполнялась лента, попадает в counts['timeline']."""
+        recount_posts()
+        recount_users()
+        media.recount()
+        self.counts['timeline'] = self._backfill()
+        bump_feeds(self.scopes)
+
+    def _batches(self, records):
+        kind, batch = None, []
+        for record in records:
+            if batch and (record['type'] != kind
+                          or len(batch) >= self.batch_size):
+                yield kind, batch
+                batch = []
+            kind = record['type']
+            batch.append(record)
+        if batch:
+            yield kind, batch
+
+    def _user(self, username):
+        try:
+            return self.users[username]
+        except KeyError:
+            raise ValueError(f'Неизвестный пользователь: {username}')
+
+    def _group(self, slug):
+        if slug is None:
+            return None
+        try:
+            return self.groups[slug]
+        except KeyError:
+            raise ValueError(f'Неизвестная группа: {slug}')
+
+    # _import_<тип> возвращают число добавленных записей
+
+    def _import_user(self, records):
+        _, fields, _ = LAYOUT['user']
+        users = {}
+        for record in records:
+            if record['username'] in self.users:
+                continue
+            user = User(**_values(User, record, fields))
+            if not user.password:
+                user.password = make_password(None)
+            users[user.username] = user
+        # SQLite не возвращает id из bulk_create, читаем их отдельно
+        User.objects.bulk_create(users.values())
+        self.users.update(User.objects.filter(
+            username__in=list(users)).values_list('username', 'id'))
+        return len(users)
+
+    def _import_group(self, records):
+        _, fields, _ = LAYOUT['group']
+        groups = {record['slug']: Group(**_values(Group, record, fields))
+                  for record in records if record['slug'] not in self.groups}
+        Group.objects.bulk_create(groups.values())
+        self.groups.update(Group.objects.filter(
+            slug__in=list(groups)).values_list('slug', 'id'))
+        return len(groups)
+
+    def _import_post(self, records):
+        _, fields, _ = LAYOUT['post']
+        posts = []
+        for record in records:
+            post = Post(**_values(Post, record, fields),
+                        author_id=self._user(record['author']),
+                        group_id=self._group(record.get('group')))
+            posts.append(post)
+            self.authors.add(post.author_id)
+            self.scopes.update(post_scopes(post.author_id, post.group_id))
+        posts = _missing(Post, posts)
+        Post.objects.bulk_create(posts)
+        return len(posts)
+
+    def _import_comment(self, records):
+        _, fields, _ = LAYOUT['comment']
+        comments = [Comment(**_values(Comment, record, fields),
+                            post_id=record['post'],
+                            author_id=self._user(record['author']))
+                    for record in records]
+        comments = _missing(Comment, comments)
+        Comment.objects.bulk_create(comments)
+        # Число комментариев видно в лентах поста
+        posts = Post.objects.filter(
+            pk__in={comment.post_id for comment in comments},
+        ).values_list('author', 'group')
+        for author_id, group_id in posts:
+            self.scopes.update(post_scopes(author_id, group_id))
+        return len(comments)
+
+    def _import_follow(self, records):
+        pairs = dict.fromkeys((self._user(record['user']),
+                               self._user(record['author']))
+                              for record in records)
+        existing = set(Follow.objects.filter(
+            user__in={user_id for user_id, _ in pairs},
+            author__in={author_id for _, author_id in pairs},
+        ).values_list('user', 'author'))
+        follows = [Follow(user_id=user_id, author_id=author_id)
+                   for user_id, author_id in pairs
+                   if (user_id, author_id) not in existing]
+        Follow.objects.bulk_create(follows)
+        for follow in follows:
+            self.scopes.update((profile_scope(follow.user_id),
+                                profile_scope(follow.author_id)))
+        return len(follows)
+
+    def _backfill(self):
+        """Ленты новых подписок и подписок на авторов новых постов."""
+        follows = (Follow.objects.select_related('user', 'author')
+                   .order_by('pk'))
+        querysets = [follows.filter(pk__gt=self.last_follow)]
+        authors = sorted(self.authors)
+        querysets.extend(
+            follows.filter(pk__lte=self.last_follow,
+                           author__in=authors[start:start + 500])
+            for start in range(0, len(authors), 500))
+        backfilled = 0
+        for queryset in querysets:
+            last = 0
+            # По ключу, а не iterator(): вставки в ленту идут между чтениями
+            while True:
+                batch = list(queryset.filter(pk__gt=last)[:self.batch_size])
+                if not batch:
+                    break
+                for follow in batch:
+                    timeline.backfill(follow.user, follow.author)
+                backfilled += len(batch)
+                last = batch[-1].pk
+        return backfilled
@@ -7,6 +7,7 @@ urlpatterns = [
     path('new/', views.new_post, name='new_post'),
     path('group/<slug:slug>/', views.group_posts, name='group_posts'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('search/', views.search, name='search'),
     path('<str:username>/follow/', views.profile_follow,
          name='profile_follow'),
     path('<str:username>/unfollow/', views.profile_unfollow,
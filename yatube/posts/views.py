@@ -1,34 +1,61 @@
 
-from django.conf import settings
+from core.concurrency import gather
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.db import transaction
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse_lazy
+from django.utils.functional import SimpleLazyObject
 from django.views.generic import CreateView
 
+from . import cache, thumbnails
+from .conditional import (conditional_page, group_validator, index_validator,
+                          post_validator, profile_validator)
 from .forms import CommentForm, PostForm
 from .models import Comment, Follow, Group, Post, User
+from .paginator import get_page
+from .search import get_search_page
+from .timeline import get_timeline_page
 
 
+def _fetched(queryset):
+    """QuerySet с уже загруженными строками: запрос выполнится в потоке
+    gather(), а не при рендере шаблона."""
+    len(queryset)
+    return queryset
+
+
+def _lazy_page(request, queryset):
+    """Страница ленты, которая читается из БД при первом обращении
+    в шаблоне: при попадании в кэш фрагмента запросов к постам нет."""
+    def load():
+        page = get_page(request, queryset)
+        thumbnails.prefetch(page)
+        return page
+    return SimpleLazyObject(load)
+
+
+@conditional_page(index_validator)
 def index(request):
     """Вывод на главной странице сообщества."""
-    latest = Post.objects.all()
-    paginator = Paginator(latest, settings.PAGINATOR_NUMBER_OF_PAGES)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    return render(request, 'index.html', {'page': page})
+    # Версию читаем до запроса страницы, чтобы не закэшировать
+    # устаревшие посты под новой версией.
+    feed_version = cache.feed_version(cache.INDEX)
+    page = _lazy_page(request, Post.objects.for_feed())
+    return render(request, 'index.html',
+                  {'page': page, 'feed_version': feed_version})
 
 
+@conditional_page(group_validator)
 def group_posts(request, slug):
     """Вывод на главной странице Группы."""
     group = get_object_or_404(Group,
                               slug=slug)  # Ошибка '404',при неравенстве URL`ов
-    posts = group.posts.all()
-    paginator = Paginator(posts, settings.PAGINATOR_NUMBER_OF_PAGES)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    feed_version = cache.feed_version(cache.group_scope(group.id))
+    posts = group.posts.for_feed()
+    page = _lazy_page(request, posts)
     return render(request, 'group.html',
-                  {'group': group, 'posts': posts, 'page': page})
+                  {'group': group, 'posts': posts, 'page': page,
+                   'feed_version': feed_version})
 
 
 class PostView(CreateView):
@@ -39,9 +66,10 @@ class PostView(CreateView):
 
 
 @login_required  # Декоратор проверки авторизации
+@transaction.atomic
 def new_post(request):
     """Функция создания нового поста для авторизированных пользователей."""
-    form = PostForm(request.POST or None)
+    form = PostForm(request.POST or None, files=request.FILES or None)
     if form.is_valid():
         post = form.save(commit=False)  # Заполняем, но не сохраняем в БД.
         post.author = request.user
@@ -50,27 +78,34 @@ def new_post(request):
     return render(request, 'new.html', {'form': form})
 
 
+@conditional_page(profile_validator)
 def profile(request, username):
     """Профиль пользователя."""
-    user_r = get_object_or_404(User, username=username)
-    posts = user_r.posts.all()
-    follow = user_r.following.filter(user=request.user.id).exists()
-    paginator = Paginator(posts, settings.PAGINATOR_NUMBER_OF_PAGES)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    user_r = get_object_or_404(User.objects.select_related('counter'),
+                               username=username)
+    feed_version = cache.feed_version(cache.profile_scope(user_r.id))
+    viewer_id = request.user.id
+    follow = (viewer_id is not None
+              and user_r.following.filter(user=viewer_id).exists())
+    page = _lazy_page(request, user_r.posts.for_feed())
     flag_user = True
     if user_r == request.user:
         flag_user = False
     return render(request, 'profile.html',
-                  {'user_r': user_r, 'page': page, 'paginator': paginator,
-                   'follow': follow, 'flag_user': flag_user})
+                  {'user_r': user_r, 'page': page, 'follow': follow,
+                   'flag_user': flag_user, 'feed_version': feed_version})
 
 
+@conditional_page(post_validator)
 def post_view(request, username, post_id):
     """Просмотр постов пользователя."""
-    user_r = get_object_or_404(User, username=username)
-    post = get_object_or_404(Post, id=post_id)
-    comments = post.comments.all()
+    user_r, post, comments = gather(
+        lambda: get_object_or_404(User.objects.select_related('counter'),
+                                  username=username),
+        lambda: get_object_or_404(Post.objects.for_feed(), id=post_id),
+        lambda: _fetched(Comment.objects.for_feed().filter(post=post_id)),
+    )
+    thumbnails.prefetch([post])
     form = CommentForm()
     return render(request, 'post.html',
                   {'user_r': user_r, 'post': post, 'comments': comments,
@@ -93,6 +128,7 @@ def post_edit(request, username, post_id):
 
 
 @login_required
+@transaction.atomic
 def post_delete(request, username, post_id):
     """Удаление поста."""
     if request.user.username != username:
@@ -103,6 +139,7 @@ def post_delete(request, username, post_id):
 
 
 @login_required
+@transaction.atomic
 def add_comment(request, username, post_id):
     """Добавление комментария к посту."""
     post = get_object_or_404(Post, pk=post_id, author__username=username)
@@ -117,6 +154,7 @@ def add_comment(request, username, post_id):
 
 
 @login_required
+@transaction.atomic
 def comment_delete(request, username, post_id, comment_id):
     """Удаление комментария."""
     comment = get_object_or_404(Comment, pk=comment_id)
@@ -125,17 +163,24 @@ def comment_delete(request, username, post_id, comment_id):
     return redirect('post', username=username, post_id=post_id)
 
 
+def search(request):
+    """Поиск по постам и комментариям."""
+    query = request.GET.get('q', '').strip()
+    page = get_search_page(request, query)
+    thumbnails.prefetch(page)
+    return render(request, 'search.html', {'page': page, 'query': query})
+
+
 @login_required
 def follow_index(request):
     """Подписка на пользователя."""
-    posts = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(posts, settings.PAGINATOR_NUMBER_OF_PAGES)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    page = get_timeline_page(request)
+    thumbnails.prefetch(page)
     return render(request, 'follow.html', {'page': page})
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     """Подписка на пользователя."""
     author = get_object_or_404(User, username=username)
@@ -145,6 +190,7 @@ def profile_follow(request, username):
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     """Отписка от пользователя."""
     author = get_object_or_404(User, username=username)
@@ -1,5 +1,7 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.forms import UserCreationForm
+from django.core.exceptions import ValidationError
+from django.urls import resolve
 
 User = get_user_model()
 
@@ -8,3 +10,11 @@ class CreationForm(UserCreationForm):
     class Meta(UserCreationForm.Meta):
         model = User
         fields = ('first_name', 'last_name', 'username', 'email')
+
+    def clean_username(self):
+        """Профиль открывается по /<username>/, поэтому имена разделов
+        сайта (search, new, follow, admin...) заняты."""
+        username = self.cleaned_data['username']
+        if resolve(f'/{username}/').url_name != 'profile':
+            raise ValidationError('Это имя занято разделом сайта.')
+        return username
@@ -0,0 +1,8 @@
+import os
+
+from core.asgi import WsgiToAsgi
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+application = WsgiToAsgi(get_wsgi_application())
@@ -1,4 +1,5 @@
 import os
+import sys
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -14,9 +15,11 @@ ALLOWED_HOSTS = [
 ]
 
 INSTALLED_APPS = [
+    'core',
     'users',
     'posts',
     'about',
+    'api',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -28,7 +31,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.PrimaryPinMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -43,7 +48,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.backends.templates.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -52,19 +57,43 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'posts.context_processors.cache_timeouts',
             ],
         },
     },
 ]
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
+# ASGI: uvicorn yatube.asgi:application, view выполняются в пуле потоков
+ASGI_THREADS = 32
+# Потоки для независимых запросов внутри view (core.concurrency), 0 — без
+VIEW_QUERY_THREADS = 8
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Транзакции сразу берут блокировку на запись (core.backends)
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
+        # Соединение живёт между запросами и проверяется перед каждым
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
+# PRAGMA для каждого нового соединения SQLite (core.connections)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',  # Читатели не блокируют писателя
+    'synchronous': 'normal',  # В режиме WAL не теряет данных при сбое
+    'busy_timeout': 5000,  # Ждать блокировку до 5 с, а не падать
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,  # Отрицательное — в КиБ, то есть 64 МиБ
+    'temp_store': 'memory',
+}
+# Чтение с реплик (core.routers): алиасы из DATABASES
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+DATABASE_REPLICAS = []
+# Сколько после записи пользователь читает из основной БД
+REPLICA_PIN_SECONDS = 5
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -98,6 +127,16 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Загрузки сразу пишутся во временный файл, а не в память воркера
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+# Картинки постов: длинная сторона после уменьшения, предел точек после
+# draft-декодирования (ограничивает память на одну загрузку) и качество
+POST_IMAGE_MAX_SIZE = 2048
+POST_IMAGE_MAX_PIXELS = 24 * 1000 * 1000
+POST_IMAGE_QUALITY = 85
+
 LOGIN_URL = '/auth/login/'
 LOGIN_REDIRECT_URL = 'index'
 LOGOUT_REDIRECT_URL = 'index'
@@ -107,12 +146,79 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 PAGINATOR_NUMBER_OF_PAGES = 10  # Переменная для пагинатора
 
+# JSON API: наибольшие limit= и число id в ids=
+API_MAX_PAGE_SIZE = 100
+API_MAX_IDS = 100
+
+# Поиск ранжирует не больше стольких новейших совпадений в постах и
+# столько же в комментариях
+SEARCH_CANDIDATES = 1000
+
+# Кэш лент сбрасывается сменой версии при записи, поэтому живёт долго
+FEED_CACHE_TIMEOUT = 60 * 60 * 6
+# Ключ карточки поста включает время изменения поста
+POST_CACHE_TIMEOUT = 60 * 60 * 24
+
+# L1 в памяти воркера перед общим для всех воркеров файловым L2
 CACHES = {
     'default': {
+        'BACKEND': 'core.cache.TwoTierCache',
+        'OPTIONS': {
+            'L2': 'shared',
+            'L1_TIMEOUT': 5,
+            'L1_MAX_ENTRIES': 1000,
+            'L1_BYPASS': ['feed_version:'],  # Версии лент читаем из L2
+        },
+    },
+    'shared': {
+        # Атомарный add() для блокировок get_or_compute
+        'BACKEND': 'core.cache.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+        'TIMEOUT': 60 * 60 * 24,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+# Тесты (manage.py test и pytest) не читают и не очищают общий каталог
+# кэша: L2 у них в памяти процесса
+if sys.argv[1:2] == ['test'] or 'pytest' in sys.modules:
+    CACHES['shared'] = {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shared',
     }
-}
 
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
+
+# /metrics/ для Prometheus: заголовок Authorization: Bearer <токен>.
+# Без токена страница доступна только персоналу
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Домашняя лента: авторов с большим числом подписчиков не раскладываем
+TIMELINE_FANOUT_LIMIT = 5000
+TIMELINE_BACKFILL = 1000  # Сколько постов автора добавить при подписке
+TIMELINE_BATCH_SIZE = 500
+# Раскладку для большего числа подписчиков выполняет фоновая задача
+TIMELINE_INLINE_FANOUT = 100
+
+# Миниатюры строятся в фоне после сохранения поста, шаблон берёт их
+# по имени варианта: {{ post.thumbnails.card.url }}
+POST_THUMBNAILS = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+    'card_webp': ('960x339', {'crop': 'center', 'upscale': True,
+                              'format': 'WEBP'}),
+    # Для узких экранов, в srcset
+    'card_small': ('480x170', {'crop': 'center', 'upscale': True}),
+    'card_small_webp': ('480x170', {'crop': 'center', 'upscale': True,
+                                    'format': 'WEBP'}),
+}
+
+# Фоновые задачи (core.jobs, manage.py runworker)
+JOBS_CONCURRENCY = 2
+JOBS_POLL_INTERVAL = 1
+JOBS_CLAIM_BATCH = 10  # Сколько кандидатов перебирать за один захват
+JOBS_BACKOFF = 10  # Задержка первого повтора, дальше удваивается
+JOBS_BACKOFF_MAX = 60 * 60
+JOBS_PERIODIC = {
+    'posts.counters.recount': 60 * 60 * 24,
+}
@@ -1,3 +1,4 @@
+from core.views import metrics_view
 from django.conf import settings as st
 from django.conf.urls import handler404, handler500
 from django.conf.urls.static import static
@@ -12,6 +13,8 @@ urlpatterns = [
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
     path('admin/', admin.site.urls),
+    path('api/v1/', include('api.urls', namespace='api')),
+    path('metrics/', metrics_view, name='metrics'),
     path('', include('posts.urls')),
 ]
 